@@ -1,2 +1,4 @@
 from ozone.ode_function import ODEFunction
 from ozone.ode_integrator import ODEIntegrator
+from ozone.ensemble_ode_function import EnsembleODEFunction
+from ozone.utils.state_files import load_states
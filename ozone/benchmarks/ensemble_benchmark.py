@@ -0,0 +1,55 @@
+"""
+Benchmark of ensemble integration against one Problem per trajectory.
+
+A dispersion study of the simple nonlinear ODE over many initial conditions is run both as
+separate Problems, each with its own setup, and as a single ensemble integrator, in which the
+ODE system is evaluated once on all the nodes of all the members. The setup and run times are
+reported together, since the per-trajectory setup is what the ensemble avoids. The times of
+compute_totals for the derivatives of the states w.r.t. the initial conditions are reported
+separately; in forward mode, they take one sweep per member in both cases.
+
+Usage: python -m ozone.benchmarks.ensemble_benchmark
+"""
+from __future__ import print_function
+import numpy as np
+
+from ozone.tests.ode_function_library.simple_nonlinear_func import SimpleNonlinearODEFunction
+from ozone.utils.run_utils import compute_phase_profile
+
+
+def run_case(y0, formulation, num_times, **kwargs):
+    prob, runtimes, peaks = compute_phase_profile(num_times, 0., 1., {'y': y0},
+        SimpleNonlinearODEFunction(), formulation, 'RK4', mode='fwd', **kwargs)
+
+    runtime = sum(runtimes[phase_name]
+        for phase_name in ['construction', 'setup', 'final_setup', 'run_model'])
+    return prob['state:y'][-1], runtime, runtimes['compute_totals']
+
+
+def run_benchmark(ensemble_size=100, num_times=21, formulation='time-marching', **kwargs):
+    y0 = np.linspace(0.5, 1., ensemble_size)
+
+    results = [run_case(y0_member, formulation, num_times, **kwargs) for y0_member in y0]
+    y_separate = np.array([y[0] for y, runtime, totals_time in results])
+    runtime_separate = sum(runtime for y, runtime, totals_time in results)
+    totals_separate = sum(totals_time for y, runtime, totals_time in results)
+
+    y_ensemble, runtime_ensemble, totals_ensemble = run_case(
+        y0, formulation, num_times, ensemble_size=ensemble_size, **kwargs)
+
+    error = np.max(np.abs(y_ensemble[:, 0] - y_separate))
+
+    return runtime_separate, runtime_ensemble, totals_separate, totals_ensemble, error
+
+
+if __name__ == '__main__':
+    print('%14s %14s %14s %14s %14s %14s %14s' % (
+        'formulation', 'ensemble_size', 'separate (s)', 'ensemble (s)',
+        'sep. tot. (s)', 'ens. tot. (s)', 'max diff'))
+    for formulation, kwargs in [
+            ('time-marching', {'fused': True}),
+            ('solver-based', {})]:
+        for ensemble_size in [10, 100, 1000]:
+            results = run_benchmark(ensemble_size, formulation=formulation, **kwargs)
+            print('%14s %14i %14.6e %14.6e %14.6e %14.6e %14.6e' % (
+                (formulation, ensemble_size) + results))
@@ -0,0 +1,60 @@
+"""
+Benchmark of the import time of ozone and of the first use of the methods.
+
+Each statement is timed in a fresh interpreter, as for the short-lived worker processes of a
+batch run, so that no module is already loaded. The methods are built on first request by
+get_method, so importing ozone.api neither builds the method tables nor imports OpenMDAO; these
+costs are timed separately, after their imports, as the first get_method call and the first
+ODEIntegrator construction. Each runtime is the minimum over the repeats.
+
+Usage: python -m ozone.benchmarks.import_benchmark
+"""
+from __future__ import print_function
+import subprocess
+import sys
+
+
+# Name, untimed setup, and timed statement of each case
+cases = [
+    ('import numpy', '', 'import numpy'),
+    ('import openmdao.api', '', 'import openmdao.api'),
+    ('import ozone.methods_list', '', 'import ozone.methods_list'),
+    ('import ozone.api', '', 'import ozone.api'),
+    ('first get_method', 'from ozone.methods_list import get_method',
+        "get_method('RadauII5')"),
+    ('first ODEIntegrator',
+        'import numpy as np\n'
+        'from ozone.api import ODEIntegrator\n'
+        'from ozone.tests.ode_function_library.projectile_dynamics_func import '
+        'ProjectileFunction',
+        "ODEIntegrator(ProjectileFunction(), 'time-marching', 'RK4', "
+        "times=np.linspace(0., 1., 11))"),
+]
+
+script = """
+import time
+%s
+runtime0 = time.time()
+%s
+runtime1 = time.time()
+print(runtime1 - runtime0)
+"""
+
+
+def time_case(setup, statement, num_repeat=5):
+    runtimes = []
+    for ind in range(num_repeat):
+        output = subprocess.check_output([sys.executable, '-c', script % (setup, statement)])
+        runtimes.append(float(output.decode().strip().splitlines()[-1]))
+    return min(runtimes)
+
+
+def run_benchmark(num_repeat=5):
+    return [(name, time_case(setup, statement, num_repeat))
+        for name, setup, statement in cases]
+
+
+if __name__ == '__main__':
+    print('%26s %12s' % ('case', 'time (s)'))
+    for name, runtime in run_benchmark():
+        print('%26s %12.4f' % (name, runtime))
@@ -0,0 +1,116 @@
+"""
+Benchmark of the multi-RHS linear solves in VectorizedStepComp.
+
+Compares one batched solve of the (nrow, ncol) right-hand side block against a loop that
+solves one column at a time, for an increasing number of right-hand sides.
+
+Usage: python -m ozone.benchmarks.multi_rhs_benchmark
+"""
+from __future__ import print_function
+import numpy as np
+import time
+from six import iteritems
+
+from openmdao.api import Problem
+
+from ozone.components.vectorized_step_comp import VectorizedStepComp
+from ozone.methods_list import get_method
+from ozone.tests.ode_function_library.projectile_dynamics_func import ProjectileFunction
+from ozone.utils.var_names import get_name
+
+
+def get_step_comp(method_name, num_times):
+    ode_function = ProjectileFunction()
+    method = get_method(method_name)
+
+    comp = VectorizedStepComp(states=ode_function._states,
+        time_units=ode_function._time_options['units'],
+        num_times=num_times, num_stages=method.num_stages, num_step_vars=method.num_values,
+        glm_B=method.B, glm_V=method.V)
+
+    prob = Problem(comp)
+    prob.setup(check=False)
+    prob.final_setup()
+
+    return comp
+
+
+def get_vectors(comp, ncol):
+    num_times = comp.options['num_times']
+    num_step_vars = comp.options['num_step_vars']
+
+    d_outputs = {}
+    d_residuals = {}
+    for state_name, state in iteritems(comp.options['states']):
+        y_name = get_name('y', state_name)
+        shape = (num_times, num_step_vars,) + state['shape'] + (ncol,)
+        d_outputs[y_name] = np.random.rand(*shape)
+        d_residuals[y_name] = np.random.rand(*shape)
+
+    return d_outputs, d_residuals
+
+
+def solve_columns(comp, d_outputs, d_residuals, mode):
+    """
+    Reference implementation that solves one right-hand side at a time.
+    """
+    num_times = comp.options['num_times']
+    num_step_vars = comp.options['num_step_vars']
+
+    layout = comp.layout
+
+    nrow = num_times * num_step_vars * layout.size
+    ncol = list(d_outputs.values())[0].shape[-1]
+
+    if mode == 'fwd':
+        rhs_array = layout.pack(d_residuals, 'y', (num_times, num_step_vars), ncol)
+        solve_mode = 'N'
+    elif mode == 'rev':
+        rhs_array = layout.pack(d_outputs, 'y', (num_times, num_step_vars), ncol)
+        solve_mode = 'T'
+
+    rhs_array = rhs_array.reshape((nrow, ncol))
+    sol_array = np.zeros((nrow, ncol))
+    for icol in range(ncol):
+        sol_array[:, icol] = comp.dy_dy_inv.solve(rhs_array[:, icol], solve_mode)
+
+    sol_array = sol_array.reshape((num_times, num_step_vars, layout.size, ncol))
+    if mode == 'fwd':
+        layout.unpack(sol_array, d_outputs, 'y', ncol)
+    elif mode == 'rev':
+        layout.unpack(sol_array, d_residuals, 'y', ncol)
+
+
+def time_function(func, num_repeat):
+    runtimes = []
+    for ind in range(num_repeat):
+        runtime0 = time.time()
+        func()
+        runtime1 = time.time()
+        runtimes.append(runtime1 - runtime0)
+    return min(runtimes)
+
+
+def run_benchmark(method_name='RK4', num_times=1001, ncol_list=(1, 4, 16, 64, 256),
+        mode='rev', num_repeat=5):
+    comp = get_step_comp(method_name, num_times)
+
+    results = []
+    for ncol in ncol_list:
+        d_outputs, d_residuals = get_vectors(comp, ncol)
+
+        looped = time_function(
+            lambda: solve_columns(comp, d_outputs, d_residuals, mode), num_repeat)
+        batched = time_function(
+            lambda: comp.solve_multi_linear(d_outputs, d_residuals, mode), num_repeat)
+
+        results.append((ncol, looped, batched))
+
+    return results
+
+
+if __name__ == '__main__':
+    print('%6s %14s %14s %10s %16s' % ('ncol', 'looped (s)', 'batched (s)', 'speedup', 'batched RHS/s'))
+    for ncol, looped, batched in run_benchmark():
+        print('%6i %14.6e %14.6e %10.2f %16.1f' % (
+            ncol, looped, batched, looped / batched, ncol / batched))
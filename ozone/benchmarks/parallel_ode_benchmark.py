@@ -0,0 +1,87 @@
+"""
+Benchmark of the evaluation of the ODE nodes across a worker pool.
+
+The ODE system stands in for an expensive surrogate that is not vectorized internally: it
+loops over the nodes and spends a fixed delay on each of them, as a call to external code
+would. The model evaluation and total derivatives of the solver-based formulation are timed
+for an increasing number of workers, with thread and process pools.
+
+Usage: python -m ozone.benchmarks.parallel_ode_benchmark
+"""
+from __future__ import print_function
+import numpy as np
+import time
+
+from openmdao.api import Problem, ExplicitComponent
+
+from ozone.api import ODEIntegrator, ODEFunction
+from ozone.utils.suppress_printing import nostdout
+
+
+class ExpensiveODESystem(ExplicitComponent):
+
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+        self.options.declare('delay', default=1e-3, types=float)
+
+    def setup(self):
+        num = self.options['num_nodes']
+
+        self.add_input('y', shape=(num, 1))
+        self.add_input('t', shape=num)
+        self.add_output('dy_dt', shape=(num, 1))
+
+        self.declare_partials('dy_dt', 't', rows=np.arange(num), cols=np.arange(num))
+        self.declare_partials('dy_dt', 'y', rows=np.arange(num), cols=np.arange(num))
+
+    def compute(self, inputs, outputs):
+        for i_node in range(self.options['num_nodes']):
+            time.sleep(self.options['delay'])
+            outputs['dy_dt'][i_node, 0] = inputs['t'][i_node] * inputs['y'][i_node, 0] ** 2
+
+    def compute_partials(self, inputs, partials):
+        for i_node in range(self.options['num_nodes']):
+            time.sleep(self.options['delay'])
+        partials['dy_dt', 'y'] = 2 * inputs['t'] * inputs['y'][:, 0]
+        partials['dy_dt', 't'] = inputs['y'][:, 0] ** 2
+
+
+class ExpensiveODEFunction(ODEFunction):
+
+    def initialize(self, delay=1e-3):
+        self.set_system(ExpensiveODESystem, {'delay': delay})
+        self.declare_state('y', 'dy_dt', targets='y')
+        self.declare_time(targets='t')
+
+
+def run_case(num_times, delay, **kwargs):
+    prob = Problem(ODEIntegrator(ExpensiveODEFunction(delay=delay), 'solver-based', 'RK4',
+        times=np.linspace(0., 1., num_times), initial_conditions={'y': 1.}, **kwargs))
+
+    with nostdout():
+        prob.setup(check=False)
+        prob.final_setup()
+
+        runtime0 = time.time()
+        prob.run_model()
+        prob.compute_totals(['state:y'], ['initial_condition:y'])
+        runtime1 = time.time()
+
+    return runtime1 - runtime0, prob['state:y'][-1, 0]
+
+
+def run_benchmark(num_times=26, delay=1e-3, num_workers_list=(1, 2, 4, 8)):
+    results = []
+    for pool_type in ['thread', 'process']:
+        for num_workers in num_workers_list:
+            runtime, y = run_case(num_times, delay,
+                num_workers=num_workers, pool_type=pool_type)
+            results.append((pool_type, num_workers, runtime, y))
+
+    return results
+
+
+if __name__ == '__main__':
+    print('%10s %12s %14s %22s' % ('pool', 'num_workers', 'runtime (s)', 'y[-1]'))
+    for pool_type, num_workers, runtime, y in run_benchmark():
+        print('%10s %12i %14.6e %22.15e' % (pool_type, num_workers, runtime, y))
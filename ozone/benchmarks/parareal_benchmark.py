@@ -0,0 +1,62 @@
+"""
+Benchmark of the parareal formulation against time-marching.
+
+The ODE system is the expensive, non-vectorized surrogate of the parallel_ode_benchmark, which
+spends a fixed delay on each node. The model evaluation and total derivatives are timed for
+fused time-marching and for parareal with an increasing number of time slices, each marched by
+its own worker. The number of parareal iterations bounds the speedup at about
+num_slices / num_iterations, given as many cores as slices; with a process pool, the delay only
+overlaps across workers if the cores are available, whereas a thread pool overlaps it regardless.
+
+Usage: python -m ozone.benchmarks.parareal_benchmark
+"""
+from __future__ import print_function
+import numpy as np
+import time
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.benchmarks.parallel_ode_benchmark import ExpensiveODEFunction
+from ozone.utils.suppress_printing import nostdout
+
+
+def run_case(formulation, num_times, delay, **kwargs):
+    prob = Problem(ODEIntegrator(ExpensiveODEFunction(delay=delay), formulation, 'RK4',
+        times=np.linspace(0., 1., num_times), initial_conditions={'y': 1.}, **kwargs))
+
+    with nostdout():
+        prob.setup(check=False)
+        prob.final_setup()
+
+        runtime0 = time.time()
+        prob.run_model()
+        prob.compute_totals(['state:y'], ['initial_condition:y'])
+        runtime1 = time.time()
+
+    num_iterations = getattr(prob.model.integration_comp, 'num_iterations', None)
+
+    return runtime1 - runtime0, num_iterations, prob['state:y'][-1, 0]
+
+
+def run_benchmark(num_times=65, delay=1e-3, num_slices_list=(2, 4, 8, 16)):
+    results = []
+
+    runtime, num_iterations, y = run_case('time-marching', num_times, delay, fused=True)
+    results.append(('time-marching', '', 1, 1, runtime, y))
+
+    for pool_type in ['thread', 'process']:
+        for num_slices in num_slices_list:
+            runtime, num_iterations, y = run_case('parareal', num_times, delay,
+                num_slices=num_slices, pool_type=pool_type)
+            results.append(('parareal', pool_type, num_slices, num_iterations, runtime, y))
+
+    return results
+
+
+if __name__ == '__main__':
+    print('%14s %8s %11s %11s %14s %22s' % (
+        'formulation', 'pool', 'num_slices', 'iterations', 'runtime (s)', 'y[-1]'))
+    for formulation, pool_type, num_slices, num_iterations, runtime, y in run_benchmark():
+        print('%14s %8s %11i %11i %14.6e %22.15e' % (
+            formulation, pool_type, num_slices, num_iterations, runtime, y))
@@ -0,0 +1,123 @@
+"""
+Benchmark of the setup and run phases of the integrators, written out as JSON.
+
+Every method of the given families is integrated with every formulation, including parareal,
+and number of time points. The ODEIntegrator construction, prob.setup, prob.final_setup,
+prob.run_model, and prob.compute_totals are timed separately, since the setup phases dominate
+for small problems and are not covered by run_utils.compute_runtimes. Each runtime is the
+minimum over the repeats. Cases that fail, e.g., those a formulation does not support, are
+recorded with their error.
+
+Usage: python -m ozone.benchmarks.setup_time_benchmark [--output results.json] [options]
+"""
+from __future__ import print_function
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+import scipy
+import openmdao
+
+from ozone.methods_list import method_families
+from ozone.tests.ode_function_library.projectile_dynamics_func import ProjectileFunction
+from ozone.utils.run_utils import compute_phase_runtimes
+from ozone.utils.setup_cache import setup_cache
+
+
+phase_names = ['construction', 'setup', 'final_setup', 'run_model', 'compute_totals']
+formulations = ['time-marching', 'solver-based', 'optimizer-based', 'parareal']
+
+
+def run_case(method_name, formulation, num_times, num_repeat=1):
+    ode_function = ProjectileFunction()
+    initial_conditions, t0, t1 = ode_function.get_test_parameters()
+
+    result = {
+        'method': method_name,
+        'formulation': formulation,
+        'num_times': num_times,
+    }
+
+    try:
+        runtimes_list = []
+        for ind in range(num_repeat):
+            # Every repeat times a cold setup, as for the first Problem in a process.
+            setup_cache.clear()
+            runtimes_list.append(compute_phase_runtimes(num_times, t0, t1, initial_conditions,
+                ode_function, formulation, method_name))
+    except Exception as error:
+        # The sweep goes on, so that one unsupported case does not discard the others
+        result['error'] = '%s: %s' % (type(error).__name__, error)
+        return result
+
+    result['runtimes'] = dict(
+        (phase_name, min(runtimes[phase_name] for runtimes in runtimes_list))
+        for phase_name in phase_names)
+
+    return result
+
+
+def run_benchmark(family_names=None, formulations=formulations, num_times_list=(11, 41),
+        num_repeat=1, out_stream=None):
+    if family_names is None:
+        family_names = sorted(method_families)
+
+    results = []
+    for family_name in family_names:
+        for method_name in method_families[family_name]:
+            for formulation in formulations:
+                for num_times in num_times_list:
+                    result = run_case(method_name, formulation, num_times, num_repeat)
+                    result['family'] = family_name
+                    results.append(result)
+
+                    if out_stream is not None:
+                        if 'error' in result:
+                            summary = 'error: %s' % result['error']
+                        else:
+                            summary = ' '.join('%s %.4f' % (phase_name,
+                                result['runtimes'][phase_name]) for phase_name in phase_names)
+                        print('%s %s %i: %s' % (method_name, formulation, num_times, summary),
+                            file=out_stream)
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'versions': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'openmdao': openmdao.__version__,
+        },
+        'num_repeat': num_repeat,
+        'results': results,
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Time the setup and run phases of the integrators.')
+    parser.add_argument('--families', nargs='+', choices=sorted(method_families),
+        help='method families to run (default: all)')
+    parser.add_argument('--formulations', nargs='+', choices=formulations,
+        default=formulations)
+    parser.add_argument('--num-times', nargs='+', type=int, default=[11, 41])
+    parser.add_argument('--num-repeat', type=int, default=1)
+    parser.add_argument('--output', help='JSON file to write (default: stdout)')
+    options = parser.parse_args(args)
+
+    data = run_benchmark(options.families, options.formulations, options.num_times,
+        options.num_repeat, out_stream=sys.stderr)
+
+    if options.output is None:
+        json.dump(data, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        with open(options.output, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
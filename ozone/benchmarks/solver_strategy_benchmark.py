@@ -0,0 +1,60 @@
+"""
+Benchmark of the nonlinear and linear solver strategies of the solver-based formulation.
+
+Compares Newton with a sparse direct solver, block Gauss--Seidel iterations, and Newton with
+a matrix-free Krylov solver, timing the model evaluation and the total derivative computation
+for an increasing number of time steps.
+
+Usage: python -m ozone.benchmarks.solver_strategy_benchmark
+"""
+from __future__ import print_function
+import numpy as np
+import time
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.simple_nonlinear_func import SimpleNonlinearODEFunction
+from ozone.utils.suppress_printing import nostdout
+
+
+def get_problem(method_name, num_times, solver_strategy):
+    integrator = ODEIntegrator(SimpleNonlinearODEFunction(), 'solver-based', method_name,
+        times=np.linspace(0., 1.e-1, num_times), initial_conditions={'y': -1.},
+        solver_strategy=solver_strategy)
+
+    prob = Problem(integrator)
+    with nostdout():
+        prob.setup(check=False)
+        prob.final_setup()
+
+    return prob
+
+
+def run_benchmark(method_name='RK4', num_times_list=(11, 41, 161, 641),
+        solver_strategies=('newton', 'gauss-seidel', 'krylov')):
+    results = []
+    for num_times in num_times_list:
+        for solver_strategy in solver_strategies:
+            prob = get_problem(method_name, num_times, solver_strategy)
+
+            with nostdout():
+                runtime0 = time.time()
+                prob.run_model()
+                runtime1 = time.time()
+                prob.compute_totals(['state:y'], ['initial_condition:y'])
+                runtime2 = time.time()
+
+            y = prob['state:y']
+            results.append((num_times, solver_strategy,
+                runtime1 - runtime0, runtime2 - runtime1, y[-1]))
+
+    return results
+
+
+if __name__ == '__main__':
+    print('%10s %14s %14s %14s %22s' % (
+        'num_times', 'strategy', 'run_model (s)', 'totals (s)', 'y[-1]'))
+    for num_times, solver_strategy, runtime_model, runtime_totals, y in run_benchmark():
+        print('%10i %14s %14.6e %14.6e %22.15e' % (
+            num_times, solver_strategy, runtime_model, runtime_totals, y))
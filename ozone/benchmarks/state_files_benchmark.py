@@ -0,0 +1,61 @@
+"""
+Benchmark of the memory used by long time-marching runs with the states streamed to files.
+
+An ensemble of orbit problems, with a state vector of 4 * ensemble_size entries, is integrated
+with the fused time-marching component on increasingly fine time grids, once with the states
+output on the time grid and once with the states streamed to memory-mapped files. The peak
+memory allocated in each phase is measured with tracemalloc, by run_utils.compute_phase_profile;
+the largest peak of the setup and run phases is reported, as is that of compute_totals of the
+output states with respect to the final time (a single forward sweep over the trajectory). The
+pages of the memory-mapped files are not included, since the operating system can write them
+out and evict them as needed.
+
+Usage: python -m ozone.benchmarks.state_files_benchmark
+"""
+from __future__ import print_function
+import shutil
+import tempfile
+import numpy as np
+
+from ozone.tests.ode_function_library.two_d_orbit_func import TwoDOrbitFunction
+from ozone.utils.run_utils import compute_phase_profile
+
+
+def run_case(ensemble_size, num_times, state_dir):
+    initial_conditions = {
+        'position': np.tile([1., 0.], (ensemble_size, 1)),
+        'velocity': np.tile([0., 1.], (ensemble_size, 1)),
+    }
+
+    prob, runtimes, peaks = compute_phase_profile(num_times, 0., 100., initial_conditions,
+        TwoDOrbitFunction(), 'time-marching', 'RK4',
+        of=['state:position' if state_dir is None else 'final_state:position'],
+        wrt=['final_time'], mode='fwd', trace_memory=True,
+        ensemble_size=ensemble_size, fused=True, max_stored_steps=10, state_dir=state_dir)
+
+    run_peak = max(peaks[phase_name]
+        for phase_name in ['construction', 'setup', 'final_setup', 'run_model'])
+    return runtimes['run_model'], run_peak, runtimes['compute_totals'], peaks['compute_totals']
+
+
+def run_benchmark(ensemble_size=100, num_times_list=(1001, 2001, 4001)):
+    state_dir = tempfile.mkdtemp()
+
+    results = []
+    try:
+        for num_times in num_times_list:
+            memory = run_case(ensemble_size, num_times, None)
+            streamed = run_case(ensemble_size, num_times, state_dir)
+            results.append((num_times,) + memory + streamed)
+    finally:
+        shutil.rmtree(state_dir)
+
+    return results
+
+
+if __name__ == '__main__':
+    print('%10s %14s %16s %14s %16s %14s %16s %14s %16s' % (
+        'num_times', 'memory (s)', 'memory (MiB)', 'totals (s)', 'totals (MiB)',
+        'streamed (s)', 'streamed (MiB)', 'totals (s)', 'totals (MiB)'))
+    for result in run_benchmark():
+        print('%10i %14.4f %16.1f %14.4f %16.1f %14.4f %16.1f %14.4f %16.1f' % result)
@@ -0,0 +1,260 @@
+import numpy as np
+from six import iteritems
+import scipy.sparse
+
+from openmdao.api import ExplicitComponent
+
+from ozone.utils.var_names import get_name
+from ozone.utils.units import get_rate_units
+
+
+class DenseOutputComp(ExplicitComponent):
+    """
+    Evaluate the states at arbitrary times from the step vectors and stage rates.
+
+    On each interval, the states are interpolated by a polynomial in the fraction theta of the
+    interval that matches the states at both ends and the slopes h F at given points. The end
+    slopes are taken from stages that lie exactly at the start or end of a step, i.e., whose
+    stage value is the state there: the first stage of explicit Runge--Kutta methods and the
+    stage of linear multistep methods, of this interval or the neighboring one. When both are
+    available, this is cubic Hermite interpolation; otherwise, the stage rates of the interval
+    at each distinct abscissa are fitted instead, in the least-squares sense. The interpolant
+    is linear in the states and rates, so no further ODE evaluations are needed.
+
+    Query times before the first time of this integrator lie in the interval covered by the
+    starting method, whose own dense output is passed in through starting_dense_state.
+    """
+
+    def initialize(self):
+        self.options.declare('states', types=dict)
+        self.options.declare('time_units', types=str, allow_none=True)
+        self.options.declare('glm_A', types=np.ndarray)
+        self.options.declare('glm_B', types=np.ndarray)
+        self.options.declare('glm_U', types=np.ndarray)
+        self.options.declare('glm_V', types=np.ndarray)
+        self.options.declare('abscissa', types=np.ndarray)
+        self.options.declare('normalized_times', types=np.ndarray)
+        self.options.declare('dense_times', types=np.ndarray)
+
+    def setup(self):
+        time_units = self.options['time_units']
+        normalized_times = self.options['normalized_times']
+        dense_times = self.options['dense_times']
+        glm_A = self.options['glm_A']
+        glm_B = self.options['glm_B']
+        glm_U = self.options['glm_U']
+        glm_V = self.options['glm_V']
+        abscissa = self.options['abscissa']
+
+        num_times = len(normalized_times)
+        num_stages, num_step_vars = self.options['glm_U'].shape
+        num_dense = len(dense_times)
+
+        assert np.all(dense_times >= 0.) and np.all(dense_times <= normalized_times[-1]), \
+            'The dense output times must lie within the time interval'
+
+        is_starting = dense_times < normalized_times[0]
+        self.starting_indices = starting_indices = np.where(is_starting)[0]
+        self.my_indices = my_indices = np.where(~is_starting)[0]
+
+        # Interval of each query, and weights on the states at the times and the stage rates
+        self.intervals = intervals = np.minimum(
+            np.searchsorted(normalized_times, dense_times[my_indices], side='right') - 1,
+            num_times - 2)
+
+        weights_y = np.zeros((len(my_indices), num_times))
+        weights_F = np.zeros((len(my_indices), num_times - 1, num_stages))
+
+        for ind, (i_step, dense_time) in enumerate(zip(intervals, dense_times[my_indices])):
+            theta = (dense_time - normalized_times[i_step]) \
+                / (normalized_times[i_step + 1] - normalized_times[i_step])
+
+            conditions = get_slope_conditions(
+                glm_A, glm_B, glm_U, glm_V, abscissa, i_step, num_times - 1)
+            coeffs = get_interp_coeffs([cond_theta for cond_theta, terms in conditions])
+            weights = np.polynomial.polynomial.polyval(theta, coeffs)
+
+            weights_y[ind, i_step] += weights[0]
+            weights_y[ind, i_step + 1] += weights[1]
+            for weight, (cond_theta, terms) in zip(weights[2:], conditions):
+                for j_step, j_stage, coeff in terms:
+                    weights_F[ind, j_step, j_stage] += weight * coeff
+
+        self.weights_y = scipy.sparse.csr_matrix(weights_y)
+        self.weights_F = scipy.sparse.csr_matrix(
+            weights_F.reshape((len(my_indices), (num_times - 1) * num_stages)))
+
+        self.add_input('h_vec', shape=num_times - 1, units=time_units)
+
+        for state_name, state in iteritems(self.options['states']):
+            size = int(np.prod(state['shape']))
+            shape = state['shape']
+
+            y_name = get_name('y', state_name)
+            F_name = get_name('F', state_name)
+            starting_name = get_name('starting_dense_state', state_name)
+            out_name = get_name('dense_state', state_name)
+
+            self.add_input(y_name, shape=(num_times, num_step_vars,) + shape,
+                units=state['units'])
+            self.add_input(F_name, shape=(num_times - 1, num_stages,) + shape,
+                units=get_rate_units(state['units'], time_units))
+            self.add_output(out_name, shape=(num_dense,) + shape, units=state['units'])
+
+            out_arange = np.arange(num_dense * size).reshape((num_dense, size))
+            y_arange = np.arange(num_times * num_step_vars * size).reshape(
+                (num_times, num_step_vars, size))
+            F_arange = np.arange((num_times - 1) * num_stages * size).reshape(
+                ((num_times - 1) * num_stages, size))
+
+            coo = self.weights_y.tocoo()
+            rows = out_arange[my_indices[coo.row], :].flatten()
+            cols = y_arange[coo.col, 0, :].flatten()
+            data = np.einsum('i,j->ij', coo.data, np.ones(size)).flatten()
+            self.declare_partials(out_name, y_name, val=data, rows=rows, cols=cols)
+
+            coo = self.weights_F.tocoo()
+            rows = out_arange[my_indices[coo.row], :].flatten()
+            cols = F_arange[coo.col, :].flatten()
+            self.declare_partials(out_name, F_name, rows=rows, cols=cols)
+
+            rows = out_arange[my_indices, :].flatten()
+            cols = np.einsum('i,j->ij', intervals, np.ones(size, int)).flatten()
+            self.declare_partials(out_name, 'h_vec', rows=rows, cols=cols)
+
+            if len(starting_indices) > 0:
+                self.add_input(starting_name, shape=(len(starting_indices),) + shape,
+                    units=state['units'])
+
+                data = np.ones(len(starting_indices) * size)
+                rows = out_arange[starting_indices, :].flatten()
+                cols = np.arange(len(starting_indices) * size)
+                self.declare_partials(out_name, starting_name, val=data, rows=rows, cols=cols)
+
+    def compute(self, inputs, outputs):
+        h_vec = inputs['h_vec']
+
+        for state_name, state in iteritems(self.options['states']):
+            size = int(np.prod(state['shape']))
+
+            y = inputs[get_name('y', state_name)][:, 0].reshape((-1, size))
+            F = inputs[get_name('F', state_name)].reshape((-1, size))
+
+            dense_state = np.zeros((len(self.options['dense_times']), size))
+            dense_state[self.my_indices] = self.weights_y.dot(y) \
+                + np.einsum('i,ij->ij', h_vec[self.intervals], self.weights_F.dot(F))
+
+            if len(self.starting_indices) > 0:
+                dense_state[self.starting_indices] = inputs[
+                    get_name('starting_dense_state', state_name)].reshape((-1, size))
+
+            outputs[get_name('dense_state', state_name)] = dense_state.reshape(
+                outputs[get_name('dense_state', state_name)].shape)
+
+    def compute_partials(self, inputs, partials):
+        h_vec = inputs['h_vec']
+
+        for state_name, state in iteritems(self.options['states']):
+            size = int(np.prod(state['shape']))
+
+            out_name = get_name('dense_state', state_name)
+            F = inputs[get_name('F', state_name)].reshape((-1, size))
+
+            coo = self.weights_F.tocoo()
+            partials[out_name, get_name('F', state_name)] = np.einsum('i,j->ij',
+                h_vec[self.intervals[coo.row]] * coo.data, np.ones(size)).flatten()
+
+            partials[out_name, 'h_vec'] = self.weights_F.dot(F).flatten()
+
+
+def get_slope_conditions(glm_A, glm_B, glm_U, glm_V, abscissa, i_step, num_steps):
+    """
+    Return the (theta, terms) slope conditions of the interpolant on an interval.
+
+    Each term (j_step, j_stage, coeff) adds coeff times the rate of stage j_stage of interval
+    j_step to the slope at theta, which is then multiplied by the step size of the interval.
+    """
+    num_stages, num_step_vars = glm_U.shape
+
+    e0 = np.zeros(num_step_vars)
+    e0[0] = 1.
+
+    # Stages whose value is the state at the start or at the end of the step
+    start_stages = [
+        j_stage for j_stage in range(num_stages)
+        if np.allclose(glm_A[j_stage], 0.) and np.allclose(glm_U[j_stage], e0)]
+    end_stages = [
+        j_stage for j_stage in range(num_stages)
+        if np.allclose(glm_A[j_stage], glm_B[0]) and np.allclose(glm_U[j_stage], glm_V[0])]
+
+    def get_terms(j_step, stages):
+        return [(j_step, j_stage, 1. / len(stages)) for j_stage in stages]
+
+    start_terms = end_terms = None
+    if start_stages:
+        start_terms = get_terms(i_step, start_stages)
+    elif end_stages and i_step > 0:
+        start_terms = get_terms(i_step - 1, end_stages)
+
+    if end_stages:
+        end_terms = get_terms(i_step, end_stages)
+    elif start_stages and i_step < num_steps - 1:
+        end_terms = get_terms(i_step + 1, start_stages)
+
+    conditions = []
+    if start_terms is not None:
+        conditions.append((0., start_terms))
+    if end_terms is not None:
+        conditions.append((1., end_terms))
+
+    # The other stages, at their abscissa; those at the start or end of the step have a slope
+    # there, whatever their abscissa.
+    if start_terms is None or end_terms is None:
+        inner_stages = [
+            j_stage for j_stage in range(num_stages)
+            if j_stage not in start_stages and j_stage not in end_stages]
+        for theta in np.unique(abscissa[inner_stages]):
+            if all(abs(theta - cond_theta) > 1e-12 for cond_theta, terms in conditions):
+                stages = [
+                    j_stage for j_stage in inner_stages
+                    if abs(abscissa[j_stage] - theta) <= 1e-12]
+                conditions.append((theta, get_terms(i_step, stages)))
+
+    return conditions
+
+
+def get_interp_coeffs(slope_thetas):
+    """
+    Return the polynomial coefficients of the weights of the end values and the slopes.
+
+    The coefficients have shape (degree + 1, 2 + len(slope_thetas)), in increasing powers of
+    theta. The end values are matched exactly and the slopes in the least-squares sense, with
+    the highest degree for which the conditions determine the polynomial.
+    """
+    num_slopes = len(slope_thetas)
+
+    for degree in range(num_slopes + 1, 0, -1):
+        powers = np.arange(degree + 1)
+
+        mtx_C = np.zeros((2, degree + 1))
+        mtx_C[0, 0] = 1.
+        mtx_C[1, :] = 1.
+
+        mtx_S = np.zeros((num_slopes, degree + 1))
+        for ind, slope_theta in enumerate(slope_thetas):
+            mtx_S[ind, 1:] = powers[1:] * slope_theta ** (powers[1:] - 1)
+
+        if np.linalg.matrix_rank(np.vstack([mtx_C, mtx_S])) == degree + 1:
+            break
+
+    # KKT system of the constrained least-squares problem for the polynomial coefficients
+    mtx = np.zeros((degree + 3, degree + 3))
+    mtx[:degree + 1, :degree + 1] = mtx_S.T.dot(mtx_S)
+    mtx[:degree + 1, degree + 1:] = mtx_C.T
+    mtx[degree + 1:, :degree + 1] = mtx_C
+
+    rhs = np.zeros((degree + 3, 2 + num_slopes))
+    rhs[:degree + 1, 2:] = mtx_S.T
+    rhs[degree + 1:, :2] = np.eye(2)
+
+    return np.linalg.pinv(mtx).dot(rhs)[:degree + 1]
@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 import numpy as np
 from six import iteritems
 import scipy.sparse
@@ -6,7 +8,9 @@ from openmdao.api import ExplicitComponent
 
 from ozone.utils.var_names import get_name
 from ozone.utils.units import get_rate_units
-from ozone.utils.sparse_linear_spline import get_sparse_linear_spline
+from ozone.utils.sparse_interpolation import get_sparse_interpolation
+from ozone.utils.packed_layout import PackedLayout
+from ozone.utils.setup_cache import setup_cache, get_array_key
 
 
 class DynamicParameterComp(ExplicitComponent):
@@ -20,54 +24,104 @@ class DynamicParameterComp(ExplicitComponent):
         normalized_times = self.options['normalized_times']
         stage_norm_times = self.options['stage_norm_times']
 
-        num_times = len(normalized_times)
         num_stage_times = len(stage_norm_times)
 
-        data0, rows0, cols0 = get_sparse_linear_spline(normalized_times, stage_norm_times)
-        nnz = len(data0)
-
-        self.mtx = scipy.sparse.csc_matrix((data0, (rows0, cols0)),
-            shape=(num_stage_times, num_times))
-
+        # Parameters with the same control grid and interpolation scheme share one interpolation
+        # matrix and are packed together. The matrices and the partials patterns only depend on
+        # the scheme, the time grids, and the parameter size, so they are also shared across
+        # components and setups.
+        groups = OrderedDict()
         for parameter_name, parameter in iteritems(self.options['dynamic_parameters']):
-            size = np.prod(parameter['shape'])
-            shape = parameter['shape']
+            control_times = get_control_times(parameter, normalized_times)
+            scheme = (parameter['interpolation'], parameter['interpolation_order'],
+                get_array_key(control_times))
+            groups.setdefault(scheme, (control_times, OrderedDict()))[1][parameter_name] = \
+                parameter
+
+        self.groups = []
+        for scheme, (control_times, parameters) in iteritems(groups):
+            interpolation, order, control_key = scheme
+            key = ('DynamicParameterComp', interpolation, order, control_key,
+                get_array_key(stage_norm_times))
+
+            mtx = setup_cache.get(key,
+                lambda: self._get_interp_matrix(interpolation, order, control_times))
+            self.groups.append((PackedLayout(parameters), mtx))
+
+            for parameter_name, parameter in iteritems(parameters):
+                size = int(np.prod(parameter['shape']))
+                shape = parameter['shape']
+
+                in_name = get_name('in', parameter_name)
+                out_name = get_name('out', parameter_name)
+
+                self.add_input(in_name,
+                    shape=(len(control_times),) + shape,
+                    units=parameter['units'])
+
+                self.add_output(out_name,
+                    shape=(num_stage_times,) + shape,
+                    units=parameter['units'])
+
+                data, rows, cols = setup_cache.get(key + (size,),
+                    lambda: self._get_partials_pattern(mtx, size))
+                self.declare_partials(out_name, in_name, val=data, rows=rows, cols=cols)
+
+    def _get_interp_matrix(self, interpolation, order, control_times):
+        stage_norm_times = self.options['stage_norm_times']
 
-            in_name = get_name('in', parameter_name)
-            out_name = get_name('out', parameter_name)
+        data0, rows0, cols0 = get_sparse_interpolation(
+            interpolation, control_times, stage_norm_times, order)
 
-            self.add_input(in_name,
-                shape=(num_times,) + shape,
-                units=parameter['units'])
+        return scipy.sparse.csr_matrix((data0, (rows0, cols0)),
+            shape=(len(stage_norm_times), len(control_times)))
 
-            self.add_output(out_name,
-                shape=(num_stage_times,) + shape,
-                units=parameter['units'])
+    def _get_partials_pattern(self, mtx, size):
+        # (nnz, size): each nonzero of the interpolation matrix is repeated for every entry
+        coo = mtx.tocoo()
+        arange = np.arange(size)
 
-            # (num_stage_times, num_out,) + shape
-            data = np.einsum('i,...->i...', data0, np.ones(shape)).flatten()
-            rows = (
-                np.einsum('i,...->i...', rows0, size * np.ones(shape, int))
-                + np.einsum('i,...->i...', np.ones(nnz, int), np.arange(size).reshape(shape))
-            ).flatten()
-            cols = (
-                np.einsum('i,...->i...', cols0, size * np.ones(shape, int))
-                + np.einsum('i,...->i...', np.ones(nnz, int), np.arange(size).reshape(shape))
-            ).flatten()
+        data = np.einsum('i,j->ij', coo.data, np.ones(size)).flatten()
+        rows = np.add.outer(coo.row * size, arange).flatten()
+        cols = np.add.outer(coo.col * size, arange).flatten()
 
-            self.declare_partials(out_name, in_name, val=data, rows=rows, cols=cols)
+        return data, rows, cols
 
     def compute(self, inputs, outputs):
-        normalized_times = self.options['normalized_times']
-        stage_norm_times = self.options['stage_norm_times']
-
-        num_times = len(normalized_times)
-        num_stage_times = len(stage_norm_times)
-
-        for parameter_name, parameter in iteritems(self.options['dynamic_parameters']):
-            size = np.prod(parameter['shape'])
-            shape = parameter['shape']
-            in_name = get_name('in', parameter_name)
-            out_name = get_name('out', parameter_name)
-
-            outputs[out_name] = self.mtx.dot(inputs[in_name].reshape((num_times, size))).reshape((num_stage_times,) + shape)
\ No newline at end of file
+        # The parameters of each group are interpolated with a single sparse product in the
+        # packed layout
+        for layout, mtx in self.groups:
+            parameters = layout.pack(inputs, 'in', (mtx.shape[1],))
+            layout.unpack(mtx.dot(parameters), outputs, 'out')
+
+
+def get_control_times(parameter, normalized_times):
+    """
+    Return the normalized times of the control points of a dynamic parameter.
+
+    Parameters
+    ----------
+    parameter : OptionsDictionary
+        Options of the dynamic parameter, as declared in the ODEFunction.
+    normalized_times : ndarray
+        Normalized times of the integration, from 0 to 1.
+
+    Returns
+    -------
+    ndarray
+        The normalized control times, which are the integration times by default.
+    """
+    control_times = parameter['control_times']
+
+    if control_times is None:
+        return normalized_times
+    elif isinstance(control_times, int):
+        assert control_times >= 2, 'There must be at least 2 control points'
+        return np.linspace(normalized_times[0], normalized_times[-1], control_times)
+    else:
+        assert len(control_times.shape) == 1 and np.all(np.diff(control_times) > 0.), \
+            'control_times must be a 1-D array of increasing times'
+        assert control_times[0] <= normalized_times[0] + 1e-15 \
+            and control_times[-1] >= normalized_times[-1] - 1e-15, \
+            'control_times must cover the time interval'
+        return control_times
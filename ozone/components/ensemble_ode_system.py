@@ -0,0 +1,163 @@
+import numpy as np
+from six import iteritems
+
+from openmdao.api import Group, ExplicitComponent
+
+from ozone.ode_function import ODEFunction
+from ozone.utils.var_names import get_name
+from ozone.utils.units import get_rate_units
+
+
+class EnsembleODESystem(Group):
+    """
+    Evaluate an ensemble of copies of an ODE system as one system with more nodes.
+
+    Every input and output has the shape (num_nodes, ensemble_size,) + shape. Since node i of
+    member j is node i * ensemble_size + j of the wrapped system, which is evaluated on
+    num_nodes * ensemble_size nodes, the inputs and outputs are only reshaped on the way in and
+    out; the time is the same for all members and is repeated.
+    """
+
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+        self.options.declare('ode_function', types=ODEFunction)
+        self.options.declare('ensemble_size', types=int)
+
+    def setup(self):
+        num_nodes = self.options['num_nodes']
+        ode_function = self.options['ode_function']
+        ensemble_size = self.options['ensemble_size']
+
+        self.add_subsystem('inputs_comp', EnsembleInputComp(num_nodes=num_nodes,
+            ode_function=ode_function, ensemble_size=ensemble_size), promotes_inputs=['*'])
+
+        self.add_subsystem('ode_comp', ode_function._system_class(
+            num_nodes=num_nodes * ensemble_size, **ode_function._system_init_kwargs))
+
+        self.add_subsystem('outputs_comp', EnsembleOutputComp(num_nodes=num_nodes,
+            ode_function=ode_function, ensemble_size=ensemble_size), promotes_outputs=['*'])
+
+        for state_name, state in iteritems(ode_function._states):
+            for target in state['targets']:
+                self.connect('inputs_comp.' + get_name('member_state', state_name),
+                    'ode_comp.' + target)
+
+            self.connect('ode_comp.' + state['rate_source'],
+                'outputs_comp.' + get_name('member_rate', state_name))
+
+        for target in ode_function._time_options['targets']:
+            self.connect('inputs_comp.member_time', 'ode_comp.' + target)
+
+        for parameter_name, parameter in iteritems(ode_function._static_parameters):
+            for target in parameter['targets']:
+                self.connect('inputs_comp.' + get_name('member_static_parameter', parameter_name),
+                    'ode_comp.' + target)
+
+        for parameter_name, parameter in iteritems(ode_function._dynamic_parameters):
+            for target in parameter['targets']:
+                self.connect('inputs_comp.' + get_name('member_dynamic_parameter', parameter_name),
+                    'ode_comp.' + target)
+
+
+class EnsembleInputComp(ExplicitComponent):
+    """
+    Reshape the ensemble inputs into the node inputs of the wrapped ODE system.
+    """
+
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+        self.options.declare('ode_function', types=ODEFunction)
+        self.options.declare('ensemble_size', types=int)
+
+    def setup(self):
+        num_nodes = self.options['num_nodes']
+        ode_function = self.options['ode_function']
+        ensemble_size = self.options['ensemble_size']
+
+        num_member_nodes = num_nodes * ensemble_size
+
+        # (in_name, out_name) pairs of the variables that are only reshaped
+        self.reshaped = []
+
+        variables = []
+        for state_name, state in iteritems(ode_function._states):
+            if state['targets']:
+                variables.append(('state', state_name, state))
+        for parameter_name, parameter in iteritems(ode_function._static_parameters):
+            if parameter['targets']:
+                variables.append(('static_parameter', parameter_name, parameter))
+        for parameter_name, parameter in iteritems(ode_function._dynamic_parameters):
+            if parameter['targets']:
+                variables.append(('dynamic_parameter', parameter_name, parameter))
+
+        for var_type, name, variable in variables:
+            size = num_member_nodes * int(np.prod(variable['shape']))
+
+            in_name = get_name(var_type, name)
+            out_name = get_name('member_' + var_type, name)
+
+            self.add_input(in_name, shape=(num_nodes, ensemble_size,) + variable['shape'],
+                units=variable['units'])
+            self.add_output(out_name, shape=(num_member_nodes,) + variable['shape'],
+                units=variable['units'])
+
+            arange = np.arange(size)
+            self.declare_partials(out_name, in_name, val=1., rows=arange, cols=arange)
+
+            self.reshaped.append((in_name, out_name))
+
+        if ode_function._time_options['targets']:
+            time_units = ode_function._time_options['units']
+
+            self.add_input('time', shape=num_nodes, units=time_units)
+            self.add_output('member_time', shape=num_member_nodes, units=time_units)
+
+            self.declare_partials('member_time', 'time', val=1.,
+                rows=np.arange(num_member_nodes),
+                cols=np.repeat(np.arange(num_nodes), ensemble_size))
+
+    def compute(self, inputs, outputs):
+        for in_name, out_name in self.reshaped:
+            outputs[out_name] = inputs[in_name].reshape(outputs[out_name].shape)
+
+        if self.options['ode_function']._time_options['targets']:
+            outputs['member_time'] = np.repeat(inputs['time'], self.options['ensemble_size'])
+
+
+class EnsembleOutputComp(ExplicitComponent):
+    """
+    Reshape the rates computed on the nodes of the wrapped ODE system into ensemble outputs.
+    """
+
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+        self.options.declare('ode_function', types=ODEFunction)
+        self.options.declare('ensemble_size', types=int)
+
+    def setup(self):
+        num_nodes = self.options['num_nodes']
+        ode_function = self.options['ode_function']
+        ensemble_size = self.options['ensemble_size']
+
+        time_units = ode_function._time_options['units']
+
+        for state_name, state in iteritems(ode_function._states):
+            size = num_nodes * ensemble_size * int(np.prod(state['shape']))
+            units = get_rate_units(state['units'], time_units)
+
+            in_name = get_name('member_rate', state_name)
+            out_name = get_name('rate', state_name)
+
+            self.add_input(in_name, shape=(num_nodes * ensemble_size,) + state['shape'],
+                units=units)
+            self.add_output(out_name, shape=(num_nodes, ensemble_size,) + state['shape'],
+                units=units)
+
+            arange = np.arange(size)
+            self.declare_partials(out_name, in_name, val=1., rows=arange, cols=arange)
+
+    def compute(self, inputs, outputs):
+        for state_name in self.options['ode_function']._states:
+            out_name = get_name('rate', state_name)
+            outputs[out_name] = inputs[get_name('member_rate', state_name)].reshape(
+                outputs[out_name].shape)
@@ -0,0 +1,1219 @@
+import os
+
+import numpy as np
+from six import iteritems
+import scipy.optimize
+
+from openmdao.api import ExplicitComponent, AnalysisError
+
+from ozone.ode_function import ODEFunction
+from ozone.utils.var_names import get_name
+from ozone.utils.ode_evaluator import ODEEvaluator
+from ozone.utils.units import get_rate_units
+from ozone.components.dense_output_comp import get_slope_conditions, get_interp_coeffs
+from ozone.utils.kronecker_solver import KroneckerStageSolver
+from ozone.utils.block_diagonal import block_dot, block_lu_factor, block_lu_solve
+from ozone.utils.setup_cache import setup_cache, get_array_key
+from ozone.utils.checkpoint import get_checkpoint_key, TrajectoryCheckpoint
+from ozone.utils.state_files import open_state_file
+
+
+class FusedTMComp(ExplicitComponent):
+    """
+    Integrate the ODE with a time-marching approach within a single component.
+
+    The steps are marched in a Python loop and the ODE system is evaluated directly through
+    an ODEEvaluator, so the number of subsystems and connections does not grow with the
+    number of time steps. Total derivatives are computed matrix-free with forward and
+    reverse sweeps through the linearized GLM recurrence.
+    """
+
+    def initialize(self):
+        self.options.declare('ode_function', types=ODEFunction)
+        self.options.declare('time_units', types=str, allow_none=True)
+        self.options.declare('num_times', types=int)
+        self.options.declare('num_stages', types=int)
+        self.options.declare('num_step_vars', types=int)
+        self.options.declare('glm_A', types=np.ndarray)
+        self.options.declare('glm_B', types=np.ndarray)
+        self.options.declare('glm_U', types=np.ndarray)
+        self.options.declare('glm_V', types=np.ndarray)
+        self.options.declare('abscissa', default=None, types=np.ndarray, allow_none=True)
+        self.options.declare('max_stored_steps', default=None, types=int, allow_none=True,
+            desc='Number of step linearizations held at once; the stages of the other steps '
+            'are recomputed from the step vectors as the derivative sweeps reach them')
+        self.options.declare('newton_tol', default=1e-12, types=float)
+        self.options.declare('newton_maxiter', default=100, types=int)
+        self.options.declare('modified_newton', default=False, types=bool,
+            desc='Whether to reuse the Newton factorization across iterations and steps')
+        self.options.declare('max_contraction', default=0.5, types=float,
+            desc='Largest ratio of successive residual norms before the Newton matrix is '
+            'refactored')
+        self.options.declare('stage_solver', default='dense', values=['dense', 'kronecker'],
+            desc='With kronecker, the Newton matrix uses the rate Jacobian at the start of the '
+            'step and is decoupled into num_stages systems by diagonalizing glm_A')
+        self.options.declare('error_weights', default=None, types=np.ndarray, allow_none=True,
+            desc='Weights of the error estimate of an embedded Runge--Kutta pair; if given, each '
+            'interval is covered by adaptive substeps chosen from atol and rtol')
+        self.options.declare('embedded_order', default=1, types=int)
+        self.options.declare('atol', default=1e-6, types=float)
+        self.options.declare('rtol', default=1e-3, types=float)
+        self.options.declare('max_substeps', default=10000, types=int)
+        self.options.declare('output_rates', default=False, types=bool,
+            desc='Whether to also output the stage rates of each step as F')
+        self.options.declare('locate_events', default=False, types=bool,
+            desc='Whether to locate the events of the ODE function after each substep and '
+            'output their first times; the marching stops at the first terminal event')
+        self.options.declare('event_tol', default=1e-12, types=float)
+        self.options.declare('checkpoint_file', default=None, types=str, allow_none=True,
+            desc='npz file to which the state of the marching is saved, with the trajectory '
+            'written to files next to it as the steps complete')
+        self.options.declare('checkpoint_interval', default=100, types=int,
+            desc='Number of steps between checkpoints')
+        self.options.declare('restart', default=False, types=bool,
+            desc='Whether to resume after the last step saved in checkpoint_file if it holds '
+            'a checkpoint of the same inputs, options, and ODE system')
+        self.options.declare('state_dir', default=None, types=str, allow_none=True,
+            desc='Directory to which the states are streamed as npy files, instead of being '
+            'output on the time grid; only final_state is output')
+        self.options.declare('num_starting_times', default=1, types=int,
+            desc='Number of times of the starting method, whose states are taken from the '
+            'starting_state inputs when streaming the states')
+
+    def setup(self):
+        ode_function = self.options['ode_function']
+        time_units = self.options['time_units']
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_step_vars = self.options['num_step_vars']
+        glm_A = self.options['glm_A']
+        glm_B = self.options['glm_B']
+        glm_U = self.options['glm_U']
+        glm_V = self.options['glm_V']
+
+        states = ode_function._states
+        static_parameters = ode_function._static_parameters
+        dynamic_parameters = ode_function._dynamic_parameters
+
+        max_stored_steps = self.options['max_stored_steps']
+
+        assert max_stored_steps is None or max_stored_steps > 0, \
+            'max_stored_steps must be positive'
+
+        num_stage_times = (num_times - 1) * num_stages
+
+        self.explicit = np.linalg.norm(np.triu(glm_A)) < 1e-15
+        self.adaptive = self.options['error_weights'] is not None
+
+        assert not self.adaptive or self.explicit, \
+            'Adaptive substeps are only supported for explicit methods'
+        assert not self.adaptive or not self.options['output_rates'], \
+            'The stage rates cannot be output with adaptive substeps'
+
+        self.events = ode_function._events if self.options['locate_events'] else {}
+        self.has_stage_times = bool(ode_function._time_options['targets'] or self.events)
+
+        assert not self.options['output_rates'] \
+            or not any(event['terminal'] for event in self.events.values()), \
+            'The stage rates cannot be output with terminal events'
+        assert self.options['checkpoint_file'] is None or not self.events, \
+            'Checkpoints are not supported with events'
+        assert self.options['checkpoint_interval'] > 0, 'checkpoint_interval must be positive'
+        assert self.options['state_dir'] is None or not self.options['output_rates'], \
+            'The stage rates cannot be output with the states streamed to files'
+
+        # Maps from the inputs of an interval to those of a substep; see _get_substep_maps
+        self.abscissa = self.options['abscissa'] if self.options['abscissa'] is not None \
+            else glm_A.dot(np.ones(num_stages))
+        self.identity_maps = (np.eye(num_stages), np.zeros(num_stages), np.eye(num_stages))
+
+        # The stages of an explicit method are evaluated one at a time,
+        # but they are always linearized together for each step.
+        if self.explicit:
+            self.stage_evaluator = ODEEvaluator(ode_function, 1)
+        self.step_evaluator = ODEEvaluator(ode_function, num_stages)
+
+        self.add_input('h_vec', shape=num_times - 1, units=time_units)
+
+        if self.has_stage_times:
+            self.add_input('stage_times', shape=num_stage_times, units=time_units)
+
+        if self.events:
+            self.event_evaluator = self.stage_evaluator if self.explicit \
+                else ODEEvaluator(ode_function, 1)
+
+            # Interpolant of the states on a substep from its own step vectors and stage rates:
+            # its weights are interp_coeffs, in increasing powers of theta, on the end values
+            # and on the slopes, which are interp_stages times the stage rates.
+            conditions = get_slope_conditions(glm_A, glm_B, glm_U, glm_V, self.abscissa, 0, 1)
+            self.interp_coeffs = get_interp_coeffs([theta for theta, terms in conditions])
+            self.interp_stages = np.zeros((len(conditions), num_stages))
+            for ind, (theta, terms) in enumerate(conditions):
+                for j_step, j_stage, coeff in terms:
+                    self.interp_stages[ind, j_stage] += coeff
+
+            for event_name in self.events:
+                self.add_output(get_name('event_time', event_name), units=time_units)
+
+        self.newton_lu = None
+        self.num_factorizations = 0
+
+        # Decoupled stage systems, if glm_A is diagonalizable, with the Jacobian of the rates
+        # evaluated at a single node
+        self.kronecker_solver = None
+        if not self.explicit and self.options['stage_solver'] == 'kronecker':
+            kronecker_solver = setup_cache.get(
+                ('KroneckerStageSolver', get_array_key(glm_A)),
+                lambda: KroneckerStageSolver(glm_A))
+            if kronecker_solver.diagonalizable:
+                self.kronecker_solver = kronecker_solver
+                self.jacobian_evaluator = ODEEvaluator(ode_function, 1)
+
+        for state_name, state in iteritems(states):
+            self.add_input(get_name('y0', state_name),
+                shape=(num_step_vars,) + state['shape'],
+                units=state['units'])
+
+            if self.options['state_dir'] is None:
+                self.add_output(get_name('y', state_name),
+                    shape=(num_times, num_step_vars,) + state['shape'],
+                    units=state['units'])
+            else:
+                self.add_output(get_name('final_state', state_name),
+                    shape=state['shape'], units=state['units'])
+
+                if self.options['num_starting_times'] > 1:
+                    self.add_input(get_name('starting_state', state_name),
+                        shape=(self.options['num_starting_times'],) + state['shape'],
+                        units=state['units'])
+
+            if self.options['output_rates']:
+                self.add_output(get_name('F', state_name),
+                    shape=(num_times - 1, num_stages,) + state['shape'],
+                    units=get_rate_units(state['units'], time_units))
+
+        for parameter_name, parameter in iteritems(static_parameters):
+            self.add_input(get_name('static_parameter', parameter_name),
+                shape=parameter['shape'],
+                units=parameter['units'])
+
+        for parameter_name, parameter in iteritems(dynamic_parameters):
+            self.add_input(get_name('dynamic_parameter', parameter_name),
+                shape=(num_stage_times,) + parameter['shape'],
+                units=parameter['units'])
+
+        self.lin_data = {}
+
+    def _pack_inputs(self, inputs):
+        ode_function = self.options['ode_function']
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_step_vars = self.options['num_step_vars']
+
+        evaluator = self.step_evaluator
+
+        y0 = np.zeros((num_step_vars, evaluator.num_state_vars))
+        for state_name in ode_function._states:
+            ind1, ind2 = evaluator.state_offsets[state_name]
+            y0[:, ind1:ind2] = inputs[get_name('y0', state_name)].reshape(
+                (num_step_vars, ind2 - ind1))
+
+        if self.has_stage_times:
+            stage_times = inputs['stage_times'].reshape((num_times - 1, num_stages))
+        else:
+            stage_times = np.zeros((num_times - 1, num_stages))
+
+        static = np.zeros(evaluator.num_static_vars)
+        for parameter_name in ode_function._static_parameters:
+            ind1, ind2 = evaluator.static_offsets[parameter_name]
+            static[ind1:ind2] = inputs[get_name('static_parameter', parameter_name)].flatten()
+
+        dynamic = np.zeros((num_times - 1, num_stages, evaluator.num_dynamic_vars))
+        for parameter_name in ode_function._dynamic_parameters:
+            ind1, ind2 = evaluator.dynamic_offsets[parameter_name]
+            dynamic[:, :, ind1:ind2] = inputs[get_name('dynamic_parameter', parameter_name)] \
+                .reshape((num_times - 1, num_stages, ind2 - ind1))
+
+        return inputs['h_vec'], y0, stage_times, static, dynamic
+
+    def _compute_stages(self, y_i, h, stage_times_i, static, dynamic_i):
+        num_stages = self.options['num_stages']
+        glm_A = self.options['glm_A']
+        glm_U = self.options['glm_U']
+
+        if self.explicit:
+            evaluator = self.stage_evaluator
+
+            Y_i = np.zeros((num_stages, evaluator.num_state_vars))
+            F_i = np.zeros((num_stages, evaluator.num_state_vars))
+            for i_stage in range(num_stages):
+                Y_i[i_stage] = glm_U[i_stage].dot(y_i) \
+                    + h * glm_A[i_stage, :i_stage].dot(F_i[:i_stage])
+
+                F_i[i_stage] = evaluator.compute_rates(
+                    Y_i[i_stage:i_stage + 1], stage_times_i[i_stage:i_stage + 1],
+                    static, dynamic_i[i_stage:i_stage + 1])[0]
+        else:
+            newton_tol = self.options['newton_tol']
+            newton_maxiter = self.options['newton_maxiter']
+            modified_newton = self.options['modified_newton']
+            max_contraction = self.options['max_contraction']
+
+            evaluator = self.step_evaluator
+
+            # Newton's method on the stage equations, F - f(U y + h A F) = 0
+            F_i = evaluator.compute_rates(glm_U.dot(y_i), stage_times_i, static, dynamic_i)
+            last_norm = None
+            for counter in range(newton_maxiter):
+                Y_i = glm_U.dot(y_i) + h * glm_A.dot(F_i)
+                residual = F_i - evaluator.compute_rates(Y_i, stage_times_i, static, dynamic_i)
+                norm = np.linalg.norm(residual)
+                if norm <= newton_tol * (1. + np.linalg.norm(F_i)):
+                    break
+
+                # With modified Newton, the factorization is kept from the previous iterations
+                # and steps while the residual norm contracts fast enough
+                if not modified_newton or self.newton_lu is None or \
+                        (last_norm is not None and norm > max_contraction * last_norm):
+                    if self.kronecker_solver is not None:
+                        jac = self._compute_step_jacobian(y_i, stage_times_i, static, dynamic_i)
+                        self.newton_lu = self.kronecker_solver.factor(h, jac)
+                    else:
+                        self.newton_lu = self._factor_stage_matrix(
+                            h, evaluator.compute_jacobians()[0])
+                    self.num_factorizations += 1
+
+                if self.kronecker_solver is not None:
+                    state_groups = evaluator.state_groups
+                    F_i[:, state_groups] -= self.kronecker_solver.solve(
+                        self.newton_lu, residual[:, state_groups])
+                else:
+                    F_i -= self._solve_stage_matrix(self.newton_lu, residual)
+                last_norm = norm
+
+        return Y_i, F_i
+
+    def _compute_step_jacobian(self, y_i, stage_times_i, static, dynamic_i):
+        # Jacobian of the rates at the state at the start of the step, with the time and the
+        # dynamic parameters of the first stage, shared by all stages
+        evaluator = self.jacobian_evaluator
+
+        evaluator.compute_rates(y_i[:1], stage_times_i[:1], static, dynamic_i[:1])
+        return evaluator.compute_jacobians()[0][0]
+
+    def _get_substep_maps(self, sigma, dsigma):
+        """
+        Return the linear maps from the inputs of an interval to those of a substep.
+
+        A substep covering the fraction [sigma, sigma + dsigma] of an interval has the step
+        size dsigma * h, the stage times mtx_T.dot(stage_times) + t_coeffs * h, and the dynamic
+        parameters mtx_D.dot(dynamic), where stage_times and dynamic are those of the interval.
+        """
+        if not self.adaptive:
+            return self.identity_maps
+
+        return self._get_position_maps(sigma + dsigma * self.abscissa)[:3]
+
+    def _get_position_maps(self, positions):
+        """
+        Return the linear maps from the inputs of an interval to those at fractions of it.
+
+        At the given fractions of an interval, the times are mtx_T.dot(stage_times) + t_coeffs * h
+        and the dynamic parameters are mtx_D.dot(dynamic), whose derivative with respect to the
+        fractions is mtx_dD.dot(dynamic).
+        """
+        num_stages = self.options['num_stages']
+        abscissa = self.abscissa
+
+        mtx_T = np.zeros((len(positions), num_stages))
+        mtx_T[:, 0] = 1.
+        t_coeffs = positions - abscissa[0]
+
+        # Piecewise-linear interpolation over the distinct abscissa values
+        unique_abscissa, indices = np.unique(abscissa, return_index=True)
+        mtx_D = np.zeros((len(positions), num_stages))
+        for ind, index in enumerate(indices):
+            basis = np.zeros(len(unique_abscissa))
+            basis[ind] = 1.
+            mtx_D[:, index] = np.interp(positions, unique_abscissa, basis)
+
+        mtx_dD = np.zeros((len(positions), num_stages))
+        if len(unique_abscissa) > 1:
+            segments = np.clip(np.searchsorted(unique_abscissa, positions, side='right') - 1,
+                0, len(unique_abscissa) - 2)
+            for ind, (segment, position) in enumerate(zip(segments, positions)):
+                if unique_abscissa[0] <= position <= unique_abscissa[-1]:
+                    width = unique_abscissa[segment + 1] - unique_abscissa[segment]
+                    mtx_dD[ind, indices[segment]] = -1. / width
+                    mtx_dD[ind, indices[segment + 1]] = 1. / width
+
+        return mtx_T, t_coeffs, mtx_D, mtx_dD
+
+    def _compute_substep(self, y_i, h, stage_times_i, static, dynamic_i, sigma, dsigma):
+        glm_B = self.options['glm_B']
+        glm_V = self.options['glm_V']
+
+        mtx_T, t_coeffs, mtx_D = self._get_substep_maps(sigma, dsigma)
+
+        Y_i, F_i = self._compute_stages(y_i, dsigma * h,
+            mtx_T.dot(stage_times_i) + t_coeffs * h, static, mtx_D.dot(dynamic_i))
+
+        return Y_i, F_i, glm_V.dot(y_i) + dsigma * h * glm_B.dot(F_i)
+
+    def _march_interval(self, y_i, h, stage_times_i, static, dynamic_i):
+        """
+        Cover one interval with substeps, chosen adaptively from the local error estimates.
+
+        Returns the (sigma, dsigma) pairs of the accepted substeps, as fractions of the interval,
+        the step vectors at the start of each substep, and their stage values and rates.
+        """
+        if not self.adaptive:
+            Y_i, F_i, y_next = self._compute_substep(
+                y_i, h, stage_times_i, static, dynamic_i, 0., 1.)
+            return np.array([[0., 1.]]), [y_i], [Y_i], [F_i], y_next
+
+        error_weights = self.options['error_weights']
+        atol = self.options['atol']
+        rtol = self.options['rtol']
+        max_substeps = self.options['max_substeps']
+        exponent = 1. / (self.options['embedded_order'] + 1)
+
+        substeps, y_list, Y_list, F_list = [], [], [], []
+
+        # The trial substep size, carried over from the previous interval
+        dsigma_trial = self.h_trial / h if self.h_trial is not None else 1.
+
+        sigma = 0.
+        while len(substeps) < max_substeps:
+            last = sigma + dsigma_trial >= 1. - 1e-12
+            dsigma = 1. - sigma if last else dsigma_trial
+
+            Y_i, F_i, y_next = self._compute_substep(
+                y_i, h, stage_times_i, static, dynamic_i, sigma, dsigma)
+            self.num_substeps += 1
+
+            error = dsigma * h * error_weights.dot(F_i)
+            scale = atol + rtol * np.maximum(np.abs(y_i), np.abs(y_next))
+            error_norm = np.sqrt(np.mean((error / scale) ** 2))
+
+            if error_norm == 0.:
+                factor = 5.
+            else:
+                factor = min(5., max(0.2, 0.9 * error_norm ** -exponent))
+
+            if error_norm <= 1.:
+                substeps.append([sigma, dsigma])
+                y_list.append(y_i)
+                Y_list.append(Y_i)
+                F_list.append(F_i)
+
+                y_i = y_next
+                sigma += dsigma
+
+                if last:
+                    self.h_trial = max(dsigma, dsigma_trial) * factor * h
+                    return np.array(substeps), y_list, Y_list, F_list, y_i
+
+            dsigma_trial = dsigma * factor
+
+        raise AnalysisError('The maximum number of substeps, %i, was reached in an interval'
+            % max_substeps)
+
+    def _get_interp_weights(self, theta, deriv=False):
+        """
+        Return the weights of the start and end states and the stage rates in the interpolant.
+
+        The interpolant of the states at the fraction theta of a substep of size h is
+        weight_s * y_s + weight_e * y_e + h * weights_F.dot(F_i), or its derivative with respect
+        to theta if deriv is True.
+        """
+        coeffs = self.interp_coeffs
+        if deriv:
+            coeffs = np.polynomial.polynomial.polyder(coeffs, axis=0)
+
+        weights = np.polynomial.polynomial.polyval(theta, coeffs)
+
+        return weights[0], weights[1], weights[2:].dot(self.interp_stages)
+
+    def _get_event_point(self, theta, sigma, dsigma, h, stage_times_i, dynamic_i, y_s, y_e, F_i):
+        mtx_T, t_coeffs, mtx_D, mtx_dD = self._get_position_maps(np.array([sigma + dsigma * theta]))
+        weight_s, weight_e, weights_F = self._get_interp_weights(theta)
+
+        state = weight_s * y_s[0] + weight_e * y_e[0] + dsigma * h * weights_F.dot(F_i)
+        time = mtx_T.dot(stage_times_i) + t_coeffs * h
+
+        return state, time, mtx_D.dot(dynamic_i)
+
+    def _compute_events(self, theta, sigma, dsigma, h, stage_times_i, static, dynamic_i,
+            y_s, y_e, F_i):
+        state, time, dynamic = self._get_event_point(
+            theta, sigma, dsigma, h, stage_times_i, dynamic_i, y_s, y_e, F_i)
+
+        self.event_evaluator.compute_rates(state.reshape((1, -1)), time, static, dynamic)
+        return self.event_evaluator.compute_events()[0]
+
+    def _locate_events(self, i_step, substeps, y_list, F_list, y_next, h, stage_times_i, static,
+            dynamic_i):
+        """
+        Locate the zero crossings of the event functions in the substeps of an interval.
+
+        Returns the index of the substep of the first terminal event, or None.
+        """
+        events = list(self.events.values())
+        event_tol = self.options['event_tol']
+
+        for i_sub, ((sigma, dsigma), y_s, y_e, F_i) in enumerate(
+                zip(substeps, y_list, y_list[1:] + [y_next], F_list)):
+            args = (sigma, dsigma, h, stage_times_i, static, dynamic_i, y_s, y_e, F_i)
+
+            if self.event_values is None:
+                self.event_values = self._compute_events(0., *args)
+            values0 = self.event_values
+            values1 = self.event_values = self._compute_events(1., *args)
+
+            crossings = []
+            for ind, event in enumerate(events):
+                rising = values0[ind] < 0. <= values1[ind]
+                falling = values0[ind] > 0. >= values1[ind]
+
+                if (rising and event['direction'] >= 0) or (falling and event['direction'] <= 0):
+                    if values1[ind] == 0.:
+                        theta = 1.
+                    else:
+                        theta = scipy.optimize.brentq(
+                            lambda theta: self._compute_events(theta, *args)[ind],
+                            0., 1., xtol=event_tol)
+                    crossings.append((theta, ind))
+
+            for theta, ind in sorted(crossings):
+                event = events[ind]
+                state, time, dynamic = self._get_event_point(
+                    theta, sigma, dsigma, h, stage_times_i, dynamic_i, y_s, y_e, F_i)
+
+                key = (i_step, i_sub, ind)
+                self.event_records[key] = (theta, time[0], y_s.copy(), y_e.copy(), F_i)
+                self.event_log[event['name']].append(time[0])
+                if self.event_keys[event['name']] is None:
+                    self.event_keys[event['name']] = key
+
+                if event['terminal']:
+                    self.stop_key = key
+                    self.stop_vector = y_e.copy()
+                    self.stop_vector[0] = state
+                    return i_sub
+
+    def compute(self, inputs, outputs):
+        ode_function = self.options['ode_function']
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_step_vars = self.options['num_step_vars']
+        max_stored_steps = self.options['max_stored_steps']
+
+        evaluator = self.step_evaluator
+        num_state_vars = evaluator.num_state_vars
+
+        h_vec, y0, stage_times, static, dynamic = self._pack_inputs(inputs)
+
+        # Factorization of the Newton matrix of the implicit stage equations
+        self.newton_lu = None
+        self.num_factorizations = 0
+
+        # y: (num_times, num_step_vars, num_state_vars) on the time grid, and F, the stage rates
+        # of each step, only if they are output; both are memory-mapped with checkpoints or
+        # state files. For each interval, substeps holds the (sigma, dsigma) pairs and y_sub
+        # the step vectors of its substeps, and Y and F hold the stage values and rates as
+        # (num_substeps, num_stages, ...) arrays.
+        state_dir = self.options['state_dir']
+        if state_dir is not None:
+            state_files = self._open_state_files(inputs)
+
+        checkpoint_file = self.options['checkpoint_file']
+        checkpoint = None
+        if checkpoint_file is not None:
+            self.checkpoint = self._create_checkpoint(h_vec, y0, stage_times, static, dynamic)
+            trajectory, checkpoint = self.checkpoint.open(self.options['restart'])
+            y, F = trajectory['y'], trajectory.get('F')
+        else:
+            if state_dir is not None:
+                y = np.lib.format.open_memmap(os.path.join(state_dir, 'y.npy'), mode='w+',
+                    dtype=float, shape=(num_times, num_step_vars, num_state_vars))
+            else:
+                y = np.zeros((num_times, num_step_vars, num_state_vars))
+
+            F = None
+            if self.options['output_rates']:
+                F = np.zeros((num_times - 1, num_stages, num_state_vars))
+
+        self.substeps = []
+        self.y_sub = []
+        self.Y = [] if max_stored_steps is None else None
+        self.F = [] if max_stored_steps is None else None
+
+        # Trial substep size carried across intervals, and the number of substeps attempted,
+        # including those that are rejected
+        self.h_trial = None
+        self.num_substeps = 0
+
+        # The event function values at the start of the current substep, the times of all
+        # crossings of each event, and the (i_step, i_sub, ind) keys of the crossings that
+        # determine the event times and the end of the marching, if any
+        self.event_values = None
+        self.event_log = dict((event_name, []) for event_name in self.events)
+        self.event_records = {}
+        self.event_keys = dict((event_name, None) for event_name in self.events)
+        self.stop_key = None
+
+        y[0] = y0
+        i_start = 0
+        if checkpoint is not None:
+            i_start = self._restore_checkpoint(checkpoint, y)
+
+        if state_dir is not None:
+            for i_time in range(i_start + 1):
+                self._write_states(state_files, i_time, y[i_time])
+
+        for i_step in range(i_start, num_times - 1):
+            if self.stop_key is not None:
+                # Past a terminal event, the states are held and the intervals have no substeps
+                substeps, y_list, Y_list, F_list = np.zeros((0, 2)), [], [], []
+                y[i_step + 1] = y[i_step]
+            else:
+                substeps, y_list, Y_list, F_list, y[i_step + 1] = self._march_interval(
+                    y[i_step], h_vec[i_step], stage_times[i_step], static, dynamic[i_step])
+
+                i_stop = None
+                if self.events:
+                    i_stop = self._locate_events(i_step, substeps, y_list, F_list, y[i_step + 1],
+                        h_vec[i_step], stage_times[i_step], static, dynamic[i_step])
+
+                if i_stop is not None:
+                    substeps = substeps[:i_stop + 1]
+                    y_list, Y_list, F_list = \
+                        y_list[:i_stop + 1], Y_list[:i_stop + 1], F_list[:i_stop + 1]
+                    y[i_step + 1] = self.stop_vector
+
+                if F is not None:
+                    F[i_step] = F_list[-1]
+
+            self.substeps.append(substeps)
+            self.y_sub.append(y_list)
+            if max_stored_steps is None:
+                self.Y.append(Y_list)
+                self.F.append(F_list)
+
+            if checkpoint_file is not None and ((i_step + 1) % self.options[
+                    'checkpoint_interval'] == 0 or i_step == num_times - 2):
+                self._save_checkpoint(i_step + 1, trajectory)
+
+            if state_dir is not None:
+                self._write_states(state_files, i_step + 1, y[i_step + 1])
+
+        for state_name, state in iteritems(ode_function._states):
+            ind1, ind2 = evaluator.state_offsets[state_name]
+            if state_dir is None:
+                outputs[get_name('y', state_name)] = y[:, :, ind1:ind2].reshape(
+                    (num_times, num_step_vars,) + state['shape'])
+            else:
+                state_files[state_name].flush()
+                outputs[get_name('final_state', state_name)] = y[-1, 0, ind1:ind2].reshape(
+                    state['shape'])
+
+            if self.options['output_rates']:
+                outputs[get_name('F', state_name)] = F[:, :, ind1:ind2].reshape(
+                    (num_times - 1, num_stages,) + state['shape'])
+
+        for event_name in self.events:
+            if self.event_keys[event_name] is None:
+                self.event_keys[event_name] = self.stop_key
+
+            key = self.event_keys[event_name]
+            if key is not None:
+                outputs[get_name('event_time', event_name)] = self.event_records[key][1]
+            else:
+                outputs[get_name('event_time', event_name)] = \
+                    stage_times[-1, 0] + (1. - self.abscissa[0]) * h_vec[-1]
+
+        self.y = y
+        self.lin_data = {}
+
+    def _open_state_files(self, inputs):
+        ode_function = self.options['ode_function']
+        num_times = self.options['num_times']
+        num_starting_times = self.options['num_starting_times']
+
+        state_files = {}
+        for state_name, state in iteritems(ode_function._states):
+            state_files[state_name] = open_state_file(self.options['state_dir'], state_name,
+                (num_starting_times - 1 + num_times,) + state['shape'])
+
+            if num_starting_times > 1:
+                state_files[state_name][:num_starting_times - 1] = \
+                    inputs[get_name('starting_state', state_name)][:-1]
+
+        return state_files
+
+    def _write_states(self, state_files, i_time, y_i):
+        offset = self.options['num_starting_times'] - 1
+
+        for state_name, state in iteritems(self.options['ode_function']._states):
+            ind1, ind2 = self.step_evaluator.state_offsets[state_name]
+            state_files[state_name][offset + i_time] = y_i[0, ind1:ind2].reshape(state['shape'])
+
+    def _create_checkpoint(self, h_vec, y0, stage_times, static, dynamic):
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_step_vars = self.options['num_step_vars']
+        num_state_vars = self.step_evaluator.num_state_vars
+
+        options = tuple((name, self.options[name]) for name in [
+            'num_step_vars', 'newton_tol', 'newton_maxiter', 'modified_newton',
+            'max_contraction', 'stage_solver', 'embedded_order', 'atol', 'rtol',
+            'max_substeps', 'output_rates'])
+        arrays = [h_vec, y0, stage_times, static, dynamic] + [self.options[name] for name in [
+            'glm_A', 'glm_B', 'glm_U', 'glm_V', 'error_weights'] if self.options[name] is not None]
+        options += (_get_system_description(self.options['ode_function'], arrays),)
+
+        # The step vectors, the rates if they are output, and, for adaptive substeps, records
+        # of sigma, dsigma, and the step vector at the start of each substep
+        shapes = {'y': (num_times, num_step_vars, num_state_vars)}
+        if self.options['output_rates']:
+            shapes['F'] = (num_times - 1, num_stages, num_state_vars)
+        record_size = 2 + num_step_vars * num_state_vars if self.adaptive else None
+
+        return TrajectoryCheckpoint(self.options['checkpoint_file'],
+            get_checkpoint_key(arrays, options), shapes, record_size)
+
+    def _save_checkpoint(self, num_steps, trajectory):
+        records = None
+        if self.adaptive:
+            records = [np.hstack([self.substeps[i_step],
+                np.array(self.y_sub[i_step]).reshape((len(self.substeps[i_step]), -1))])
+                for i_step in range(self.checkpoint.num_saved_steps, num_steps)]
+
+        arrays = {
+            'y': trajectory['y'][num_steps],
+            'h_trial': np.array(np.nan if self.h_trial is None else self.h_trial),
+            'num_attempted': np.array(self.num_substeps),
+            'num_factorizations': np.array(self.num_factorizations),
+        }
+
+        # The Newton factorization, from the dense or the decoupled stage solver
+        if isinstance(self.newton_lu, dict):
+            for ind, (lu, piv) in iteritems(self.newton_lu):
+                arrays['newton_lu_%i' % ind] = lu
+                arrays['newton_piv_%i' % ind] = piv
+        elif self.newton_lu is not None:
+            arrays['newton_lu'], arrays['newton_piv'] = self.newton_lu
+
+        self.checkpoint.save(num_steps, trajectory, arrays, records)
+
+    def _restore_checkpoint(self, checkpoint, y):
+        num_step_vars = self.options['num_step_vars']
+        num_state_vars = self.step_evaluator.num_state_vars
+
+        num_steps = int(checkpoint['num_steps'])
+        y[num_steps] = checkpoint['y']
+
+        for i_step in range(num_steps):
+            if self.adaptive:
+                records = checkpoint['records'][i_step]
+                self.substeps.append(records[:, :2])
+                self.y_sub.append(list(
+                    records[:, 2:].reshape((-1, num_step_vars, num_state_vars))))
+            else:
+                self.substeps.append(np.array([[0., 1.]]))
+                self.y_sub.append([y[i_step]])
+
+            if self.F is not None:
+                self.Y.append(None)
+                self.F.append(None)
+
+        self.h_trial = None if np.isnan(checkpoint['h_trial']) else float(checkpoint['h_trial'])
+        self.num_substeps = int(checkpoint['num_attempted'])
+        self.num_factorizations = int(checkpoint['num_factorizations'])
+
+        if 'newton_lu' in checkpoint:
+            self.newton_lu = (checkpoint['newton_lu'], checkpoint['newton_piv'])
+        elif any(name.startswith('newton_lu_') for name in checkpoint):
+            self.newton_lu = {}
+            for name in checkpoint:
+                if name.startswith('newton_lu_'):
+                    ind = int(name.split('_')[-1])
+                    self.newton_lu[ind] = (checkpoint[name], checkpoint['newton_piv_%i' % ind])
+
+        return num_steps
+
+    def compute_partials(self, inputs, partials):
+        num_times = self.options['num_times']
+
+        self.lin_data = {}
+
+        # Without a memory limit, all steps are linearized up front;
+        # otherwise, they are linearized in blocks as the derivative sweeps reach them.
+        if self.options['max_stored_steps'] is None:
+            self._linearize_steps(inputs, range(num_times - 1))
+
+        if self.events:
+            self._linearize_events(inputs)
+
+    def _linearize_steps(self, inputs, steps):
+        evaluator = self.step_evaluator
+
+        h_vec, y0, stage_times, static, dynamic = self._pack_inputs(inputs)
+
+        # For each interval, a list with the linearization of each of its substeps
+        self.lin_data = lin_data = {}
+        for i_step in steps:
+            lin_data[i_step] = []
+            for i_sub, (sigma, dsigma) in enumerate(self.substeps[i_step]):
+                mtx_T, t_coeffs, mtx_D = maps = self._get_substep_maps(sigma, dsigma)
+
+                h = dsigma * h_vec[i_step]
+                stage_times_i = mtx_T.dot(stage_times[i_step]) + t_coeffs * h_vec[i_step]
+                dynamic_i = mtx_D.dot(dynamic[i_step])
+
+                # The stages of the steps restored from a checkpoint are not stored
+                if self.F is not None and self.F[i_step] is not None:
+                    Y_i = self.Y[i_step][i_sub]
+                    F_i = self.F[i_step][i_sub]
+                else:
+                    Y_i, F_i = self._compute_stages(
+                        self.y_sub[i_step][i_sub], h, stage_times_i, static, dynamic_i)
+
+                evaluator.compute_rates(Y_i, stage_times_i, static, dynamic_i)
+                jac_y, jac_t, jac_s, jac_d = evaluator.compute_jacobians()
+
+                # dF = jac_y dY + ..., dY = h A dF + ...  =>  (I - h jac_y A) dF = ...
+                lu = None
+                if not self.explicit:
+                    lu = self._factor_stage_matrix(h, jac_y)
+
+                lin_data[i_step].append(
+                    (dsigma, maps, F_i, lu, jac_y, jac_t, jac_s, jac_d))
+
+    def _factor_stage_matrix(self, h, jac_y):
+        """
+        Factor the matrix I - h jac_y A of the stage equations of an implicit method.
+
+        With jac_y given by its blocks from compute_jacobians, the matrix is block diagonal
+        over the groups of the evaluator, with blocks of num_stages times the group size
+        ordered stage-major, which are factored separately.
+        """
+        glm_A = self.options['glm_A']
+        num_groups, group_size = self.step_evaluator.state_groups.shape
+        size = glm_A.shape[0] * group_size
+
+        blocks = np.einsum('ij,igab->giajb', glm_A, jac_y).reshape((num_groups, size, size))
+        return block_lu_factor(np.eye(size) - h * blocks)
+
+    def _solve_stage_matrix(self, lu, rhs, trans=0):
+        # Solve with the factors from _factor_stage_matrix, rhs and the solution being packed
+        # (num_stages, num_state_vars) arrays
+        state_groups = self.step_evaluator.state_groups
+        num_groups = state_groups.shape[0]
+        num_stages = rhs.shape[0]
+
+        sol = block_lu_solve(lu,
+            rhs[:, state_groups].transpose((1, 0, 2)).reshape((num_groups, -1)), trans=trans)
+
+        packed_sol = np.zeros(rhs.shape)
+        packed_sol[:, state_groups] = sol.reshape(
+            (num_groups, num_stages, -1)).transpose((1, 0, 2))
+        return packed_sol
+
+    def _solve_linear_stages(self, lu, jac_y, h, rhs, trans=0):
+        """
+        Solve the linearized stage equations (I - h jac_y A) dF = rhs, or their transpose.
+
+        With lu, the factors of the matrix of an implicit method. Otherwise, the method is
+        explicit: jac_y is block diagonal over the stages and A is strictly lower triangular,
+        so the stages are solved one at a time by forward (or, transposed, backward)
+        substitution with the diagonal blocks of jac_y.
+        """
+        glm_A = self.options['glm_A']
+        num_stages = rhs.shape[0]
+        state_groups = self.step_evaluator.state_groups
+
+        if lu is not None:
+            return self._solve_stage_matrix(lu, rhs, trans=trans)
+
+        def dot(i_stage, vec, trans):
+            return block_dot(jac_y[i_stage:i_stage + 1], vec.reshape((1, -1)),
+                state_groups, state_groups, trans=trans)[0]
+
+        sol = np.zeros(rhs.shape)
+        if trans == 0:
+            for i_stage in range(num_stages):
+                sol[i_stage] = rhs[i_stage] \
+                    + h * dot(i_stage, glm_A[i_stage, :i_stage].dot(sol[:i_stage]), False)
+        else:
+            # The products of the transposed diagonal blocks with the solved stages
+            prods = np.zeros(rhs.shape)
+            for i_stage in range(num_stages - 1, -1, -1):
+                sol[i_stage] = rhs[i_stage] \
+                    + h * glm_A[i_stage + 1:, i_stage].dot(prods[i_stage + 1:])
+                prods[i_stage] = dot(i_stage, sol[i_stage], True)
+
+        return sol
+
+    def _linearize_events(self, inputs):
+        evaluator = self.event_evaluator
+
+        h_vec, y0, stage_times, static, dynamic = self._pack_inputs(inputs)
+
+        # For each crossing, the linearization of its time and state w.r.t. the inputs and
+        # the step vectors and stage rates of its substep
+        self.event_lin = {}
+        for key, (theta, time, y_s, y_e, F_i) in iteritems(self.event_records):
+            i_step, i_sub, ind = key
+            sigma, dsigma = self.substeps[i_step][i_sub]
+            h = dsigma * h_vec[i_step]
+
+            mtx_T, t_coeffs, mtx_D, mtx_dD = self._get_position_maps(
+                np.array([sigma + dsigma * theta]))
+            weights = self._get_interp_weights(theta)
+            dweight_s, dweight_e, dweights_F = self._get_interp_weights(theta, deriv=True)
+
+            state, time, dynamic_point = self._get_event_point(theta, sigma, dsigma,
+                h_vec[i_step], stage_times[i_step], dynamic[i_step], y_s, y_e, F_i)
+            evaluator.compute_rates(state.reshape((1, -1)), time, static, dynamic_point)
+            jac_y, jac_t, jac_s, jac_d = evaluator.compute_event_jacobians()
+
+            # Derivatives of the state, time, and dynamic parameters at the crossing w.r.t. theta
+            dstate = dweight_s * y_s[0] + dweight_e * y_e[0] + h * dweights_F.dot(F_i)
+            ddynamic = dsigma * mtx_dD.dot(dynamic[i_step])[0]
+
+            # Derivative of the event function along the interpolant
+            g_theta = jac_y[ind].dot(dstate) + jac_t[ind, 0] * h + jac_d[ind].dot(ddynamic)
+
+            self.event_lin[key] = (dsigma, weights, dstate, F_i, mtx_T[0], t_coeffs[0],
+                mtx_D[0], jac_y[ind], jac_t[ind, 0], jac_s[ind], jac_d[ind], g_theta)
+
+    def _get_event_keys(self, i_step, i_sub):
+        # The crossings in a substep, the terminal one first
+        keys = [(i_step, i_sub, ind) for ind in range(len(self.events))]
+        keys = [key for key in keys if key in self.event_lin]
+        return sorted(keys, key=lambda key: key != self.stop_key)
+
+    def _fwd_event(self, key, h_i, d_h_i, d_y_s, d_y_e, d_F, d_stage_times_i, d_static,
+            d_dynamic_i):
+        dsigma, (weight_s, weight_e, weights_F), dstate, F_i, row_T, t_coeff, row_D, \
+            g_y, g_t, g_s, g_d, g_theta = self.event_lin[key]
+
+        h = dsigma * h_i
+
+        d_state = weight_s * d_y_s[0] + weight_e * d_y_e[0] + h * weights_F.dot(d_F) \
+            + dsigma * d_h_i * weights_F.dot(F_i)
+        d_time = row_T.dot(d_stage_times_i) + t_coeff * d_h_i
+
+        # The crossing moves along the interpolant to keep the event function at zero
+        d_theta = -(g_y.dot(d_state) + g_t * d_time + g_s.dot(d_static)
+            + g_d.dot(row_D.dot(d_dynamic_i))) / g_theta
+
+        return d_time + h * d_theta, d_state + dstate * d_theta
+
+    def _rev_event(self, key, h_i, s_time, s_state):
+        dsigma, (weight_s, weight_e, weights_F), dstate, F_i, row_T, t_coeff, row_D, \
+            g_y, g_t, g_s, g_d, g_theta = self.event_lin[key]
+
+        h = dsigma * h_i
+
+        d_g = -(s_time * h + s_state.dot(dstate)) / g_theta
+        r_state = s_state + d_g * g_y
+        r_time = s_time + d_g * g_t
+
+        return (weight_s * r_state, weight_e * r_state, h * np.outer(weights_F, r_state),
+            dsigma * weights_F.dot(F_i).dot(r_state) + t_coeff * r_time,
+            row_T * r_time, d_g * g_s, np.outer(row_D, d_g * g_d))
+
+    def _get_lin_data(self, inputs, i_step, mode):
+        if i_step not in self.lin_data:
+            num_steps = self.options['num_times'] - 1
+            max_stored_steps = self.options['max_stored_steps'] or num_steps
+
+            # Linearize the block of steps that the sweep visits next
+            if mode == 'fwd':
+                steps = range(i_step, min(i_step + max_stored_steps, num_steps))
+            elif mode == 'rev':
+                steps = range(max(i_step - max_stored_steps + 1, 0), i_step + 1)
+
+            self._linearize_steps(inputs, steps)
+
+        return self.lin_data[i_step]
+
+    def _pack_d_inputs(self, d_inputs):
+        ode_function = self.options['ode_function']
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_step_vars = self.options['num_step_vars']
+
+        evaluator = self.step_evaluator
+
+        d_h_vec = np.zeros(num_times - 1)
+        if 'h_vec' in d_inputs:
+            d_h_vec[:] = d_inputs['h_vec']
+
+        d_y0 = np.zeros((num_step_vars, evaluator.num_state_vars))
+        for state_name in ode_function._states:
+            y0_name = get_name('y0', state_name)
+            if y0_name in d_inputs:
+                ind1, ind2 = evaluator.state_offsets[state_name]
+                d_y0[:, ind1:ind2] = d_inputs[y0_name].reshape((num_step_vars, ind2 - ind1))
+
+        d_stage_times = np.zeros((num_times - 1, num_stages))
+        if 'stage_times' in d_inputs:
+            d_stage_times[:] = d_inputs['stage_times'].reshape((num_times - 1, num_stages))
+
+        d_static = np.zeros(evaluator.num_static_vars)
+        for parameter_name in ode_function._static_parameters:
+            name = get_name('static_parameter', parameter_name)
+            if name in d_inputs:
+                ind1, ind2 = evaluator.static_offsets[parameter_name]
+                d_static[ind1:ind2] = d_inputs[name].flatten()
+
+        d_dynamic = np.zeros((num_times - 1, num_stages, evaluator.num_dynamic_vars))
+        for parameter_name in ode_function._dynamic_parameters:
+            name = get_name('dynamic_parameter', parameter_name)
+            if name in d_inputs:
+                ind1, ind2 = evaluator.dynamic_offsets[parameter_name]
+                d_dynamic[:, :, ind1:ind2] = d_inputs[name].reshape(
+                    (num_times - 1, num_stages, ind2 - ind1))
+
+        return d_h_vec, d_y0, d_stage_times, d_static, d_dynamic
+
+    def compute_jacvec_product(self, inputs, d_inputs, d_outputs, mode):
+        ode_function = self.options['ode_function']
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_step_vars = self.options['num_step_vars']
+        glm_A = self.options['glm_A']
+        glm_B = self.options['glm_B']
+        glm_U = self.options['glm_U']
+        glm_V = self.options['glm_V']
+
+        evaluator = self.step_evaluator
+        num_state_vars = evaluator.num_state_vars
+        num_dynamic_vars = evaluator.num_dynamic_vars
+        state_groups = evaluator.state_groups
+
+        h_vec = inputs['h_vec']
+
+        # The derivatives of the step vectors and the rates on the time grid are only held if
+        # they are outputs; with the states streamed to files, only those of the last step are
+        d_y = None
+        if self.options['state_dir'] is None:
+            d_y = np.zeros((num_times, num_step_vars, num_state_vars))
+
+        d_F_out = None
+        if self.options['output_rates']:
+            d_F_out = np.zeros((num_times - 1, num_stages, num_state_vars))
+
+        if mode == 'fwd':
+            d_h_vec, d_y0, d_stage_times, d_static, d_dynamic = self._pack_d_inputs(d_inputs)
+
+            d_event_times = {}
+            d_y_i = d_y0
+            if d_y is not None:
+                d_y[0] = d_y0
+            for i_step in range(num_times - 1):
+                for i_sub, (dsigma, maps, F_i, lu, jac_y, jac_t, jac_s, jac_d) in enumerate(
+                        self._get_lin_data(inputs, i_step, mode)):
+                    mtx_T, t_coeffs, mtx_D = maps
+                    d_y_s = d_y_i
+                    h = dsigma * h_vec[i_step]
+                    d_h = dsigma * d_h_vec[i_step]
+
+                    d_T = mtx_T.dot(d_stage_times[i_step]) + t_coeffs * d_h_vec[i_step]
+                    vec = block_dot(jac_y, glm_U.dot(d_y_i) + d_h * glm_A.dot(F_i),
+                            state_groups, state_groups) \
+                        + jac_t * d_T[:, np.newaxis] \
+                        + block_dot(jac_s, np.tile(d_static, (num_stages, 1)),
+                            state_groups, evaluator.static_groups) \
+                        + block_dot(jac_d, mtx_D.dot(d_dynamic[i_step]),
+                            state_groups, evaluator.dynamic_groups)
+                    d_F = self._solve_linear_stages(lu, jac_y, h, vec)
+
+                    d_y_i = glm_V.dot(d_y_i) + d_h * glm_B.dot(F_i) + h * glm_B.dot(d_F)
+
+                    for key in self._get_event_keys(i_step, i_sub)[::-1]:
+                        d_event_times[key], d_state = self._fwd_event(key,
+                            h_vec[i_step], d_h_vec[i_step], d_y_s, d_y_i, d_F,
+                            d_stage_times[i_step], d_static, d_dynamic[i_step])
+
+                        # Past a terminal event, the states are held at the event
+                        if key == self.stop_key:
+                            d_y_i = d_y_i.copy()
+                            d_y_i[0] = d_state
+
+                if d_y is not None:
+                    d_y[i_step + 1] = d_y_i
+                if d_F_out is not None:
+                    d_F_out[i_step] = d_F
+
+            for state_name, state in iteritems(ode_function._states):
+                y_name = get_name('y', state_name)
+                ind1, ind2 = evaluator.state_offsets[state_name]
+                if y_name in d_outputs:
+                    d_outputs[y_name] += d_y[:, :, ind1:ind2].reshape(
+                        (num_times, num_step_vars,) + state['shape'])
+
+                final_name = get_name('final_state', state_name)
+                if final_name in d_outputs:
+                    d_outputs[final_name] += d_y_i[0, ind1:ind2].reshape(state['shape'])
+
+                F_name = get_name('F', state_name)
+                if F_name in d_outputs:
+                    d_outputs[F_name] += d_F_out[:, :, ind1:ind2].reshape(
+                        (num_times - 1, num_stages,) + state['shape'])
+
+            for event_name in self.events:
+                name = get_name('event_time', event_name)
+                if name in d_outputs:
+                    key = self.event_keys[event_name]
+                    if key is not None:
+                        d_outputs[name] += d_event_times[key]
+                    else:
+                        d_outputs[name] += d_stage_times[-1, 0] \
+                            + (1. - self.abscissa[0]) * d_h_vec[-1]
+
+        elif mode == 'rev':
+            # Adjoint of the step vector, swept backward from the last step
+            adj = np.zeros((num_step_vars, num_state_vars))
+            for state_name, state in iteritems(ode_function._states):
+                y_name = get_name('y', state_name)
+                ind1, ind2 = evaluator.state_offsets[state_name]
+                if y_name in d_outputs:
+                    d_y[:, :, ind1:ind2] = d_outputs[y_name].reshape(
+                        (num_times, num_step_vars, ind2 - ind1))
+
+                final_name = get_name('final_state', state_name)
+                if final_name in d_outputs:
+                    adj[0, ind1:ind2] = d_outputs[final_name].flatten()
+
+            if d_y is not None:
+                adj += d_y[-1]
+
+            for state_name, state in iteritems(ode_function._states):
+                F_name = get_name('F', state_name)
+                if F_name in d_outputs:
+                    ind1, ind2 = evaluator.state_offsets[state_name]
+                    d_F_out[:, :, ind1:ind2] = d_outputs[F_name].reshape(
+                        (num_times - 1, num_stages, ind2 - ind1))
+
+            d_h_vec = np.zeros(num_times - 1)
+            d_stage_times = np.zeros((num_times - 1, num_stages))
+            d_static = np.zeros(evaluator.num_static_vars)
+            d_dynamic = np.zeros((num_times - 1, num_stages, num_dynamic_vars))
+
+            # Seeds of the event times, keyed by the crossing that determines them
+            s_times = {}
+            for event_name in self.events:
+                name = get_name('event_time', event_name)
+                if name in d_outputs:
+                    key = self.event_keys[event_name]
+                    if key is not None:
+                        s_times[key] = s_times.get(key, 0.) + d_outputs[name][0]
+                    else:
+                        d_stage_times[-1, 0] += d_outputs[name][0]
+                        d_h_vec[-1] += (1. - self.abscissa[0]) * d_outputs[name][0]
+
+            for i_step in range(num_times - 2, -1, -1):
+                lin_data = self._get_lin_data(inputs, i_step, mode)
+                for i_sub in range(len(lin_data) - 1, -1, -1):
+                    dsigma, maps, F_i, lu, jac_y, jac_t, jac_s, jac_d = lin_data[i_sub]
+                    mtx_T, t_coeffs, mtx_D = maps
+                    h = dsigma * h_vec[i_step]
+
+                    # Adjoints of the crossings in this substep
+                    r_y_s = np.zeros(num_state_vars)
+                    r_F = np.zeros((num_stages, num_state_vars))
+                    for key in self._get_event_keys(i_step, i_sub):
+                        s_state = np.zeros(num_state_vars)
+
+                        # The states held past a terminal event are those at the event
+                        adj = adj.copy()
+                        if key == self.stop_key:
+                            s_state = adj[0].copy()
+                            adj[0] = 0.
+
+                        r_y_s_key, r_y_e, r_F_key, r_h, r_T, r_S, r_D = self._rev_event(
+                            key, h_vec[i_step], s_times.get(key, 0.), s_state)
+                        r_y_s += r_y_s_key
+                        adj[0] += r_y_e
+                        r_F += r_F_key
+                        d_h_vec[i_step] += r_h
+                        d_stage_times[i_step] += r_T
+                        d_static += r_S
+                        d_dynamic[i_step] += r_D
+
+                    d_h = np.sum(adj * glm_B.dot(F_i))
+
+                    # Without adaptive substeps, the rates of the one substep are output
+                    vec = h * glm_B.T.dot(adj) + r_F
+                    if d_F_out is not None:
+                        vec += d_F_out[i_step]
+                    vec = self._solve_linear_stages(lu, jac_y, h, vec, trans=1)
+
+                    d_T = np.sum(jac_t * vec, axis=1)
+                    d_stage_times[i_step] += mtx_T.T.dot(d_T)
+                    d_h_vec[i_step] += t_coeffs.dot(d_T)
+                    d_static += block_dot(jac_s, vec,
+                        state_groups, evaluator.static_groups, trans=True).sum(axis=0)
+                    d_dynamic[i_step] += mtx_D.T.dot(block_dot(jac_d, vec,
+                        state_groups, evaluator.dynamic_groups, trans=True))
+
+                    vec = block_dot(jac_y, vec, state_groups, state_groups, trans=True)
+                    d_h += np.sum(vec * glm_A.dot(F_i))
+                    d_h_vec[i_step] += dsigma * d_h
+
+                    adj = glm_V.T.dot(adj) + glm_U.T.dot(vec)
+                    adj[0] += r_y_s
+
+                if d_y is not None:
+                    adj = d_y[i_step] + adj
+
+            if 'h_vec' in d_inputs:
+                d_inputs['h_vec'] += d_h_vec
+
+            if 'stage_times' in d_inputs:
+                d_inputs['stage_times'] += d_stage_times.flatten()
+
+            for state_name, state in iteritems(ode_function._states):
+                y0_name = get_name('y0', state_name)
+                if y0_name in d_inputs:
+                    ind1, ind2 = evaluator.state_offsets[state_name]
+                    d_inputs[y0_name] += adj[:, ind1:ind2].reshape(
+                        (num_step_vars,) + state['shape'])
+
+            for parameter_name, parameter in iteritems(ode_function._static_parameters):
+                name = get_name('static_parameter', parameter_name)
+                if name in d_inputs:
+                    ind1, ind2 = evaluator.static_offsets[parameter_name]
+                    d_inputs[name] += d_static[ind1:ind2].reshape(parameter['shape'])
+
+            for parameter_name, parameter in iteritems(ode_function._dynamic_parameters):
+                name = get_name('dynamic_parameter', parameter_name)
+                if name in d_inputs:
+                    ind1, ind2 = evaluator.dynamic_offsets[parameter_name]
+                    d_inputs[name] += d_dynamic[:, :, ind1:ind2].reshape(
+                        ((num_times - 1) * num_stages,) + parameter['shape'])
+
+
+def _get_system_description(ode_function, arrays):
+    """
+    Return the class and the init kwargs of the ODE system, as a reproducible tuple.
+
+    Array-valued kwargs are appended to arrays, to be hashed with them, and the ODE functions
+    passed as kwargs, e.g., to the system of an ensemble, are described recursively.
+    """
+    system_class = ode_function._system_class
+    kwargs = []
+    for name, value in sorted(iteritems(ode_function._system_init_kwargs)):
+        if isinstance(value, np.ndarray):
+            arrays.append(value)
+            value = np.ndarray
+        elif isinstance(value, ODEFunction):
+            value = _get_system_description(value, arrays)
+        kwargs.append((name, value))
+
+    return '%s.%s' % (system_class.__module__, system_class.__name__), tuple(kwargs)
@@ -57,12 +57,14 @@ class ImplicitTMStageComp(ExplicitComponent):
 
             # -----------------
 
+            # (num_stages,) + shape, without duplicate entries for the sparse assembled Jacobian
+            rows = Y_arange.flatten()
+            cols = np.zeros(num_stages * size, int)
+            self.declare_partials(Y_name, 'h', rows=rows, cols=cols)
+
             # (num_stages, num_stages,) + shape
             rows = np.einsum('i...,j->ij...', Y_arange, np.ones(num_stages, int)).flatten()
 
-            cols = np.zeros((num_stages, num_stages,) + shape, int).flatten()
-            self.declare_partials(Y_name, 'h', rows=rows, cols=cols)
-
             cols = np.einsum('j...,i->ij...', F_arange, np.ones(num_stages, int)).flatten()
             self.declare_partials(Y_name, F_name, rows=rows, cols=cols)
 
@@ -115,4 +117,4 @@ class ImplicitTMStageComp(ExplicitComponent):
                 '...,ij->ij...', np.ones(shape), glm_A).flatten() * inputs['h']
 
             partials[Y_name, 'h'] = np.einsum(
-                'ij,j...->ij...', glm_A, inputs[F_name]).flatten()
+                'ij,j...->i...', glm_A, inputs[F_name]).flatten()
@@ -0,0 +1,274 @@
+import numpy as np
+from six import iteritems
+import multiprocessing
+import multiprocessing.pool
+
+from openmdao.api import ExplicitComponent, Problem, IndepVarComp
+
+from ozone.ode_function import ODEFunction
+from ozone.utils.misc import get_finalizer
+
+
+class ParallelODEComp(ExplicitComponent):
+    """
+    Evaluate the ODE system on many nodes by sharding the nodes across a pool of workers.
+
+    The component has the same target inputs and rate_source outputs as the ODE system, so it
+    can stand in for it. The num_nodes axis is split into num_workers shards, and each shard is
+    evaluated by its own copy of the ODE system, wrapped in a stand-alone Problem, on a thread
+    or process pool. The nodes are assumed to be independent, so the partials are declared as
+    one dense block per node and are gathered from the total derivatives of each shard.
+
+    The pool is started on the first evaluation and shut down by close, by the next setup,
+    or when the component is garbage collected or the interpreter exits.
+    """
+
+    def initialize(self):
+        self.options.declare('ode_function', types=ODEFunction)
+        self.options.declare('num_nodes', types=int)
+        self.options.declare('num_workers', types=int)
+        self.options.declare('pool_type', default='process', values=['process', 'thread'])
+
+    def setup(self):
+        ode_function = self.options['ode_function']
+        num_nodes = self.options['num_nodes']
+        num_workers = self.options['num_workers']
+
+        # The workers of a previous setup hold the old shards
+        self.close()
+
+        time_units = ode_function._time_options['units']
+
+        self.shards = np.array_split(np.arange(num_nodes), min(num_workers, num_nodes))
+
+        # Inputs, keyed by target name: (shape per node, units)
+        self.input_meta = input_meta = {}
+
+        for state_name, state in iteritems(ode_function._states):
+            for target in state['targets']:
+                input_meta[target] = (state['shape'], state['units'])
+
+        for target in ode_function._time_options['targets']:
+            input_meta[target] = ((), time_units)
+
+        for parameters in [ode_function._static_parameters, ode_function._dynamic_parameters]:
+            for parameter_name, parameter in iteritems(parameters):
+                for target in parameter['targets']:
+                    input_meta[target] = (parameter['shape'], parameter['units'])
+
+        for name in input_meta:
+            assert '.' not in name, \
+                'The ODE targets of a ParallelODEComp must be variable names, not paths: %s' % name
+
+        # Outputs, keyed by rate_source name: shape per node
+        self.output_meta = output_meta = {}
+        for state_name, state in iteritems(ode_function._states):
+            output_meta[state['rate_source']] = state['shape']
+
+        # With a thread pool, each shard has its own evaluator in this process; with a process
+        # pool, the workers build their own, and the one here only provides the metadata.
+        if self.options['pool_type'] == 'thread':
+            shards = self.shards
+        elif self.options['pool_type'] == 'process':
+            shards = self.shards[:1]
+
+        self.evaluators = [
+            _ShardEvaluator(ode_function, len(shard), input_meta, output_meta)
+            for shard in shards]
+        self.pool = None
+
+        meta = self.evaluators[0].prob.model._var_allprocs_abs2meta
+        prom2abs = self.evaluators[0].prob.model._var_allprocs_prom2abs_list['output']
+
+        for name, (shape, units) in iteritems(input_meta):
+            self.add_input(name, shape=(num_nodes,) + shape, units=units)
+
+        for name, shape in iteritems(output_meta):
+            self.add_output(name, shape=(num_nodes,) + shape,
+                units=meta[prom2abs['ode_comp.' + name][0]]['units'])
+
+        # Dense block for each node: rows = i_node * m + a, cols = i_node * n + b
+        for of, of_shape in iteritems(output_meta):
+            for wrt, (wrt_shape, units) in iteritems(input_meta):
+                m = int(np.prod(of_shape))
+                n = int(np.prod(wrt_shape))
+
+                rows = np.einsum('i,a,b->iab',
+                    m * np.arange(num_nodes), np.ones(m, int), np.ones(n, int)) \
+                    + np.einsum('i,a,b->iab',
+                    np.ones(num_nodes, int), np.arange(m), np.ones(n, int))
+                cols = np.einsum('i,a,b->iab',
+                    n * np.arange(num_nodes), np.ones(m, int), np.ones(n, int)) \
+                    + np.einsum('i,a,b->iab',
+                    np.ones(num_nodes, int), np.ones(m, int), np.arange(n))
+
+                self.declare_partials(of, wrt, rows=rows.flatten(), cols=cols.flatten())
+
+    def _get_pool(self):
+        if self.pool is None:
+            num_workers = len(self.shards)
+            if self.options['pool_type'] == 'thread':
+                self.pool = multiprocessing.pool.ThreadPool(num_workers)
+            elif self.options['pool_type'] == 'process':
+                self.pool = multiprocessing.Pool(num_workers, _init_worker,
+                    (self.options['ode_function'], self.input_meta, self.output_meta))
+            self._pool_finalizer = get_finalizer(self, _shut_down_pool, self.pool)
+        return self.pool
+
+    def close(self):
+        """
+        Shut down the pool of workers; a new one is started if the component is evaluated again.
+        """
+        finalizer = getattr(self, '_pool_finalizer', None)
+        if finalizer is not None:
+            finalizer()
+
+        self.pool = None
+        self._pool_finalizer = None
+
+    def _map_shards(self, inputs, kind):
+        values_list = [
+            dict((name, inputs[name][shard]) for name in self.input_meta)
+            for shard in self.shards]
+
+        pool = self._get_pool()
+        if self.options['pool_type'] == 'thread':
+            return pool.map(_evaluate_shard,
+                [(evaluator, kind, values)
+                 for evaluator, values in zip(self.evaluators, values_list)])
+        elif self.options['pool_type'] == 'process':
+            return pool.map(_evaluate_worker_shard,
+                [(len(shard), kind, values)
+                 for shard, values in zip(self.shards, values_list)])
+
+    def compute(self, inputs, outputs):
+        results = self._map_shards(inputs, 'compute')
+
+        for name in self.output_meta:
+            outputs[name] = np.concatenate([result[name] for result in results])
+
+    def compute_partials(self, inputs, partials):
+        results = self._map_shards(inputs, 'partials')
+
+        for key in results[0]:
+            partials[key] = np.concatenate([result[key] for result in results]).flatten()
+
+
+class _ShardEvaluator(object):
+    """
+    Copy of the ODE system for one shard of nodes, wrapped in a stand-alone Problem.
+    """
+
+    def __init__(self, ode_function, num_nodes, input_meta, output_meta):
+        self.num_nodes = num_nodes
+        self.input_meta = input_meta
+        self.output_meta = output_meta
+
+        comp = IndepVarComp()
+        for name, (shape, units) in iteritems(input_meta):
+            comp.add_output(name, shape=(num_nodes,) + shape, units=units)
+
+        prob = Problem()
+        prob.model.add_subsystem('inputs_comp', comp)
+        prob.model.add_subsystem('ode_comp', ode_function._system_class(
+            num_nodes=num_nodes, **ode_function._system_init_kwargs))
+
+        for name in input_meta:
+            prob.model.connect('inputs_comp.' + name, 'ode_comp.' + name)
+
+        prob.setup(check=False)
+        prob.final_setup()
+
+        self.prob = prob
+
+    def compute(self, values):
+        prob = self.prob
+
+        for name, value in iteritems(values):
+            prob['inputs_comp.' + name] = value
+
+        # Problem.run_model would clear the iprint stack that all solvers share,
+        # including those of the model in which this shard is evaluated.
+        prob.model.run_solve_nonlinear()
+
+        self.last_values = values
+
+        return dict((name, prob['ode_comp.' + name].copy()) for name in self.output_meta)
+
+    def compute_partials(self, values):
+        num_nodes = self.num_nodes
+        model = self.prob.model
+
+        last_values = getattr(self, 'last_values', None)
+        if last_values is None or any(
+                not np.array_equal(values[name], last_values[name]) for name in values):
+            self.compute(values)
+
+        model.run_linearize()
+
+        d_outputs = model._vectors['output']['linear']
+        d_residuals = model._vectors['residual']['linear']
+
+        # Since the nodes are independent, seeding one entry of an input on all nodes at once
+        # gives the corresponding column of every per-node block in a single linear solve.
+        blocks = {}
+        for wrt_name, (wrt_shape, units) in iteritems(self.input_meta):
+            n = int(np.prod(wrt_shape))
+
+            for of_name, of_shape in iteritems(self.output_meta):
+                m = int(np.prod(of_shape))
+                blocks[of_name, wrt_name] = np.zeros((num_nodes, m, n))
+
+            for ind in range(n):
+                d_outputs.set_const(0.)
+                d_residuals.set_const(0.)
+
+                # The derivative of an output is minus that of its residual in OpenMDAO
+                seed = np.zeros((num_nodes, n))
+                seed[:, ind] = -1.
+                d_residuals['inputs_comp.' + wrt_name] = seed.reshape(
+                    d_residuals['inputs_comp.' + wrt_name].shape)
+
+                model.run_solve_linear(['linear'], 'fwd')
+
+                for of_name, of_shape in iteritems(self.output_meta):
+                    m = int(np.prod(of_shape))
+                    blocks[of_name, wrt_name][:, :, ind] = \
+                        d_outputs['ode_comp.' + of_name].reshape((num_nodes, m))
+
+        return blocks
+
+
+def _shut_down_pool(pool):
+    pool.terminate()
+    pool.join()
+
+
+def _evaluate_shard(args):
+    evaluator, kind, values = args
+
+    if kind == 'compute':
+        return evaluator.compute(values)
+    elif kind == 'partials':
+        return evaluator.compute_partials(values)
+
+
+# Per-process state of the workers of a process pool
+_worker_data = {}
+
+
+def _init_worker(ode_function, input_meta, output_meta):
+    _worker_data['args'] = (ode_function, input_meta, output_meta)
+    _worker_data['evaluators'] = {}
+
+
+def _evaluate_worker_shard(args):
+    num_nodes, kind, values = args
+
+    # The shards differ in size by at most one node, so each worker holds at most two evaluators
+    evaluators = _worker_data['evaluators']
+    if num_nodes not in evaluators:
+        ode_function, input_meta, output_meta = _worker_data['args']
+        evaluators[num_nodes] = _ShardEvaluator(ode_function, num_nodes, input_meta, output_meta)
+
+    return _evaluate_shard((evaluators[num_nodes], kind, values))
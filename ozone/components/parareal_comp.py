@@ -0,0 +1,478 @@
+import numpy as np
+from six import iteritems
+import multiprocessing
+import multiprocessing.pool
+
+from openmdao.api import Problem
+
+from ozone.components.fused_tm_comp import FusedTMComp
+from ozone.utils.var_names import get_name
+from ozone.utils.ode_evaluator import ODEEvaluator
+from ozone.utils.packed_layout import PackedLayout
+from ozone.utils.misc import get_finalizer
+
+
+class PararealComp(FusedTMComp):
+    """
+    Integrate the ODE with the parareal parallel-in-time algorithm.
+
+    The intervals of the time grid are split into num_slices contiguous time slices. The fine
+    propagator of each slice is a FusedTMComp with the given one-step method, and the slices are
+    marched concurrently by persistent worker processes or threads. An explicit Runge--Kutta
+    method taking coarse_steps steps per slice is the coarse propagator; it runs in this process
+    and only drives the convergence of the slice start values, so the converged solution is that
+    of the fine method. The iterations stop once the start values change by less than
+    parareal_tol, and after num_slices iterations, the solution is exactly that of time-marching.
+
+    The derivatives are those of the fine discrete scheme. Each worker linearizes its slice and
+    computes the transition matrix from the start to the end state of the slice. A forward or
+    reverse product then takes two concurrent sweeps over the slices, between which the slice
+    start (or end) derivatives are composed serially through the transition matrices.
+
+    The workers are started on the first evaluation and shut down by close, by the next setup,
+    or when the component is garbage collected or the interpreter exits.
+    """
+
+    def initialize(self):
+        super(PararealComp, self).initialize()
+
+        self.options.declare('num_slices', default=4, types=int)
+        self.options.declare('pool_type', default='process', values=['process', 'thread'])
+        self.options.declare('coarse_glm_A', types=np.ndarray)
+        self.options.declare('coarse_glm_B', types=np.ndarray)
+        self.options.declare('coarse_steps', default=1, types=int)
+        self.options.declare('parareal_tol', default=1e-10, types=float)
+        self.options.declare('max_iter', default=None, types=int, allow_none=True)
+
+    def setup(self):
+        super(PararealComp, self).setup()
+
+        # The workers of a previous setup hold the old slices
+        self.close()
+
+        ode_function = self.options['ode_function']
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_slices = self.options['num_slices']
+        coarse_glm_A = self.options['coarse_glm_A']
+
+        assert self.options['num_step_vars'] == 1, \
+            'The parareal formulation requires a method with a single step variable'
+        assert np.linalg.norm(np.triu(coarse_glm_A)) < 1e-15, \
+            'The coarse propagator must be an explicit method'
+        assert 0 < num_slices <= num_times - 1, \
+            'num_slices must be between 1 and the number of time steps'
+
+        self.layout = PackedLayout(ode_function._states)
+        self.coarse_evaluator = ODEEvaluator(ode_function, 1)
+
+        # The time steps of each slice
+        self.slice_steps = np.array_split(np.arange(num_times - 1), num_slices)
+
+        # Inputs split between the slices, with the number of entries per time step;
+        # None marks the static parameters, which every slice receives in full.
+        self.slice_strides = slice_strides = [('h_vec', 1)]
+        if ode_function._time_options['targets']:
+            slice_strides.append(('stage_times', num_stages))
+        for parameter_name in ode_function._static_parameters:
+            slice_strides.append((get_name('static_parameter', parameter_name), None))
+        for parameter_name in ode_function._dynamic_parameters:
+            slice_strides.append((get_name('dynamic_parameter', parameter_name), num_stages))
+
+        # Creating a Problem resets the recording stack that all Problems share, so the slices
+        # of a thread pool are created here; those of a process pool are created by the workers.
+        self.comp_kwargs = comp_kwargs = dict(
+            (name, self.options[name]) for name in [
+                'ode_function', 'time_units', 'num_stages', 'num_step_vars',
+                'glm_A', 'glm_B', 'glm_U', 'glm_V',
+                'max_stored_steps', 'newton_tol', 'newton_maxiter'])
+
+        if self.options['pool_type'] == 'thread':
+            self.slices = [
+                _Slice(dict(comp_kwargs, num_times=len(steps) + 1))
+                for steps in self.slice_steps]
+        elif self.options['pool_type'] == 'process':
+            self.slices = None
+        self.pool = None
+
+    def _get_slices(self):
+        if self.options['pool_type'] == 'thread':
+            if self.pool is None:
+                self.pool = multiprocessing.pool.ThreadPool(len(self.slices))
+                self._finalizer = get_finalizer(self, _shut_down_workers, [], self.pool)
+        elif self.options['pool_type'] == 'process':
+            if self.slices is None:
+                self.slices = [
+                    _SliceProcess(dict(self.comp_kwargs, num_times=len(steps) + 1))
+                    for steps in self.slice_steps]
+                self._finalizer = get_finalizer(self, _shut_down_workers, self.slices, None)
+
+        return self.slices
+
+    def close(self):
+        """
+        Shut down the workers; new ones are started if the component is evaluated again.
+        """
+        finalizer = getattr(self, '_finalizer', None)
+        if finalizer is not None:
+            finalizer()
+
+        self.pool = None
+        self._finalizer = None
+        if self.options['pool_type'] == 'process':
+            self.slices = None
+
+    def _call_slices(self, method, args):
+        """
+        Call a method of several slices concurrently; args holds the arguments keyed by slice.
+        """
+        slices = self._get_slices()
+        indices = sorted(args)
+
+        if self.options['pool_type'] == 'thread':
+            results = self.pool.map(_call_slice,
+                [(slices[i_slice], method, args[i_slice]) for i_slice in indices])
+        elif self.options['pool_type'] == 'process':
+            for i_slice in indices:
+                slices[i_slice].send(method, args[i_slice])
+            results = [slices[i_slice].receive() for i_slice in indices]
+
+        return dict(zip(indices, results))
+
+    def _get_slice_vars(self, vec, i_slice, zero=False):
+        steps = self.slice_steps[i_slice]
+        i0, i1 = steps[0], steps[-1] + 1
+
+        slice_vec = {}
+        for name, stride in self.slice_strides:
+            if name in vec:
+                if stride is None:
+                    value = vec[name]
+                else:
+                    value = vec[name][i0 * stride:i1 * stride]
+                slice_vec[name] = np.zeros(value.shape) if zero else value.copy()
+        return slice_vec
+
+    def _add_slice_vars(self, vec, slice_vec, i_slice):
+        steps = self.slice_steps[i_slice]
+        i0, i1 = steps[0], steps[-1] + 1
+
+        for name, stride in self.slice_strides:
+            if name in vec:
+                if stride is None:
+                    vec[name] += slice_vec[name]
+                else:
+                    vec[name][i0 * stride:i1 * stride] += slice_vec[name]
+
+    def _setup_coarse(self, h_vec, stage_times, dynamic):
+        # Times relative to the start of the grid; the stage times give the time origin.
+        self.tau = np.concatenate([[0.], np.cumsum(h_vec)])
+        self.t_origin = stage_times[0, 0] - self.abscissa[0] * h_vec[0]
+
+        # The coarse propagator interpolates the dynamic parameters linearly between the stages
+        stage_tau = (
+            np.einsum('i,j->ij', self.tau[:-1], np.ones(len(self.abscissa)))
+            + np.einsum('i,j->ij', h_vec, self.abscissa)).flatten()
+        order = np.argsort(stage_tau, kind='mergesort')
+        self.stage_tau = stage_tau[order]
+        self.stage_dynamic = dynamic.reshape((len(stage_tau), -1))[order]
+
+    def _propagate_coarse(self, i_slice, y, static):
+        coarse_glm_A = self.options['coarse_glm_A']
+        coarse_glm_B = self.options['coarse_glm_B']
+        coarse_steps = self.options['coarse_steps']
+
+        evaluator = self.coarse_evaluator
+        num_coarse_stages = coarse_glm_A.shape[0]
+        coarse_abscissa = coarse_glm_A.dot(np.ones(num_coarse_stages))
+
+        steps = self.slice_steps[i_slice]
+        tau0 = self.tau[steps[0]]
+        h = (self.tau[steps[-1] + 1] - tau0) / coarse_steps
+
+        F = np.zeros((num_coarse_stages, evaluator.num_state_vars))
+        for i_step in range(coarse_steps):
+            for i_stage in range(num_coarse_stages):
+                tau = tau0 + (i_step + coarse_abscissa[i_stage]) * h
+                dynamic = np.array([[
+                    np.interp(tau, self.stage_tau, column) for column in self.stage_dynamic.T]])
+
+                Y = y + h * coarse_glm_A[i_stage, :i_stage].dot(F[:i_stage])
+                F[i_stage] = evaluator.compute_rates(
+                    Y.reshape((1, -1)), np.array([self.t_origin + tau]), static, dynamic)[0]
+
+            y = y + h * coarse_glm_B[0].dot(F)
+
+        return y
+
+    def compute(self, inputs, outputs):
+        num_times = self.options['num_times']
+        num_slices = self.options['num_slices']
+        parareal_tol = self.options['parareal_tol']
+        max_iter = self.options['max_iter'] or num_slices
+
+        layout = self.layout
+        slice_steps = self.slice_steps
+
+        h_vec, y0, stage_times, static, dynamic = self._pack_inputs(inputs)
+        self._setup_coarse(h_vec, stage_times, dynamic)
+
+        # Start values of the slices, initially from the coarse propagator
+        y_start = np.zeros((num_slices + 1, layout.size))
+        coarse = np.zeros((num_slices, layout.size))
+        y_start[0] = y0[0]
+        for i_slice in range(num_slices):
+            coarse[i_slice] = self._propagate_coarse(i_slice, y_start[i_slice], static)
+            y_start[i_slice + 1] = coarse[i_slice]
+
+        y = np.zeros((num_times, 1, layout.size))
+        y[0] = y0
+
+        self.num_iterations = 0
+        for i_iter in range(max_iter):
+            # The slices before i_iter were already marched from their exact start values
+            args = {}
+            for i_slice in range(i_iter, num_slices):
+                slice_inputs = self._get_slice_vars(inputs, i_slice)
+                slice_inputs.update(_get_dict(layout, y_start[i_slice].reshape((1, -1)), 'y0'))
+                args[i_slice] = (slice_inputs,)
+
+            for i_slice, result in iteritems(self._call_slices('march', args)):
+                steps = slice_steps[i_slice]
+                y[steps[0] + 1:steps[-1] + 2] = \
+                    layout.pack(result, 'y', (len(steps) + 1, 1))[1:]
+
+            self.num_iterations += 1
+
+            # Parareal correction: coarse from the new start value, plus fine minus coarse
+            # from the previous one
+            change = 0.
+            for i_slice in range(i_iter, num_slices):
+                value = self._propagate_coarse(i_slice, y_start[i_slice], static)
+                new_start = value + y[slice_steps[i_slice][-1] + 1, 0] - coarse[i_slice]
+
+                change = max(change, np.max(np.abs(new_start - y_start[i_slice + 1])))
+                coarse[i_slice] = value
+                y_start[i_slice + 1] = new_start
+
+            if change <= parareal_tol * (1. + np.max(np.abs(y_start))):
+                break
+
+        layout.unpack(y, outputs, 'y')
+
+        self.y = y
+
+    def compute_partials(self, inputs, partials):
+        num_slices = self.options['num_slices']
+
+        results = self._call_slices('linearize',
+            dict((i_slice, ()) for i_slice in range(num_slices)))
+        self.transitions = [results[i_slice] for i_slice in range(num_slices)]
+
+    def compute_jacvec_product(self, inputs, d_inputs, d_outputs, mode):
+        num_times = self.options['num_times']
+        num_slices = self.options['num_slices']
+
+        layout = self.layout
+        slice_steps = self.slice_steps
+
+        def get_zero_y(i_slice):
+            return _get_dict(layout, np.zeros((len(slice_steps[i_slice]) + 1, 1, layout.size)), 'y')
+
+        if mode == 'fwd':
+            d_y0 = layout.pack(d_inputs, 'y0', (1,))[0]
+
+            # Pass 1: the end value of each slice from its inputs alone, with a zero start
+            results = self._call_slices('jacvec', dict(
+                (i_slice, (self._get_slice_vars(d_inputs, i_slice), get_zero_y(i_slice), 'fwd'))
+                for i_slice in range(num_slices - 1)))
+
+            d_start = np.zeros((num_slices, layout.size))
+            d_start[0] = d_y0
+            for i_slice in range(num_slices - 1):
+                d_end = layout.pack(results[i_slice][1], 'y',
+                    (len(slice_steps[i_slice]) + 1, 1))[-1, 0]
+                d_start[i_slice + 1] = self.transitions[i_slice].dot(d_start[i_slice]) + d_end
+
+            # Pass 2: each slice from its actual start value
+            args = {}
+            for i_slice in range(num_slices):
+                slice_d_inputs = self._get_slice_vars(d_inputs, i_slice)
+                slice_d_inputs.update(
+                    _get_dict(layout, d_start[i_slice].reshape((1, -1)), 'y0'))
+                args[i_slice] = (slice_d_inputs, get_zero_y(i_slice), 'fwd')
+
+            d_y = np.zeros((num_times, 1, layout.size))
+            d_y[0, 0] = d_y0
+            for i_slice, (slice_d_inputs, slice_d_outputs) in iteritems(
+                    self._call_slices('jacvec', args)):
+                steps = slice_steps[i_slice]
+                d_y[steps[0] + 1:steps[-1] + 2] = \
+                    layout.pack(slice_d_outputs, 'y', (len(steps) + 1, 1))[1:]
+
+            layout.unpack(d_y, d_outputs, 'y', add=True)
+
+        elif mode == 'rev':
+            d_y = layout.pack(d_outputs, 'y', (num_times, 1))
+
+            # The seeds of a slice exclude its start value, which belongs to the previous slice
+            def get_seeds(i_slice, adj_end):
+                steps = slice_steps[i_slice]
+                seeds = d_y[steps[0]:steps[-1] + 2].copy()
+                if i_slice > 0:
+                    seeds[0] = 0.
+                seeds[-1, 0] += adj_end
+                return _get_dict(layout, seeds, 'y')
+
+            zero_y0 = np.zeros((1, layout.size))
+
+            # Pass 1: the start adjoint of each slice from its seeds alone, with a zero end adjoint
+            results = self._call_slices('jacvec', dict(
+                (i_slice, (_get_dict(layout, zero_y0, 'y0'),
+                    get_seeds(i_slice, np.zeros(layout.size)), 'rev'))
+                for i_slice in range(1, num_slices)))
+
+            adj_end = np.zeros((num_slices, layout.size))
+            for i_slice in range(num_slices - 1, 0, -1):
+                adj_start = layout.pack(results[i_slice][0], 'y0', (1,))[0]
+                adj_end[i_slice - 1] = adj_start \
+                    + self.transitions[i_slice].T.dot(adj_end[i_slice])
+
+            # Pass 2: each slice with its actual end adjoint
+            args = {}
+            for i_slice in range(num_slices):
+                slice_d_inputs = self._get_slice_vars(d_inputs, i_slice, zero=True)
+                slice_d_inputs.update(_get_dict(layout, zero_y0, 'y0'))
+                args[i_slice] = (slice_d_inputs, get_seeds(i_slice, adj_end[i_slice]), 'rev')
+
+            results = self._call_slices('jacvec', args)
+
+            totals = dict(
+                (name, np.zeros(d_inputs[name].shape))
+                for name, stride in self.slice_strides if name in d_inputs)
+            for i_slice in range(num_slices):
+                self._add_slice_vars(totals, results[i_slice][0], i_slice)
+
+            for name, value in iteritems(totals):
+                d_inputs[name] += value
+
+            layout.unpack(layout.pack(results[0][0], 'y0', (1,)), d_inputs, 'y0', add=True)
+
+
+class _Slice(object):
+    """
+    Fine propagator of one time slice: a FusedTMComp wrapped in a stand-alone Problem.
+    """
+
+    def __init__(self, comp_kwargs):
+        prob = Problem()
+        prob.model.add_subsystem('fused_comp', FusedTMComp(**comp_kwargs))
+        prob.setup(check=False)
+        prob.final_setup()
+
+        self.prob = prob
+        self.comp = prob.model.fused_comp
+        self.layout = PackedLayout(comp_kwargs['ode_function']._states)
+        self.num_times = comp_kwargs['num_times']
+
+    def march(self, inputs):
+        self.inputs = inputs
+
+        outputs = {}
+        self.comp.compute(inputs, outputs)
+        return outputs
+
+    def linearize(self):
+        """
+        Linearize the slice and return the transition matrix d(end state) / d(start state).
+        """
+        comp = self.comp
+        layout = self.layout
+
+        comp.compute_partials(self.inputs, None)
+
+        transition = np.zeros((layout.size, layout.size))
+        for ind in range(layout.size):
+            seed = np.zeros((1, layout.size))
+            seed[0, ind] = 1.
+
+            d_inputs = _get_dict(layout, seed, 'y0')
+            d_outputs = _get_dict(layout, np.zeros((self.num_times, 1, layout.size)), 'y')
+            comp.compute_jacvec_product(self.inputs, d_inputs, d_outputs, 'fwd')
+
+            transition[:, ind] = layout.pack(d_outputs, 'y', (self.num_times, 1))[-1, 0]
+
+        return transition
+
+    def jacvec(self, d_inputs, d_outputs, mode):
+        self.comp.compute_jacvec_product(self.inputs, d_inputs, d_outputs, mode)
+        return d_inputs, d_outputs
+
+
+class _SliceProcess(object):
+    """
+    Proxy for a _Slice that lives in its own worker process.
+    """
+
+    def __init__(self, comp_kwargs):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_run_slice_worker, args=(child_conn, comp_kwargs))
+        self.process.daemon = True
+        self.process.start()
+
+    def send(self, method, args):
+        self.conn.send((method, args))
+
+    def receive(self):
+        success, result = self.conn.recv()
+        if not success:
+            raise result
+        return result
+
+    def close(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+def _shut_down_workers(slice_processes, pool):
+    for slice_process in slice_processes:
+        slice_process.close()
+
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+
+
+def _run_slice_worker(conn, comp_kwargs):
+    slice_ = _Slice(comp_kwargs)
+
+    while True:
+        try:
+            method, args = conn.recv()
+        except EOFError:
+            return
+
+        try:
+            conn.send((True, getattr(slice_, method)(*args)))
+        except Exception as error:
+            conn.send((False, error))
+
+
+def _call_slice(args):
+    slice_, method, slice_args = args
+    return getattr(slice_, method)(*slice_args)
+
+
+def _get_dict(layout, array, name_type):
+    """
+    Scatter a packed array of shape lead_shape + (size,) into a new dictionary of arrays.
+    """
+    lead_shape = array.shape[:-1]
+
+    vec = dict(
+        (get_name(name_type, name), np.zeros(lead_shape + variable['shape']))
+        for name, variable in iteritems(layout.variables))
+    layout.unpack(array, vec, name_type)
+    return vec
@@ -7,6 +7,7 @@ from openmdao.utils.options_dictionary import OptionsDictionary
 from openmdao.api import ExplicitComponent
 
 from ozone.utils.var_names import get_name
+from ozone.utils.packed_layout import PackedLayout
 
 
 class VectorizedOutputComp(ExplicitComponent):
@@ -32,6 +33,8 @@ class VectorizedOutputComp(ExplicitComponent):
         if is_starting_method:
             num_starting = starting_coeffs.shape[0]
 
+        self.layout = PackedLayout(self.options['states'])
+
         for state_name, state in iteritems(self.options['states']):
             size = np.prod(state['shape'])
             shape = state['shape']
@@ -100,25 +103,27 @@ class VectorizedOutputComp(ExplicitComponent):
     def compute(self, inputs, outputs):
         num_starting_times = self.options['num_starting_times']
         num_my_times = self.options['num_my_times']
+        num_step_vars = self.options['num_step_vars']
         starting_coeffs = self.options['starting_coeffs']
 
+        num_times = num_starting_times + num_my_times - 1
+
         has_starting_method = num_starting_times > 1
         is_starting_method = starting_coeffs is not None
 
-        for state_name, state in iteritems(self.options['states']):
-            y_name = get_name('y', state_name)
-            starting_state_name = get_name('starting_state', state_name)
-            out_state_name = get_name('state', state_name)
-            starting_name = get_name('starting', state_name)
+        layout = self.layout
 
-            outputs[out_state_name][num_starting_times - 1:] = inputs[y_name][:, 0, :]
+        # Packed arrays: (num_my_times, num_step_vars, num_state_vars), etc.
+        y = layout.pack(inputs, 'y', (num_my_times, num_step_vars))
 
-            if has_starting_method:
+        state = np.zeros((num_times, layout.size))
+        state[num_starting_times - 1:] = y[:, 0, :]
 
-                outputs[out_state_name][:num_starting_times - 1] = \
-                    inputs[starting_state_name][:-1, :]
+        if has_starting_method:
+            starting_state = layout.pack(inputs, 'starting_state', (num_starting_times,))
+            state[:num_starting_times - 1] = starting_state[:-1, :]
 
-            if is_starting_method:
+        layout.unpack(state, outputs, 'state')
 
-                outputs[starting_name] = np.einsum('ijk,jk...->i...',
-                    starting_coeffs, inputs[y_name])
+        if is_starting_method:
+            layout.unpack(np.einsum('ijk,jk...->i...', starting_coeffs, y), outputs, 'starting')
@@ -1,16 +1,18 @@
 import numpy as np
 from six import iteritems
 import scipy.sparse
-import scipy.sparse.linalg
 
 from openmdao.api import ExplicitComponent
 
 from ozone.utils.var_names import get_name
 from ozone.utils.units import get_rate_units
+from ozone.utils.packed_layout import PackedLayout
 
 
 class VectorizedStageComp(ExplicitComponent):
 
+    assembled_partials = True
+
     def initialize(self):
         self.options.declare('states', types=dict)
         self.options.declare('time_units', types=str, allow_none=True)
@@ -30,6 +32,8 @@ class VectorizedStageComp(ExplicitComponent):
 
         h_arange = np.arange(num_times - 1)
 
+        self.layout = PackedLayout(self.options['states'])
+
         self.add_input('h_vec', shape=(num_times - 1), units=time_units)
 
         for state_name, state in iteritems(self.options['states']):
@@ -66,6 +70,10 @@ class VectorizedStageComp(ExplicitComponent):
                 shape=(num_times - 1, num_stages,) + shape,
                 units=state['units'])
 
+            # The matrix-free subclass declares no partials, so none are assembled.
+            if not self.assembled_partials:
+                continue
+
             # -----------------
 
             ones = -np.ones((num_times - 1) * num_stages * size)
@@ -74,13 +82,14 @@ class VectorizedStageComp(ExplicitComponent):
 
             # -----------------
 
-            # (num_times - 1, num_stages, num_stages,) + shape
-            rows = np.einsum('ij...,k->ijk...', Y_arange, np.ones(num_stages, int)).flatten()
-
-            cols = np.einsum('jk...,i->ijk...',
-                np.ones((num_stages, num_stages,) + shape, int), h_arange).flatten()
+            # (num_times - 1, num_stages,) + shape
+            rows = Y_arange.flatten()
+            cols = np.einsum('j...,i->ij...',
+                np.ones((num_stages,) + shape, int), h_arange).flatten()
             self.declare_partials(Y_out_name, 'h_vec', rows=rows, cols=cols)
 
+            # (num_times - 1, num_stages, num_stages,) + shape
+            rows = np.einsum('ij...,k->ijk...', Y_arange, np.ones(num_stages, int)).flatten()
             cols = np.einsum('ik...,j->ijk...', F_arange, np.ones(num_stages, int)).flatten()
             self.declare_partials(Y_out_name, F_name, rows=rows, cols=cols)
 
@@ -95,43 +104,95 @@ class VectorizedStageComp(ExplicitComponent):
             self.declare_partials(Y_out_name, y_name, val=data, rows=rows, cols=cols)
 
     def compute(self, inputs, outputs):
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_step_vars = self.options['num_step_vars']
         glm_A = self.options['glm_A']
         glm_U = self.options['glm_U']
 
-        for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
-            shape = state['shape']
+        layout = self.layout
+
+        # Packed arrays: (num_times - 1, num_stages, num_state_vars), etc.
+        Y_in = layout.pack(inputs, 'Y_in', (num_times - 1, num_stages))
+        F = layout.pack(inputs, 'F', (num_times - 1, num_stages))
+        y = layout.pack(inputs, 'y', (num_times, num_step_vars))
+
+        Y_out = -Y_in \
+            + np.einsum('jk,i,ik...->ij...', glm_A, inputs['h_vec'], F) \
+            + np.einsum('jk,ik...->ij...', glm_U, y[:-1, :, :])
+
+        layout.unpack(Y_out, outputs, 'Y_out')
+
+    def compute_partials(self, inputs, partials):
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        glm_A = self.options['glm_A']
+
+        layout = self.layout
 
+        F = layout.pack(inputs, 'F', (num_times - 1, num_stages))
+
+        # (num_times - 1, num_stages, num_stages,), the same for all states
+        dY_dF = np.einsum('jk,i->ijk', glm_A, inputs['h_vec']).flatten()
+
+        # (num_times - 1, num_stages, num_state_vars)
+        dY_dh = np.einsum('jk,ik...->ij...', glm_A, F)
+
+        for state_name, (ind1, ind2) in iteritems(layout.offsets):
             F_name = get_name('F', state_name)
-            y_name = get_name('y', state_name)
             Y_out_name = get_name('Y_out', state_name)
-            Y_in_name = get_name('Y_in', state_name)
 
-            outputs[Y_out_name] = -inputs[Y_in_name] \
-                + np.einsum('jk,i,ik...->ij...', glm_A, inputs['h_vec'], inputs[F_name]) \
-                + np.einsum('jk,ik...->ij...', glm_U, inputs[y_name][:-1, :, :])
+            partials[Y_out_name, F_name] = np.repeat(dY_dF, ind2 - ind1)
+            partials[Y_out_name, 'h_vec'] = dY_dh[:, :, ind1:ind2].flatten()
+
+
+class MatrixFreeVectorizedStageComp(VectorizedStageComp):
+    """
+    Stage equations with matrix-free products applied from the GLM coefficients.
+
+    No partials are declared, so no Jacobian is assembled and the memory for the linearization
+    is that of the inputs. This requires an iterative linear solver, e.g., a Krylov solver.
+    """
+
+    assembled_partials = False
 
     def compute_partials(self, inputs, partials):
-        time_units = self.options['time_units']
+        pass
+
+    def compute_jacvec_product(self, inputs, d_inputs, d_outputs, mode):
         num_times = self.options['num_times']
         num_stages = self.options['num_stages']
         num_step_vars = self.options['num_step_vars']
         glm_A = self.options['glm_A']
         glm_U = self.options['glm_U']
 
-        for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
-            shape = state['shape']
+        layout = self.layout
 
-            F_name = get_name('F', state_name)
-            y_name = get_name('y', state_name)
-            Y_out_name = get_name('Y_out', state_name)
-            Y_in_name = get_name('Y_in', state_name)
+        h_vec = inputs['h_vec']
+        F = layout.pack(inputs, 'F', (num_times - 1, num_stages))
 
-            # (num_times - 1, num_stages, num_stages,) + shape
+        if mode == 'fwd':
+            d_Y_in = layout.pack(d_inputs, 'Y_in', (num_times - 1, num_stages))
+            d_F = layout.pack(d_inputs, 'F', (num_times - 1, num_stages))
+            d_y = layout.pack(d_inputs, 'y', (num_times, num_step_vars))
+
+            d_Y_out = -d_Y_in \
+                + np.einsum('jk,i,ik...->ij...', glm_A, h_vec, d_F) \
+                + np.einsum('jk,ik...->ij...', glm_U, d_y[:-1, :, :])
+            if 'h_vec' in d_inputs:
+                d_Y_out += np.einsum('jk,i,ik...->ij...', glm_A, d_inputs['h_vec'], F)
+
+            layout.unpack(d_Y_out, d_outputs, 'Y_out', add=True)
+
+        elif mode == 'rev':
+            d_Y_out = layout.pack(d_outputs, 'Y_out', (num_times - 1, num_stages))
 
-            partials[Y_out_name, F_name] = np.einsum(
-                '...,jk,i->ijk...', np.ones(shape), glm_A, inputs['h_vec']).flatten()
+            d_y = np.zeros((num_times, num_step_vars, layout.size))
+            d_y[:-1, :, :] = np.einsum('jk,ij...->ik...', glm_U, d_Y_out)
 
-            partials[Y_out_name, 'h_vec'] = np.einsum(
-                'jk,ik...->ijk...', glm_A, inputs[F_name]).flatten()
+            layout.unpack(-d_Y_out, d_inputs, 'Y_in', add=True)
+            layout.unpack(np.einsum('jk,i,ij...->ik...', glm_A, h_vec, d_Y_out),
+                d_inputs, 'F', add=True)
+            layout.unpack(d_y, d_inputs, 'y', add=True)
+            if 'h_vec' in d_inputs:
+                d_inputs['h_vec'] += np.einsum('jk,ikl,ijl->i', glm_A, F, d_Y_out)
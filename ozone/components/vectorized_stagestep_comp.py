@@ -1,12 +1,14 @@
 import numpy as np
 from six import iteritems
 import scipy.sparse
-import scipy.sparse.linalg
 
 from openmdao.api import ExplicitComponent
 
 from ozone.utils.var_names import get_name
 from ozone.utils.units import get_rate_units
+from ozone.utils.recurrence_solver import RecurrenceSolver
+from ozone.utils.packed_layout import PackedLayout
+from ozone.utils.setup_cache import setup_cache, get_array_key
 
 
 class VectorizedStageStepComp(ExplicitComponent):
@@ -32,13 +34,6 @@ class VectorizedStageStepComp(ExplicitComponent):
         glm_B = self.options['glm_B']
         glm_V = self.options['glm_V']
 
-        self.mtx_y0_dict = {}
-        self.mtx_dict = {}
-        self.mtx_h_dict = {}
-
-        h_arange = np.arange(num_times - 1)
-        num_h = num_times - 1
-
         self.add_input('h_vec', shape=(num_times - 1), units=time_units)
 
         for state_name, state in iteritems(self.options['states']):
@@ -50,26 +45,6 @@ class VectorizedStageStepComp(ExplicitComponent):
             Y_in_name = get_name('Y_in', state_name)
             Y_out_name = get_name('Y_out', state_name)
 
-            # --------------------------------------------------------------------------------
-
-            y0_arange = np.arange(num_step_vars * size).reshape((num_step_vars,) + shape)
-
-            F_arange = np.arange((num_times - 1) * num_stages * size).reshape(
-                (num_times - 1, num_stages,) + shape)
-
-            Y_arange = np.arange((num_times - 1) * num_stages * size).reshape(
-                (num_times - 1, num_stages,) + shape)
-
-            y_arange = np.arange(num_times * num_step_vars * size).reshape(
-                (num_times, num_step_vars,) + shape)
-
-            num_y0 = np.prod(y0_arange.shape)
-            num_F = np.prod(F_arange.shape)
-            num_Y = np.prod(Y_arange.shape)
-            num_y = np.prod(y_arange.shape)
-
-            # --------------------------------------------------------------------------------
-
             self.add_input(y0_name,
                 shape=(num_step_vars,) + shape,
                 units=state['units'])
@@ -88,143 +63,202 @@ class VectorizedStageStepComp(ExplicitComponent):
 
             # -----------------
 
-            self.declare_partials(Y_out_name, 'h_vec')
-            self.declare_partials(Y_out_name, y0_name)
-            self.declare_partials(Y_out_name, F_name)
-
-            # -----------------
-
             ones = -np.ones((num_times - 1) * num_stages * size)
             arange = np.arange((num_times - 1) * num_stages * size)
             self.declare_partials(Y_out_name, Y_in_name, val=ones, rows=arange, cols=arange)
 
-            # --------------------------------------------------------------------------------
-            # mtx_y0: num_stages x num_step_vars x ...
-
-            data = np.ones((num_step_vars,) + shape).flatten()
-            rows = y_arange[0, :, :].flatten()
-            cols = y0_arange.flatten()
-            mtx_y0 = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_y, num_y0)).toarray()
-
-            # --------------------------------------------------------------------------------
-            # mtx_A: (num_times - 1) x num_stages x num_stages x ...
-
-            data = np.einsum('jk,i...->ijk...',
-                glm_A, np.ones((num_times - 1,) + shape)).flatten()
-            rows = np.einsum('ij...,k->ijk...',
-                Y_arange, np.ones(num_stages, int)).flatten()
-            cols = np.einsum('ik...,j->ijk...',
-                F_arange, np.ones(num_stages, int)).flatten()
-            mtx_A = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_Y, num_F)).toarray()
-
-            # --------------------------------------------------------------------------------
-            # mtx_B: (num_times - 1) x num_step_vars x num_stages x ...
-
-            data = np.einsum('jk,i...->ijk...',
-                glm_B, np.ones((num_times - 1,) + shape)).flatten()
-            rows = np.einsum('ij...,k->ijk...',
-                y_arange[1:, :, :], np.ones(num_stages, int)).flatten()
-            cols = np.einsum('ik...,j->ijk...',
-                F_arange, np.ones(num_step_vars, int)).flatten()
-            mtx_B = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_y, num_F)).toarray()
-
-            # --------------------------------------------------------------------------------
-            # mtx_U: (num_times - 1) x num_stages x num_step_vars x ...
-
-            data = np.einsum('jk,i...->ijk...',
-                glm_U, np.ones((num_times - 1,) + shape)).flatten()
-            rows = np.einsum('ij...,k->ijk...',
-                Y_arange, np.ones(num_step_vars, int)).flatten()
-            cols = np.einsum('ik...,j->ijk...',
-                y_arange[:-1, :, :], np.ones(num_stages, int)).flatten()
-            mtx_U = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_Y, num_y)).toarray()
-
-            # --------------------------------------------------------------------------------
-            # mtx_y
-
-            data_list = []
-            rows_list = []
-            cols_list = []
-
-            # identity
-            data = np.ones(num_y)
-            rows = np.arange(num_y)
-            cols = np.arange(num_y)
-            data_list.append(data); rows_list.append(rows); cols_list.append(cols)
-
-            # (num_times - 1) x num_step_var x num_step_var x ...
-            data = np.einsum('jk,i...->ijk...',
-                -glm_V, np.ones((num_times - 1,) + shape)).flatten()
-            rows = np.einsum('ij...,k->ijk...',
-                y_arange[1:, :, :], np.ones(num_step_vars, int)).flatten()
-            cols = np.einsum('ik...,j->ijk...',
-                y_arange[:-1, :, :], np.ones(num_step_vars, int)).flatten()
-            data_list.append(data); rows_list.append(rows); cols_list.append(cols)
-
-            # concatenate
-            data = np.concatenate(data_list)
-            rows = np.concatenate(rows_list)
-            cols = np.concatenate(cols_list)
-
-            mtx_y = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_y, num_y))
-            mtx_y_inv = scipy.sparse.linalg.splu(mtx_y)
-
-            # --------------------------------------------------------------------------------
-            # mtx_h
-
-            data = np.ones(num_F)
-            rows = np.arange(num_F)
-            cols = np.einsum('i,j...->ij...',
-                h_arange, np.ones((num_stages,) + shape, int)).flatten()
-            mtx_h = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_F, num_h)).toarray()
-
-            # --------------------------------------------------------------------------------
-            self.mtx_y0_dict[state_name] = mtx_U.dot(mtx_y_inv.solve(mtx_y0))
-            self.mtx_dict[state_name] = mtx_A + mtx_U.dot(mtx_y_inv.solve(mtx_B))
-            self.mtx_h_dict[state_name] = mtx_h
+        # ------------------------------------------------------------------------------------
+        # All states are stacked in one packed layout, so the operators below are built once
+        # and act on every state at the same time.
+
+        self.layout = layout = PackedLayout(self.options['states'])
+
+        # The operators only depend on the method, the grid, and the packed size, so they are
+        # shared across components and setups.
+        key = ('VectorizedStageStepComp',
+            get_array_key(glm_A), get_array_key(glm_U), get_array_key(glm_B), get_array_key(glm_V),
+            num_times, layout.size)
+        operators = setup_cache.get(key, lambda: self._get_operators(layout.size))
+
+        # The Y_out dependence on h_vec, y0, and F is dense due to the recurrence in y,
+        # so it is applied matrix-free with these sparse operators in compute_jacvec_product.
+        self.mtx_y0 = operators['y0']
+        self.mtx_A = operators['A']
+        self.mtx_B = operators['B']
+        self.mtx_U = operators['U']
+        self.mtx_y_inv = operators['y_inv']
+        self.mtx_h = operators['h']
+
+    def _get_operators(self, size):
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_step_vars = self.options['num_step_vars']
+        glm_A = self.options['glm_A']
+        glm_U = self.options['glm_U']
+        glm_B = self.options['glm_B']
+        glm_V = self.options['glm_V']
+
+        shape = (size,)
+
+        h_arange = np.arange(num_times - 1)
+        num_h = num_times - 1
+
+        y0_arange = np.arange(num_step_vars * size).reshape((num_step_vars,) + shape)
+
+        F_arange = np.arange((num_times - 1) * num_stages * size).reshape(
+            (num_times - 1, num_stages,) + shape)
+
+        Y_arange = np.arange((num_times - 1) * num_stages * size).reshape(
+            (num_times - 1, num_stages,) + shape)
+
+        y_arange = np.arange(num_times * num_step_vars * size).reshape(
+            (num_times, num_step_vars,) + shape)
+
+        num_y0 = np.prod(y0_arange.shape)
+        num_F = np.prod(F_arange.shape)
+        num_Y = np.prod(Y_arange.shape)
+        num_y = np.prod(y_arange.shape)
+
+        # ------------------------------------------------------------------------------------
+        # mtx_y0: num_stages x num_step_vars x ...
+
+        data = np.ones((num_step_vars,) + shape).flatten()
+        rows = y_arange[0, :, :].flatten()
+        cols = y0_arange.flatten()
+        mtx_y0 = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_y, num_y0))
+
+        # ------------------------------------------------------------------------------------
+        # mtx_A: (num_times - 1) x num_stages x num_stages x ...
+
+        data = np.einsum('jk,i...->ijk...',
+            glm_A, np.ones((num_times - 1,) + shape)).flatten()
+        rows = np.einsum('ij...,k->ijk...',
+            Y_arange, np.ones(num_stages, int)).flatten()
+        cols = np.einsum('ik...,j->ijk...',
+            F_arange, np.ones(num_stages, int)).flatten()
+        mtx_A = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_Y, num_F))
+
+        # ------------------------------------------------------------------------------------
+        # mtx_B: (num_times - 1) x num_step_vars x num_stages x ...
+
+        data = np.einsum('jk,i...->ijk...',
+            glm_B, np.ones((num_times - 1,) + shape)).flatten()
+        rows = np.einsum('ij...,k->ijk...',
+            y_arange[1:, :, :], np.ones(num_stages, int)).flatten()
+        cols = np.einsum('ik...,j->ijk...',
+            F_arange, np.ones(num_step_vars, int)).flatten()
+        mtx_B = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_y, num_F))
+
+        # ------------------------------------------------------------------------------------
+        # mtx_U: (num_times - 1) x num_stages x num_step_vars x ...
+
+        data = np.einsum('jk,i...->ijk...',
+            glm_U, np.ones((num_times - 1,) + shape)).flatten()
+        rows = np.einsum('ij...,k->ijk...',
+            Y_arange, np.ones(num_step_vars, int)).flatten()
+        cols = np.einsum('ik...,j->ijk...',
+            y_arange[:-1, :, :], np.ones(num_stages, int)).flatten()
+        mtx_U = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_Y, num_y))
+
+        # ------------------------------------------------------------------------------------
+        # mtx_y_inv: inverse of the block-bidiagonal step recurrence matrix
+
+        mtx_y_inv = RecurrenceSolver(np.array(glm_V), num_times, size)
+
+        # ------------------------------------------------------------------------------------
+        # mtx_h
+
+        data = np.ones(num_F)
+        rows = np.arange(num_F)
+        cols = np.einsum('i,j...->ij...',
+            h_arange, np.ones((num_stages,) + shape, int)).flatten()
+        mtx_h = scipy.sparse.csc_matrix((data, (rows, cols)), shape=(num_F, num_h))
+
+        return {'y0': mtx_y0, 'A': mtx_A, 'B': mtx_B, 'U': mtx_U, 'y_inv': mtx_y_inv, 'h': mtx_h}
+
+    def _apply_operator(self, hF_vec, y0_vec):
+        """
+        Apply Y = A hF + U y, where y solves the step recurrence y = V y + B hF with y[0] = y0.
+        """
+        vec = self.mtx_y_inv.solve(self.mtx_B.dot(hF_vec) + self.mtx_y0.dot(y0_vec))
+        return self.mtx_A.dot(hF_vec) + self.mtx_U.dot(vec)
 
     def compute(self, inputs, outputs):
         num_times = self.options['num_times']
         num_stages = self.options['num_stages']
         num_step_vars = self.options['num_step_vars']
 
-        for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
-            shape = state['shape']
+        layout = self.layout
 
-            F_name = get_name('F', state_name)
-            Y_out_name = get_name('Y_out', state_name)
-            Y_in_name = get_name('Y_in', state_name)
-            y0_name = get_name('y0', state_name)
+        Y_in = layout.pack(inputs, 'Y_in', (num_times - 1, num_stages))
+        F = layout.pack(inputs, 'F', (num_times - 1, num_stages))
+        y0 = layout.pack(inputs, 'y0', (num_step_vars,))
 
-            mtx_y0 = self.mtx_y0_dict[state_name]
-            mtx = self.mtx_dict[state_name]
-            mtx_h = self.mtx_h_dict[state_name]
+        hF_vec = self.mtx_h.dot(inputs['h_vec']) * F.flatten()
 
-            Y_shape = outputs[Y_out_name].shape
+        Y_out = -Y_in + self._apply_operator(hF_vec, y0.flatten()).reshape(Y_in.shape)
 
-            outputs[Y_out_name] = -inputs[Y_in_name] \
-                + mtx.dot(mtx_h.dot(inputs['h_vec']) * inputs[F_name].flatten()).reshape(Y_shape) \
-                + mtx_y0.dot(inputs[y0_name].flatten()).reshape(Y_shape)
+        layout.unpack(Y_out, outputs, 'Y_out')
 
-    def compute_partials(self, inputs, partials):
+    def compute_jacvec_product(self, inputs, d_inputs, d_outputs, mode):
+        self.compute_multi_jacvec_product(inputs, d_inputs, d_outputs, mode)
+
+    def compute_multi_jacvec_product(self, inputs, d_inputs, d_outputs, mode):
         num_times = self.options['num_times']
         num_stages = self.options['num_stages']
         num_step_vars = self.options['num_step_vars']
 
-        for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
-            shape = state['shape']
+        layout = self.layout
 
-            F_name = get_name('F', state_name)
-            Y_out_name = get_name('Y_out', state_name)
-            Y_in_name = get_name('Y_in', state_name)
-            y0_name = get_name('y0', state_name)
+        mtx_y0 = self.mtx_y0
+        mtx_A = self.mtx_A
+        mtx_B = self.mtx_B
+        mtx_U = self.mtx_U
+        mtx_y_inv = self.mtx_y_inv
+        mtx_h = self.mtx_h
+
+        num_Y, num_F = mtx_A.shape
+        num_F, num_h = mtx_h.shape
+        num_y0 = mtx_y0.shape[1]
+
+        # All vectors are handled as packed (size, ncol) arrays, so that all states and
+        # all columns of multi-vectors are processed with a single batched solve.
+        state_name, (ind1, ind2) = list(iteritems(layout.offsets))[0]
+        Y_out_name = get_name('Y_out', state_name)
+        if Y_out_name not in d_outputs:
+            return
+
+        ncol = d_outputs[Y_out_name].size // ((num_times - 1) * num_stages * (ind2 - ind1))
+
+        h_vec = mtx_h.dot(inputs['h_vec'])
+        F_vec = layout.pack(inputs, 'F', (num_times - 1, num_stages)).flatten()
+
+        if mode == 'fwd':
+            d_F = layout.pack(d_inputs, 'F', (num_times - 1, num_stages), ncol)
+            d_y0 = layout.pack(d_inputs, 'y0', (num_step_vars,), ncol)
+
+            d_hF_vec = np.einsum('i,ij->ij', h_vec, d_F.reshape((num_F, ncol)))
+            if 'h_vec' in d_inputs:
+                d_hF_vec += np.einsum('ij,i->ij',
+                    mtx_h.dot(d_inputs['h_vec'].reshape((num_h, ncol))), F_vec)
+
+            d_Y = self._apply_operator(d_hF_vec, d_y0.reshape((num_y0, ncol)))
+
+            layout.unpack(d_Y.reshape((num_times - 1, num_stages, layout.size, ncol)),
+                d_outputs, 'Y_out', ncol, add=True)
+
+        elif mode == 'rev':
+            d_Y_vec = layout.pack(d_outputs, 'Y_out', (num_times - 1, num_stages), ncol) \
+                .reshape((num_Y, ncol))
 
-            mtx_y0 = self.mtx_y0_dict[state_name]
-            mtx = self.mtx_dict[state_name]
-            mtx_h = self.mtx_h_dict[state_name]
+            vec = mtx_y_inv.solve(mtx_U.T.dot(d_Y_vec), 'T')
+            d_hF_vec = mtx_A.T.dot(d_Y_vec) + mtx_B.T.dot(vec)
 
-            partials[Y_out_name, 'h_vec'][:, :] = mtx.dot(np.diag(inputs[F_name].flatten())).dot(mtx_h)
-            partials[Y_out_name, F_name][:, :] = mtx.dot(np.diag(mtx_h.dot(inputs['h_vec'])))
-            partials[Y_out_name, y0_name][:, :] = mtx_y0
+            layout.unpack(mtx_y0.T.dot(vec).reshape((num_step_vars, layout.size, ncol)),
+                d_inputs, 'y0', ncol, add=True)
+            layout.unpack(np.einsum('i,ij->ij', h_vec, d_hF_vec).reshape(
+                (num_times - 1, num_stages, layout.size, ncol)),
+                d_inputs, 'F', ncol, add=True)
+            if 'h_vec' in d_inputs:
+                d_inputs['h_vec'] += mtx_h.T.dot(np.einsum('i,ij->ij',
+                    F_vec, d_hF_vec)).reshape(d_inputs['h_vec'].shape)
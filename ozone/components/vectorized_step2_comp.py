@@ -1,12 +1,13 @@
 import numpy as np
 from six import iteritems
 import scipy.sparse
-import scipy.sparse.linalg
 
 from openmdao.api import ExplicitComponent
 
 from ozone.utils.var_names import get_name
 from ozone.utils.units import get_rate_units
+from ozone.utils.recurrence_solver import RecurrenceSolver
+from ozone.utils.setup_cache import setup_cache, get_array_key
 
 
 class VectorizedStep2Comp(ExplicitComponent):
@@ -33,39 +34,19 @@ class VectorizedStep2Comp(ExplicitComponent):
         self.mtx_h_dict = {}
         self.mtx_hf_dict = {}
 
-        self.num_y0_dict = {}
-        self.num_F_dict = {}
-        self.num_y_dict = {}
-
-        h_arange = np.arange(num_times - 1)
-        num_h = num_times - 1
-
         self.add_input('h_vec', shape=(num_times - 1), units=time_units)
 
+        # The operators only depend on the method, the grid, and the state shape, so they are
+        # shared across states, components, and setups.
+        key = ('VectorizedStep2Comp', get_array_key(glm_B), get_array_key(glm_V), num_times)
+
         for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
             shape = state['shape']
 
             y0_name = get_name('y0', state_name)
             F_name = get_name('F', state_name)
             y_name = get_name('y', state_name)
 
-            # --------------------------------------------------------------------------------
-
-            y0_arange = np.arange(num_step_vars * size).reshape((num_step_vars,) + shape)
-
-            F_arange = np.arange((num_times - 1) * num_stages * size).reshape(
-                (num_times - 1, num_stages,) + shape)
-
-            y_arange = np.arange(num_times * num_step_vars * size).reshape(
-                (num_times, num_step_vars,) + shape)
-
-            num_y0 = np.prod(y0_arange.shape)
-            num_F = np.prod(F_arange.shape)
-            num_y = np.prod(y_arange.shape)
-
-            # --------------------------------------------------------------------------------
-
             self.add_input(y0_name,
                 shape=(num_step_vars,) + shape,
                 units=state['units'])
@@ -78,70 +59,79 @@ class VectorizedStep2Comp(ExplicitComponent):
                 shape=(num_times, num_step_vars,) + shape,
                 units=state['units'])
 
-            # --------------------------------------------------------------------------------
-
-            data_list = []
-            rows_list = []
-            cols_list = []
-
-            # y identity
-            data = np.ones(num_y)
-            rows = np.arange(num_y)
-            cols = np.arange(num_y)
-            data_list.append(data); rows_list.append(rows); cols_list.append(cols)
-
-            # V blocks: (num_times - 1) x num_step_var x num_step_var x ...
-            data = np.einsum('jk,i...->ijk...',
-                -glm_V, np.ones((num_times - 1,) + shape)).flatten()
-            rows = np.einsum('ij...,k->ijk...',
-                y_arange[1:, :, :], np.ones(num_step_vars, int)).flatten()
-            cols = np.einsum('ik...,j->ijk...',
-                y_arange[:-1, :, :], np.ones(num_step_vars, int)).flatten()
-            data_list.append(data); rows_list.append(rows); cols_list.append(cols)
-
-            # concatenate
-            data = np.concatenate(data_list)
-            rows = np.concatenate(rows_list)
-            cols = np.concatenate(cols_list)
-
-            mtx = scipy.sparse.csc_matrix(
-                (data, (rows, cols)),
-                shape=(num_y, num_y))
-
-            self.mtx_lu_dict[state_name] = scipy.sparse.linalg.splu(mtx)
-
-            # --------------------------------------------------------------------------------
-
-            data = np.ones(num_y0)
-            rows = y_arange[0, :, :].flatten()
-            cols = np.arange(num_y0)
-            self.mtx_y0_dict[state_name] = scipy.sparse.csc_matrix(
-                (data, (rows, cols)),
-                shape=(num_y, num_y0))
-
-            # --------------------------------------------------------------------------------
-
-            data = np.ones(num_F)
-            rows = np.arange(num_F)
-            cols = np.einsum('i,j...->ij...',
-                h_arange, np.ones((num_stages,) + shape, int)).flatten()
-            self.mtx_h_dict[state_name] = scipy.sparse.csc_matrix(
-                (data, (rows, cols)),
-                shape=(num_F, num_h))
-
-            # --------------------------------------------------------------------------------
-
-            # B blocks: (num_times - 1) x num_step_vars x num_stage x ...
-            data = np.einsum('jk,i...->ijk...',
-                glm_B, np.ones((num_times - 1,) + shape)).flatten()
-            rows = np.einsum('ij...,k->ijk...',
-                y_arange[1:, :, :], np.ones(num_stages, int)).flatten()
-            cols = np.einsum('ik...,j->ijk...',
-                F_arange, np.ones(num_step_vars, int)).flatten()
-
-            self.mtx_hf_dict[state_name] = scipy.sparse.csc_matrix(
-                (data, (rows, cols)),
-                shape=(num_y, num_F))
+            operators = setup_cache.get(key + (shape,), lambda: self._get_operators(shape))
+
+            self.mtx_lu_dict[state_name] = operators['lu']
+            self.mtx_y0_dict[state_name] = operators['y0']
+            self.mtx_h_dict[state_name] = operators['h']
+            self.mtx_hf_dict[state_name] = operators['hf']
+
+    def _get_operators(self, shape):
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_step_vars = self.options['num_step_vars']
+        glm_B = self.options['glm_B']
+        glm_V = self.options['glm_V']
+
+        size = np.prod(shape)
+
+        h_arange = np.arange(num_times - 1)
+        num_h = num_times - 1
+
+        # ------------------------------------------------------------------------------------
+
+        y0_arange = np.arange(num_step_vars * size).reshape((num_step_vars,) + shape)
+
+        F_arange = np.arange((num_times - 1) * num_stages * size).reshape(
+            (num_times - 1, num_stages,) + shape)
+
+        y_arange = np.arange(num_times * num_step_vars * size).reshape(
+            (num_times, num_step_vars,) + shape)
+
+        num_y0 = np.prod(y0_arange.shape)
+        num_F = np.prod(F_arange.shape)
+        num_y = np.prod(y_arange.shape)
+
+        operators = {}
+
+        # ------------------------------------------------------------------------------------
+
+        # Inverse of the block-bidiagonal step recurrence matrix
+        operators['lu'] = RecurrenceSolver(np.array(glm_V), num_times, size)
+
+        # ------------------------------------------------------------------------------------
+
+        data = np.ones(num_y0)
+        rows = y_arange[0, :, :].flatten()
+        cols = np.arange(num_y0)
+        operators['y0'] = scipy.sparse.csc_matrix(
+            (data, (rows, cols)),
+            shape=(num_y, num_y0))
+
+        # ------------------------------------------------------------------------------------
+
+        data = np.ones(num_F)
+        rows = np.arange(num_F)
+        cols = np.einsum('i,j...->ij...',
+            h_arange, np.ones((num_stages,) + shape, int)).flatten()
+        operators['h'] = scipy.sparse.csc_matrix(
+            (data, (rows, cols)),
+            shape=(num_F, num_h))
+
+        # ------------------------------------------------------------------------------------
+
+        # B blocks: (num_times - 1) x num_step_vars x num_stage x ...
+        data = np.einsum('jk,i...->ijk...',
+            glm_B, np.ones((num_times - 1,) + shape)).flatten()
+        rows = np.einsum('ij...,k->ijk...',
+            y_arange[1:, :, :], np.ones(num_stages, int)).flatten()
+        cols = np.einsum('ik...,j->ijk...',
+            F_arange, np.ones(num_step_vars, int)).flatten()
+        operators['hf'] = scipy.sparse.csc_matrix(
+            (data, (rows, cols)),
+            shape=(num_y, num_F))
+
+        return operators
 
     def compute(self, inputs, outputs):
         num_times = self.options['num_times']
@@ -196,16 +186,15 @@ class VectorizedStep2Comp(ExplicitComponent):
                     if y0_name in d_inputs:
                         d_outputs[y_name][0, :, :] -= d_inputs[y0_name]
 
+                    # The F and h_vec terms share the same factorization, so they are
+                    # accumulated and solved together.
+                    vec = np.zeros((num_times - 1) * num_stages * size)
                     if F_name in d_inputs:
-                        vec = mtx_h.dot(inputs['h_vec']) * d_inputs[F_name].flatten()
-                        vec = mtx_hf.dot(vec)
-                        vec = mtx_lu.solve(vec)
-
-                        d_outputs[y_name] += vec.reshape(
-                            (num_times, num_step_vars,) + shape)
-
+                        vec += mtx_h.dot(inputs['h_vec']) * d_inputs[F_name].flatten()
                     if 'h_vec' in d_inputs:
-                        vec = mtx_h.dot(d_inputs['h_vec']) * inputs[F_name].flatten()
+                        vec += mtx_h.dot(d_inputs['h_vec']) * inputs[F_name].flatten()
+
+                    if F_name in d_inputs or 'h_vec' in d_inputs:
                         vec = mtx_hf.dot(vec)
                         vec = mtx_lu.solve(vec)
 
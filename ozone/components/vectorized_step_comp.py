@@ -1,16 +1,19 @@
 import numpy as np
 from six import iteritems
-import scipy.sparse
-import scipy.sparse.linalg
 
 from openmdao.api import ImplicitComponent
 
 from ozone.utils.var_names import get_name
 from ozone.utils.units import get_rate_units
+from ozone.utils.recurrence_solver import RecurrenceSolver
+from ozone.utils.packed_layout import PackedLayout
+from ozone.utils.setup_cache import setup_cache, get_array_key
 
 
 class VectorizedStepComp(ImplicitComponent):
 
+    assembled_partials = True
+
     def initialize(self):
         self.options.declare('states', types=dict)
         self.options.declare('time_units', types=str, allow_none=True)
@@ -25,32 +28,27 @@ class VectorizedStepComp(ImplicitComponent):
         num_times = self.options['num_times']
         num_stages = self.options['num_stages']
         num_step_vars = self.options['num_step_vars']
-        glm_B = self.options['glm_B']
         glm_V = self.options['glm_V']
 
-        self.dy_dy = dy_dy = {}
-        self.dy_dy_inv = dy_dy_inv = {}
-
-        h_arange = np.arange(num_times - 1)
+        # All states are stacked in one packed layout and share a single recurrence solver.
+        self.layout = layout = PackedLayout(self.options['states'])
+        self.dy_dy_inv = setup_cache.get(
+            ('RecurrenceSolver', get_array_key(glm_V), num_times, layout.size),
+            lambda: RecurrenceSolver(np.array(glm_V), num_times, layout.size))
 
         self.add_input('h_vec', shape=(num_times - 1), units=time_units)
 
+        # The sparsity patterns only depend on the method, the grid, and the state shape,
+        # so they are shared across states, components, and setups.
+        key = ('VectorizedStepComp', get_array_key(glm_V), num_times, num_stages, num_step_vars)
+
         for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
             shape = state['shape']
 
             F_name = get_name('F', state_name)
             y0_name = get_name('y0', state_name)
             y_name = get_name('y', state_name)
 
-            y0_arange = np.arange(num_step_vars * size).reshape((num_step_vars,) + shape)
-
-            y_arange = np.arange(num_times * num_step_vars * size).reshape(
-                (num_times, num_step_vars,) + shape)
-
-            F_arange = np.arange((num_times - 1) * num_stages * size).reshape(
-                (num_times - 1, num_stages,) + shape)
-
             self.add_input(F_name,
                 shape=(num_times - 1, num_stages,) + shape,
                 units=get_rate_units(state['units'], time_units))
@@ -63,174 +61,251 @@ class VectorizedStepComp(ImplicitComponent):
                 shape=(num_times, num_step_vars,) + shape,
                 units=state['units'])
 
-            # -----------------
+            # The matrix-free subclass declares no partials, so none are assembled.
+            if not self.assembled_partials:
+                continue
 
-            # (num_times, num_step_vars,) + shape
-            data1 = np.ones(num_times * num_step_vars * size)
-            rows1 = np.arange(num_times * num_step_vars * size)
-            cols1 = np.arange(num_times * num_step_vars * size)
+            pattern = setup_cache.get(key + (shape,),
+                lambda: self._get_partials_patterns(shape))
 
-            # (num_times - 1, num_step_vars, num_step_vars,) + shape
-            data2 = np.einsum('i...,jk->ijk...',
-                np.ones((num_times - 1,) + shape), -glm_V).flatten()
-            rows2 = np.einsum('ij...,k->ijk...',
-                y_arange[1:, :, :], np.ones(num_step_vars)).flatten()
-            cols2 = np.einsum('ik...,j->ijk...',
-                y_arange[:-1, :, :], np.ones(num_step_vars)).flatten()
+            data, rows, cols = pattern['y']
+            self.declare_partials(y_name, y_name, val=data, rows=rows, cols=cols)
 
-            data = np.concatenate([data1, data2])
-            rows = np.concatenate([rows1, rows2])
-            cols = np.concatenate([cols1, cols2])
+            data, rows, cols = pattern['y0']
+            self.declare_partials(y_name, y0_name, val=data, rows=rows, cols=cols)
 
-            dy_dy[state_name] = scipy.sparse.csc_matrix(
-                (data, (rows, cols)),
-                shape=(
-                    num_times * num_step_vars * size,
-                    num_times * num_step_vars * size))
+            rows, cols = pattern['h_vec']
+            self.declare_partials(y_name, 'h_vec', rows=rows, cols=cols)
 
-            dy_dy_inv[state_name] = scipy.sparse.linalg.splu(dy_dy[state_name])
+            rows, cols = pattern['F']
+            self.declare_partials(y_name, F_name, rows=rows, cols=cols)
 
-            self.declare_partials(y_name, y_name, val=data, rows=rows, cols=cols)
+    def _get_partials_patterns(self, shape):
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
+        num_step_vars = self.options['num_step_vars']
+        glm_V = self.options['glm_V']
 
-            # -----------------
+        size = np.prod(shape)
 
-            # (num_step_vars,) + shape
-            data = -np.ones((num_step_vars,) + shape).flatten()
-            rows = y_arange[0, :, :].flatten()
-            cols = y0_arange.flatten()
+        h_arange = np.arange(num_times - 1)
 
-            self.declare_partials(y_name, y0_name, val=data, rows=rows, cols=cols)
+        y0_arange = np.arange(num_step_vars * size).reshape((num_step_vars,) + shape)
 
-            # -----------------
+        y_arange = np.arange(num_times * num_step_vars * size).reshape(
+            (num_times, num_step_vars,) + shape)
 
-            # (num_times - 1, num_step_vars, num_stages,) + shape
-            rows = np.einsum('ij...,k->ijk...', y_arange[1:, :, :], np.ones(num_stages)).flatten()
+        F_arange = np.arange((num_times - 1) * num_stages * size).reshape(
+            (num_times - 1, num_stages,) + shape)
 
-            cols = np.einsum('jk...,i->ijk...',
-                np.ones((num_step_vars, num_stages,) + shape), h_arange).flatten()
-            self.declare_partials(y_name, 'h_vec', rows=rows, cols=cols)
+        pattern = {}
 
-            cols = np.einsum('ik...,j->ijk...', F_arange, np.ones(num_step_vars)).flatten()
-            self.declare_partials(y_name, F_name, rows=rows, cols=cols)
+        # -----------------
+
+        # (num_times, num_step_vars,) + shape
+        data1 = np.ones(num_times * num_step_vars * size)
+        rows1 = np.arange(num_times * num_step_vars * size)
+        cols1 = np.arange(num_times * num_step_vars * size)
+
+        # (num_times - 1, num_step_vars, num_step_vars,) + shape
+        data2 = np.einsum('i...,jk->ijk...',
+            np.ones((num_times - 1,) + shape), -glm_V).flatten()
+        rows2 = np.einsum('ij...,k->ijk...',
+            y_arange[1:, :, :], np.ones(num_step_vars)).flatten()
+        cols2 = np.einsum('ik...,j->ijk...',
+            y_arange[:-1, :, :], np.ones(num_step_vars)).flatten()
+
+        pattern['y'] = (
+            np.concatenate([data1, data2]),
+            np.concatenate([rows1, rows2]),
+            np.concatenate([cols1, cols2]),
+        )
+
+        # -----------------
+
+        # (num_step_vars,) + shape
+        data = -np.ones((num_step_vars,) + shape).flatten()
+        rows = y_arange[0, :, :].flatten()
+        cols = y0_arange.flatten()
+
+        pattern['y0'] = (data, rows, cols)
+
+        # -----------------
+
+        # (num_times - 1, num_step_vars,) + shape
+        rows = y_arange[1:, :, :].flatten()
+        cols = np.einsum('j...,i->ij...',
+            np.ones((num_step_vars,) + shape), h_arange).flatten()
+        pattern['h_vec'] = (rows, cols)
+
+        # (num_times - 1, num_step_vars, num_stages,) + shape
+        rows = np.einsum('ij...,k->ijk...', y_arange[1:, :, :], np.ones(num_stages)).flatten()
+        cols = np.einsum('ik...,j->ijk...', F_arange, np.ones(num_step_vars)).flatten()
+        pattern['F'] = (rows, cols)
+
+        return pattern
 
     def apply_nonlinear(self, inputs, outputs, residuals):
         num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
         num_step_vars = self.options['num_step_vars']
         glm_B = self.options['glm_B']
+        glm_V = self.options['glm_V']
 
-        dy_dy = self.dy_dy
-
-        for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
-            shape = state['shape']
+        layout = self.layout
 
-            F_name = get_name('F', state_name)
-            y0_name = get_name('y0', state_name)
-            y_name = get_name('y', state_name)
+        # Packed arrays: (num_times, num_step_vars, num_state_vars), etc.
+        y = layout.pack(outputs, 'y', (num_times, num_step_vars))
+        y0 = layout.pack(inputs, 'y0', (num_step_vars,))
+        F = layout.pack(inputs, 'F', (num_times - 1, num_stages))
 
-            # dy_dy term
-            in_vec = outputs[y_name].reshape((num_times * num_step_vars * size))
-            out_vec = dy_dy[state_name].dot(in_vec).reshape(
-                (num_times, num_step_vars,) + shape)
+        res = y.copy() # y term
+        res[1:, :, :] -= np.einsum('jk,ik...->ij...', glm_V, y[:-1, :, :]) # V term
+        res[0, :, :] -= y0 # y0 term
+        res[1:, :, :] -= np.einsum('jl,i,il...->ij...',
+            glm_B, inputs['h_vec'], F) # hF term
 
-            residuals[y_name] = out_vec # y term
-            residuals[y_name][0, :, :] -= inputs[y0_name] # y0 term
-            residuals[y_name][1:, :, :] -= np.einsum('jl,i,il...->ij...',
-                glm_B, inputs['h_vec'], inputs[F_name]) # hF term
+        layout.unpack(res, residuals, 'y')
 
     def solve_nonlinear(self, inputs, outputs):
         num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
         num_step_vars = self.options['num_step_vars']
         glm_B = self.options['glm_B']
 
-        dy_dy_inv = self.dy_dy_inv
+        layout = self.layout
 
-        for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
-            shape = state['shape']
+        y0 = layout.pack(inputs, 'y0', (num_step_vars,))
+        F = layout.pack(inputs, 'F', (num_times - 1, num_stages))
 
-            F_name = get_name('F', state_name)
-            y0_name = get_name('y0', state_name)
-            y_name = get_name('y', state_name)
+        vec = np.zeros((num_times, num_step_vars, layout.size))
+        vec[0, :, :] += y0 # y0 term
+        vec[1:, :, :] += np.einsum('jl,i,il...->ij...',
+            glm_B, inputs['h_vec'], F) # hF term
 
-            vec = np.zeros((num_times, num_step_vars,) + shape)
-            vec[0, :, :] += inputs[y0_name] # y0 term
-            vec[1:, :, :] += np.einsum('jl,i,il...->ij...',
-                glm_B, inputs['h_vec'], inputs[F_name]) # hF term
+        y = self.dy_dy_inv.solve(vec.flatten(), 'N').reshape(
+            (num_times, num_step_vars, layout.size))
 
-            outputs[y_name] = dy_dy_inv[state_name].solve(vec.flatten(), 'N').reshape(
-                (num_times, num_step_vars,) + shape)
+        layout.unpack(y, outputs, 'y')
 
     def linearize(self, inputs, outputs, partials):
+        num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
         glm_B = self.options['glm_B']
 
-        for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
-            shape = state['shape']
+        layout = self.layout
+
+        F = layout.pack(inputs, 'F', (num_times - 1, num_stages))
+
+        # (num_times - 1, num_step_vars, num_stages,), the same for all states
+        dy_dF = -np.einsum('jk,i->ijk', glm_B, inputs['h_vec']).flatten()
 
+        # (num_times - 1, num_step_vars, num_state_vars)
+        dy_dh = -np.einsum('jk,ik...->ij...', glm_B, F)
+
+        for state_name, (ind1, ind2) in iteritems(layout.offsets):
             F_name = get_name('F', state_name)
-            y0_name = get_name('y0', state_name)
             y_name = get_name('y', state_name)
 
-            # (num_times - 1, num_step_vars, num_stages,) + shape
+            partials[y_name, F_name] = np.repeat(dy_dF, ind2 - ind1)
+            partials[y_name, 'h_vec'] = dy_dh[:, :, ind1:ind2].flatten()
+
+    def solve_linear(self, d_outputs, d_residuals, mode):
+        num_times = self.options['num_times']
+        num_step_vars = self.options['num_step_vars']
+
+        layout = self.layout
 
-            partials[y_name, F_name] = -np.einsum(
-                '...,jk,i->ijk...', np.ones(shape), glm_B, inputs['h_vec']).flatten()
+        if mode == 'fwd':
+            rhs_vec = layout.pack(d_residuals, 'y', (num_times, num_step_vars))
+            solve_mode = 'N'
+        elif mode == 'rev':
+            rhs_vec = layout.pack(d_outputs, 'y', (num_times, num_step_vars))
+            solve_mode = 'T'
 
-            partials[y_name, 'h_vec'] = -np.einsum(
-                'jk,ik...->ijk...', glm_B, inputs[F_name]).flatten()
+        sol_vec = self.dy_dy_inv.solve(rhs_vec.flatten(), solve_mode).reshape(rhs_vec.shape)
 
-    def solve_linear(self, d_outputs, d_residuals, mode):
+        if mode == 'fwd':
+            layout.unpack(sol_vec, d_outputs, 'y')
+        elif mode == 'rev':
+            layout.unpack(sol_vec, d_residuals, 'y')
+
+    def solve_multi_linear(self, d_outputs, d_residuals, mode):
         num_times = self.options['num_times']
         num_step_vars = self.options['num_step_vars']
 
-        dy_dy_inv = self.dy_dy_inv
+        layout = self.layout
 
-        for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
-            shape = state['shape']
+        state_name = list(self.options['states'])[0]
 
-            y_name = get_name('y', state_name)
+        nrow = num_times * num_step_vars * layout.size
+        ncol = d_outputs[get_name('y', state_name)].shape[-1]
 
-            if mode == 'fwd':
-                rhs_vec = d_residuals[y_name].flatten()
-                solve_mode = 'N'
-            elif mode == 'rev':
-                rhs_vec = d_outputs[y_name].flatten()
-                solve_mode = 'T'
+        if mode == 'fwd':
+            rhs_array = layout.pack(d_residuals, 'y', (num_times, num_step_vars), ncol)
+            solve_mode = 'N'
+        elif mode == 'rev':
+            rhs_array = layout.pack(d_outputs, 'y', (num_times, num_step_vars), ncol)
+            solve_mode = 'T'
 
-            sol_vec = dy_dy_inv[state_name].solve(rhs_vec, solve_mode)
+        # All states and right-hand sides are solved at once
+        sol_array = self.dy_dy_inv.solve(
+            rhs_array.reshape((nrow, ncol)), solve_mode).reshape(rhs_array.shape)
 
-            if mode == 'fwd':
-                d_outputs[y_name] = sol_vec.reshape((num_times, num_step_vars,) + shape)
-            elif mode == 'rev':
-                d_residuals[y_name] = sol_vec.reshape((num_times, num_step_vars,) + shape)
+        if mode == 'fwd':
+            layout.unpack(sol_array, d_outputs, 'y', ncol)
+        elif mode == 'rev':
+            layout.unpack(sol_array, d_residuals, 'y', ncol)
 
-    def solve_multi_linear(self, d_outputs, d_residuals, mode):
+
+class MatrixFreeVectorizedStepComp(VectorizedStepComp):
+    """
+    Step recurrence with matrix-free products applied from the GLM coefficients.
+
+    No partials are declared, so no Jacobian is assembled and the memory for the linearization
+    is that of the inputs. This requires an iterative linear solver, e.g., a Krylov solver.
+    """
+
+    assembled_partials = False
+
+    def linearize(self, inputs, outputs, partials):
+        pass
+
+    def apply_linear(self, inputs, outputs, d_inputs, d_outputs, d_residuals, mode):
         num_times = self.options['num_times']
+        num_stages = self.options['num_stages']
         num_step_vars = self.options['num_step_vars']
+        glm_B = self.options['glm_B']
+        glm_V = self.options['glm_V']
 
-        dy_dy_inv = self.dy_dy_inv
+        layout = self.layout
 
-        for state_name, state in iteritems(self.options['states']):
-            size = np.prod(state['shape'])
-            shape = state['shape']
+        h_vec = inputs['h_vec']
+        F = layout.pack(inputs, 'F', (num_times - 1, num_stages))
 
-            y_name = get_name('y', state_name)
+        if mode == 'fwd':
+            d_y = layout.pack(d_outputs, 'y', (num_times, num_step_vars))
+            d_y0 = layout.pack(d_inputs, 'y0', (num_step_vars,))
+            d_F = layout.pack(d_inputs, 'F', (num_times - 1, num_stages))
+
+            d_res = d_y.copy()
+            d_res[1:, :, :] -= np.einsum('jk,ik...->ij...', glm_V, d_y[:-1, :, :])
+            d_res[0, :, :] -= d_y0
+            d_res[1:, :, :] -= np.einsum('jl,i,il...->ij...', glm_B, h_vec, d_F)
+            if 'h_vec' in d_inputs:
+                d_res[1:, :, :] -= np.einsum('jl,i,il...->ij...', glm_B, d_inputs['h_vec'], F)
+
+            layout.unpack(d_res, d_residuals, 'y', add=True)
+
+        elif mode == 'rev':
+            d_res = layout.pack(d_residuals, 'y', (num_times, num_step_vars))
+
+            d_y = d_res.copy()
+            d_y[:-1, :, :] -= np.einsum('jk,ij...->ik...', glm_V, d_res[1:, :, :])
 
-            nrow = num_times * num_step_vars * size
-            ncol = d_outputs[y_name].shape[-1]
-
-            if mode == 'fwd':
-                rhs_array = d_residuals[y_name].reshape((nrow, ncol))
-                sol_array = d_outputs[y_name].reshape((nrow, ncol))
-                solve_mode = 'N'
-            elif mode == 'rev':
-                rhs_array = d_outputs[y_name].reshape((nrow, ncol))
-                sol_array = d_residuals[y_name].reshape((nrow, ncol))
-                solve_mode = 'T'
-
-            for icol in range(ncol):
-                rhs = rhs_array[:, icol]
-                sol = dy_dy_inv[state_name].solve(rhs, solve_mode)
-                sol_array[:, icol] = sol
+            layout.unpack(d_y, d_outputs, 'y', add=True)
+            layout.unpack(-d_res[0, :, :], d_inputs, 'y0', add=True)
+            layout.unpack(-np.einsum('jl,i,ij...->il...', glm_B, h_vec, d_res[1:, :, :]),
+                d_inputs, 'F', add=True)
+            if 'h_vec' in d_inputs:
+                d_inputs['h_vec'] -= np.einsum('jl,ilm,ijm->i', glm_B, F, d_res[1:, :, :])
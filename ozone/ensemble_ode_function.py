@@ -0,0 +1,59 @@
+from __future__ import print_function, division, absolute_import
+
+from six import iteritems
+
+from ozone.ode_function import ODEFunction
+from ozone.utils.var_names import get_name
+
+
+class EnsembleODEFunction(ODEFunction):
+    """
+    ODE function for an ensemble of independent copies of another ODE function.
+
+    Each state and parameter gets a leading ensemble axis, i.e., a variable of shape 'shape'
+    becomes a variable of shape (ensemble_size,) + shape, so that many initial conditions and
+    parameter sets are integrated at once, within a single setup. The ODE system is evaluated
+    once on num_nodes * ensemble_size nodes.
+    """
+
+    def initialize(self, ode_function, ensemble_size):
+        """
+        Declare the variables of the ensemble.
+
+        Parameters
+        ----------
+        ode_function : ODEFunction
+            The ODE function of each member of the ensemble.
+        ensemble_size : int
+            Number of members of the ensemble.
+        """
+        from ozone.components.ensemble_ode_system import EnsembleODESystem
+
+        self.ode_function = ode_function
+        self.ensemble_size = ensemble_size
+
+        self.set_system(EnsembleODESystem,
+            {'ode_function': ode_function, 'ensemble_size': ensemble_size})
+
+        time_options = ode_function._time_options
+        self.declare_time(targets=['time'] if time_options['targets'] else None,
+            units=time_options['units'])
+
+        for state_name, state in iteritems(ode_function._states):
+            self.declare_state(state_name, get_name('rate', state_name),
+                targets=[get_name('state', state_name)] if state['targets'] else None,
+                shape=(ensemble_size,) + state['shape'], units=state['units'])
+
+        for parameter_name, parameter in iteritems(ode_function._static_parameters):
+            self.declare_parameter(parameter_name,
+                [get_name('static_parameter', parameter_name)] if parameter['targets'] else None,
+                shape=(ensemble_size,) + parameter['shape'], units=parameter['units'],
+                dynamic=False)
+
+        for parameter_name, parameter in iteritems(ode_function._dynamic_parameters):
+            self.declare_parameter(parameter_name,
+                [get_name('dynamic_parameter', parameter_name)] if parameter['targets'] else None,
+                shape=(ensemble_size,) + parameter['shape'], units=parameter['units'],
+                dynamic=True, interpolation=parameter['interpolation'],
+                interpolation_order=parameter['interpolation_order'],
+                control_times=parameter['control_times'])
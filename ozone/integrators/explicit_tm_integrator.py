@@ -16,9 +16,49 @@ class ExplicitTMIntegrator(Integrator):
     Integrate an explicit method with a time-marching approach.
     """
 
+    def initialize(self):
+        super(ExplicitTMIntegrator, self).initialize()
+
+        self.options.declare('fused', default=False, types=bool)
+        self.options.declare('max_stored_steps', default=None, types=int, allow_none=True)
+        self.options.declare('checkpoint_file', default=None, types=str, allow_none=True)
+        self.options.declare('checkpoint_interval', default=100, types=int)
+        self.options.declare('restart', default=False, types=bool)
+        self.options.declare('state_dir', default=None, types=str, allow_none=True)
+        self.options.declare('adaptive', default=False, types=bool)
+        self.options.declare('atol', default=1e-6, types=float)
+        self.options.declare('rtol', default=1e-3, types=float)
+
     def setup(self):
         super(ExplicitTMIntegrator, self).setup()
 
+        fused_options = dict(checkpoint_file=self.options['checkpoint_file'],
+            checkpoint_interval=self.options['checkpoint_interval'],
+            restart=self.options['restart'], state_dir=self.options['state_dir'])
+
+        if self.options['adaptive']:
+            method = self.options['method']
+
+            assert method.error_weights is not None, \
+                'Adaptive time-marching requires a method with an embedded error estimator'
+            assert self.options['dense_times'] is None, \
+                'Dense output is not supported with adaptive time-marching'
+
+            self._setup_fused_time_marching(
+                error_weights=method.error_weights, embedded_order=method.embedded_order,
+                atol=self.options['atol'], rtol=self.options['rtol'], **fused_options)
+            return
+
+        # The dense output and the events need the stage rates of each step,
+        # which only the fused component has, and only it marches in a loop that can be saved
+        # or stream the states
+        if self.options['fused'] or self.options['dense_times'] is not None \
+                or len(self.options['ode_function']._events) > 0 \
+                or self.options['checkpoint_file'] is not None \
+                or self.options['state_dir'] is not None:
+            self._setup_fused_time_marching(**fused_options)
+            return
+
         ode_function = self.options['ode_function']
         method = self.options['method']
         starting_coeffs = self.options['starting_coeffs']
@@ -91,6 +131,7 @@ class ExplicitTMIntegrator(Integrator):
                     self._connect_multiple(
                         self._get_static_parameter_names('static_parameter_comp', 'out'),
                         self._get_static_parameter_names(ode_comp_name, 'targets'),
+                        self._get_static_src_indices(1),
                     )
                 if len(dynamic_parameters) > 0:
                     src_indices_list = []
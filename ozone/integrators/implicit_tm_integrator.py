@@ -9,16 +9,64 @@ from ozone.components.implicit_tm_stage_comp import ImplicitTMStageComp
 from ozone.components.implicit_tm_step_comp import ImplicitTMStepComp
 from ozone.components.tm_output_comp import TMOutputComp
 from ozone.utils.var_names import get_name
+from ozone.utils.modified_newton import ModifiedNewtonSolver
+from ozone.utils.sparse_direct_solver import SparseDirectSolver
 
 
 class ImplicitTMIntegrator(Integrator):
     """
     Integrate an implicit method with a time-marching approach.
+
+    If modified_newton is True, the stage equations of each step are solved with a modified
+    Newton method that reuses the factorization of the Jacobian across iterations and from one
+    step to the next, and only refactors it when the residual norm decreases by less than the
+    factor max_contraction in an iteration. If stage_solver is 'kronecker', the time
+    integration is fused and the Newton matrix of the stages is decoupled by diagonalizing
+    glm_A once per method, into num_stages systems of the size of the state vector.
+
+    The Jacobian of each step group is assembled as a dense matrix by default. If
+    assembled_jac_type is 'csc', it is assembled as a sparse matrix and factored by a sparse
+    LU with the permc_spec column ordering, so that an ODE with sparse partials and many states
+    only needs memory in proportion to the nonzeros of its Jacobian.
     """
 
+    def initialize(self):
+        super(ImplicitTMIntegrator, self).initialize()
+
+        self.options.declare('fused', default=False, types=bool)
+        self.options.declare('max_stored_steps', default=None, types=int, allow_none=True)
+        self.options.declare('checkpoint_file', default=None, types=str, allow_none=True)
+        self.options.declare('checkpoint_interval', default=100, types=int)
+        self.options.declare('restart', default=False, types=bool)
+        self.options.declare('state_dir', default=None, types=str, allow_none=True)
+        self.options.declare('modified_newton', default=False, types=bool)
+        self.options.declare('max_contraction', default=0.5, types=float)
+        self.options.declare('stage_solver', default='dense', values=['dense', 'kronecker'])
+        self.options.declare('assembled_jac_type', default='dense', values=['dense', 'csc'])
+        self.options.declare('permc_spec', default='COLAMD',
+            values=['NATURAL', 'MMD_ATA', 'MMD_AT_PLUS_A', 'COLAMD'])
+
     def setup(self):
         super(ImplicitTMIntegrator, self).setup()
 
+        # The dense output and the events need the stage rates of each step, and the
+        # decoupled stage systems need the Jacobian of the rates, which only the fused
+        # component has; only it marches in a loop that can be saved or stream the states
+        if self.options['fused'] or self.options['dense_times'] is not None \
+                or len(self.options['ode_function']._events) > 0 \
+                or self.options['stage_solver'] == 'kronecker' \
+                or self.options['checkpoint_file'] is not None \
+                or self.options['state_dir'] is not None:
+            self._setup_fused_time_marching(
+                modified_newton=self.options['modified_newton'],
+                max_contraction=self.options['max_contraction'],
+                stage_solver=self.options['stage_solver'],
+                checkpoint_file=self.options['checkpoint_file'],
+                checkpoint_interval=self.options['checkpoint_interval'],
+                restart=self.options['restart'],
+                state_dir=self.options['state_dir'])
+            return
+
         ode_function = self.options['ode_function']
         method = self.options['method']
         starting_coeffs = self.options['starting_coeffs']
@@ -49,8 +97,11 @@ class ImplicitTMIntegrator(Integrator):
         integration_group = Group()
         self.add_subsystem('integration_group', integration_group)
 
+        # Factorization passed on from each step group to the next with modified Newton
+        shared = {}
+
         for i_step in range(len(my_norm_times) - 1):
-            group = Group(assembled_jac_type='dense')
+            group = Group(assembled_jac_type=self.options['assembled_jac_type'])
             group_old_name = 'integration_group.step_%i' % (i_step - 1)
             group_new_name = 'integration_group.step_%i' % i_step
             integration_group.add_subsystem(group_new_name.split('.')[1], group)
@@ -67,7 +118,7 @@ class ImplicitTMIntegrator(Integrator):
                 self._connect_multiple(
                     self._get_static_parameter_names('static_parameter_comp', 'out'),
                     self._get_static_parameter_names(group_new_name + '.ode_comp', 'targets'),
-                    src_indices_list=[[0] * num_stages for _ in range(len(static_parameters))]
+                    self._get_static_src_indices(num_stages),
                 )
             if len(dynamic_parameters) > 0:
                 src_indices_list = []
@@ -77,8 +128,7 @@ class ImplicitTMIntegrator(Integrator):
 
                     arange = np.arange(((len(my_norm_times) - 1) * num_stages * size)).reshape(
                         ((len(my_norm_times) - 1, num_stages,) + shape))
-                    src_indices = arange[i_step, :, :]
-                    src_indices_list.append(src_indices.flat)
+                    src_indices_list.append(arange[i_step])
                 self._connect_multiple(
                     self._get_dynamic_parameter_names('dynamic_parameter_comp', 'out'),
                     self._get_dynamic_parameter_names(group_new_name + '.ode_comp', 'targets'),
@@ -135,8 +185,16 @@ class ImplicitTMIntegrator(Integrator):
                     self._get_state_names(group_new_name + '.stage_comp', 'y_old', i_step=i_step),
                 )
 
-            group.nonlinear_solver = NewtonSolver(iprint=2, maxiter=100)
-            group.linear_solver = DirectSolver(assemble_jac=True)
+            if self.options['modified_newton']:
+                group.nonlinear_solver = ModifiedNewtonSolver(shared=shared, iprint=2,
+                    maxiter=100, max_contraction=self.options['max_contraction'])
+            else:
+                group.nonlinear_solver = NewtonSolver(iprint=2, maxiter=100)
+            if self.options['assembled_jac_type'] == 'csc':
+                group.linear_solver = SparseDirectSolver(assemble_jac=True,
+                    permc_spec=self.options['permc_spec'])
+            else:
+                group.linear_solver = DirectSolver(assemble_jac=True)
 
         promotes = []
         promotes.extend([get_name('state', state_name) for state_name in states])
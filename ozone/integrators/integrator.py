@@ -9,6 +9,9 @@ from ozone.components.time_comp import TimeComp
 from ozone.components.starting_comp import StartingComp
 from ozone.components.static_parameter_comp import StaticParameterComp
 from ozone.components.dynamic_parameter_comp import DynamicParameterComp
+from ozone.components.fused_tm_comp import FusedTMComp
+from ozone.components.vectorized_output_comp import VectorizedOutputComp
+from ozone.components.dense_output_comp import DenseOutputComp
 from ozone.methods.method import GLMMethod
 from ozone.ode_function import ODEFunction
 from ozone.utils.var_names import get_name
@@ -33,6 +36,7 @@ class Integrator(Group):
         self.options.declare('final_time', default=None)
         self.options.declare('normalized_times', types=np.ndarray)
         self.options.declare('all_norm_times', types=np.ndarray)
+        self.options.declare('dense_times', types=np.ndarray, allow_none=True, default=None)
 
     def setup(self):
         ode_function = self.options['ode_function']
@@ -166,9 +170,16 @@ class Integrator(Group):
             starting_method_name, starting_coeffs, starting_times = method.starting_method
             method = get_method(starting_method_name)
 
+            # The dense output times that fall within the starting interval
+            dense_times = self.options['dense_times']
+            if dense_times is not None and np.any(dense_times < my_norm_times[0]):
+                starting_dense_times = dense_times[dense_times < my_norm_times[0]]
+            else:
+                starting_dense_times = None
+
             starting_system = self.__class__(ode_function=ode_function, method=method,
                 normalized_times=starting_norm_times, all_norm_times=all_norm_times,
-                starting_coeffs=starting_coeffs,
+                starting_coeffs=starting_coeffs, dense_times=starting_dense_times,
             )
 
             promotes.extend([
@@ -180,6 +191,153 @@ class Integrator(Group):
         self.add_subsystem('starting_system', starting_system,
             promotes_inputs=promotes)
 
+    def _setup_fused_time_marching(self, comp_class=FusedTMComp, **kwargs):
+        ode_function = self.options['ode_function']
+        method = self.options['method']
+        starting_coeffs = self.options['starting_coeffs']
+
+        has_starting_method = method.starting_method is not None
+        is_starting_method = starting_coeffs is not None
+
+        states = ode_function._states
+        static_parameters = ode_function._static_parameters
+        dynamic_parameters = ode_function._dynamic_parameters
+        time_units = ode_function._time_options['units']
+
+        starting_norm_times, my_norm_times = self._get_meta()
+
+        glm_A, glm_B, glm_U, glm_V, num_stages, num_step_vars = self._get_method()
+
+        num_times = len(my_norm_times)
+
+        # The events are only located after the interval covered by the starting method
+        locate_events = len(ode_function._events) > 0 and not is_starting_method
+
+        if has_starting_method:
+            self.starting_system.options['fused'] = True
+            self.starting_system.options['max_stored_steps'] = self.options['max_stored_steps']
+
+        # With the states streamed to files, the integration component writes them all,
+        # including those of the starting method, and only outputs the final states
+        state_dir = kwargs.get('state_dir')
+        if state_dir is not None:
+            assert self.options['dense_times'] is None, \
+                'Dense output is not supported with the states streamed to files'
+
+            kwargs['num_starting_times'] = len(starting_norm_times)
+
+        # ------------------------------------------------------------------------------------
+
+        comp = comp_class(ode_function=ode_function, time_units=time_units,
+            num_times=num_times, num_stages=num_stages, num_step_vars=num_step_vars,
+            glm_A=glm_A, glm_B=glm_B, glm_U=glm_U, glm_V=glm_V, abscissa=method.abscissa,
+            max_stored_steps=self.options['max_stored_steps'],
+            output_rates=self.options['dense_times'] is not None, locate_events=locate_events,
+            **kwargs
+        )
+        promotes = []
+        if locate_events:
+            promotes.extend([get_name('event_time', event_name)
+                for event_name in ode_function._events])
+        if state_dir is not None:
+            promotes.extend([get_name('final_state', state_name) for state_name in states])
+
+        self.add_subsystem('integration_comp', comp, promotes_outputs=promotes)
+        self.connect('time_comp.h_vec', 'integration_comp.h_vec')
+        if ode_function._time_options['targets'] or locate_events:
+            self.connect('time_comp.stage_times', 'integration_comp.stage_times')
+
+        self._connect_multiple(
+            self._get_state_names('starting_system', 'starting'),
+            self._get_state_names('integration_comp', 'y0'),
+        )
+        if len(static_parameters) > 0:
+            self._connect_multiple(
+                self._get_static_parameter_names('static_parameter_comp', 'out'),
+                self._get_static_parameter_names('integration_comp', 'static_parameter'),
+            )
+        if len(dynamic_parameters) > 0:
+            self._connect_multiple(
+                self._get_dynamic_parameter_names('dynamic_parameter_comp', 'out'),
+                self._get_dynamic_parameter_names('integration_comp', 'dynamic_parameter'),
+            )
+
+        if state_dir is not None:
+            if has_starting_method:
+                self._connect_multiple(
+                    self._get_state_names('starting_system', 'state'),
+                    self._get_state_names('integration_comp', 'starting_state'),
+                )
+            return
+
+        comp = VectorizedOutputComp(states=states,
+            num_starting_times=len(starting_norm_times), num_my_times=len(my_norm_times),
+            num_step_vars=num_step_vars, starting_coeffs=starting_coeffs,
+        )
+
+        promotes = []
+        promotes.extend([get_name('state', state_name) for state_name in states])
+        if is_starting_method:
+            promotes.extend([get_name('starting', state_name) for state_name in states])
+
+        self.add_subsystem('output_comp', comp, promotes_outputs=promotes)
+        if has_starting_method:
+            self._connect_multiple(
+                self._get_state_names('starting_system', 'state'),
+                self._get_state_names('output_comp', 'starting_state'),
+            )
+
+        self._connect_multiple(
+            self._get_state_names('integration_comp', 'y'),
+            self._get_state_names('output_comp', 'y'),
+        )
+
+        if self.options['dense_times'] is not None:
+            self._setup_dense_output('integration_comp', 'integration_comp', 'F')
+
+    def _setup_dense_output(self, y_comp_name, F_comp_name, F_type, F_src_indices=None):
+        ode_function = self.options['ode_function']
+        method = self.options['method']
+        dense_times = self.options['dense_times']
+
+        states = ode_function._states
+
+        starting_norm_times, my_norm_times = self._get_meta()
+
+        comp = DenseOutputComp(states=states, time_units=ode_function._time_options['units'],
+            glm_A=method.A, glm_B=method.B, glm_U=method.U, glm_V=method.V,
+            abscissa=method.abscissa, normalized_times=my_norm_times, dense_times=dense_times)
+        self.add_subsystem('dense_output_comp', comp,
+            promotes_outputs=[get_name('dense_state', state_name) for state_name in states])
+
+        self.connect('time_comp.h_vec', 'dense_output_comp.h_vec')
+        self._connect_multiple(
+            self._get_state_names(y_comp_name, 'y'),
+            self._get_state_names('dense_output_comp', 'y'),
+        )
+        self._connect_multiple(
+            self._get_state_names(F_comp_name, F_type),
+            self._get_state_names('dense_output_comp', 'F'),
+            F_src_indices,
+        )
+
+        if np.any(dense_times < my_norm_times[0]):
+            self._connect_multiple(
+                self._get_state_names('starting_system', 'dense_state'),
+                self._get_state_names('dense_output_comp', 'starting_dense_state'),
+            )
+
+    def _get_static_src_indices(self, num_nodes):
+        # Indices that broadcast each static parameter to all nodes of the ODE system
+        src_indices_list = []
+        for parameter_name, parameter in iteritems(
+                self.options['ode_function']._static_parameters):
+            size = int(np.prod(parameter['shape']))
+            src_indices_list.append(np.einsum('i,j->ij',
+                np.ones(num_nodes, int), np.arange(size)).reshape(
+                (num_nodes,) + parameter['shape']))
+        return src_indices_list
+
     def _get_state_names(self, comp, type_, i_step=None, i_stage=None, j_stage=None):
         return self._get_names('states',
             comp, type_, i_step=i_step, i_stage=i_stage, j_stage=j_stage)
@@ -0,0 +1,43 @@
+from ozone.integrators.integrator import Integrator
+from ozone.components.parareal_comp import PararealComp
+from ozone.methods_list import get_method
+
+
+class PararealIntegrator(Integrator):
+    """
+    Integrate a one-step method with the parareal parallel-in-time algorithm.
+    """
+
+    def initialize(self):
+        super(PararealIntegrator, self).initialize()
+
+        self.options.declare('num_slices', default=4, types=int)
+        self.options.declare('pool_type', default='process', values=['process', 'thread'])
+        self.options.declare('coarse_method', default='RK4', types=str)
+        self.options.declare('coarse_steps', default=1, types=int)
+        self.options.declare('parareal_tol', default=1e-10, types=float)
+        self.options.declare('max_iter', default=None, types=int, allow_none=True)
+        self.options.declare('max_stored_steps', default=None, types=int, allow_none=True)
+
+    def setup(self):
+        method = self.options['method']
+        coarse_method = get_method(self.options['coarse_method'])
+
+        assert method.starting_method is None and method.num_values == 1, \
+            'The parareal formulation requires a one-step method'
+        assert coarse_method.explicit and coarse_method.num_values == 1, \
+            'The coarse method must be an explicit one-step method'
+        assert self.options['dense_times'] is None, \
+            'Dense output is not supported with the parareal formulation'
+
+        # Setting up again replaces the integration component, so its workers are shut down
+        if isinstance(getattr(self, 'integration_comp', None), PararealComp):
+            self.integration_comp.close()
+
+        super(PararealIntegrator, self).setup()
+
+        self._setup_fused_time_marching(PararealComp,
+            num_slices=self.options['num_slices'], pool_type=self.options['pool_type'],
+            coarse_glm_A=coarse_method.A, coarse_glm_B=coarse_method.B,
+            coarse_steps=self.options['coarse_steps'],
+            parareal_tol=self.options['parareal_tol'], max_iter=self.options['max_iter'])
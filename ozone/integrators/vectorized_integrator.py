@@ -1,13 +1,24 @@
 import numpy as np
 from six import iteritems
 
-from openmdao.api import Group, IndepVarComp, NewtonSolver, DirectSolver, ScipyIterativeSolver, LinearBlockGS, NonlinearBlockGS, PetscKSP
+from openmdao.api import (Group, IndepVarComp, NewtonSolver, DirectSolver,
+    ScipyIterativeSolver, ScipyKrylov, LinearBlockGS, NonlinearBlockGS, PetscKSP)
 
 from ozone.integrators.integrator import Integrator
-from ozone.components.vectorized_step_comp import VectorizedStepComp
+from ozone.components.vectorized_step_comp import VectorizedStepComp, \
+    MatrixFreeVectorizedStepComp
+from ozone.components.vectorized_stage_comp import VectorizedStageComp, \
+    MatrixFreeVectorizedStageComp
 from ozone.components.vectorized_stagestep_comp import VectorizedStageStepComp
 from ozone.components.vectorized_output_comp import VectorizedOutputComp
+from ozone.components.parallel_ode_comp import ParallelODEComp
 from ozone.utils.var_names import get_name
+from ozone.utils.preconditioner import LinearBlockGSPreconditioner
+
+
+# Largest number of stage constraints in the optimizer-based formulation whose derivatives are
+# computed with vectorize_derivs
+max_vectorized_constraints = 1000
 
 
 class VectorizedIntegrator(Integrator):
@@ -19,14 +30,24 @@ class VectorizedIntegrator(Integrator):
         super(VectorizedIntegrator, self).initialize()
 
         self.options.declare('formulation', default='solver-based', values=['solver-based', 'optimizer-based'])
+        self.options.declare('solver_strategy', default='newton',
+            values=['newton', 'gauss-seidel', 'krylov'])
+        self.options.declare('num_workers', default=1, types=int)
+        self.options.declare('pool_type', default='process', values=['process', 'thread'])
 
     def setup(self):
+        # Setting up again replaces the ODE component, so the workers of its pool are shut down
+        ode_comp = getattr(getattr(self, 'integration_group', None), 'ode_comp', None)
+        if isinstance(ode_comp, ParallelODEComp):
+            ode_comp.close()
+
         super(VectorizedIntegrator, self).setup()
 
         ode_function = self.options['ode_function']
         method = self.options['method']
         starting_coeffs = self.options['starting_coeffs']
         formulation = self.options['formulation']
+        solver_strategy = self.options['solver_strategy']
 
         has_starting_method = method.starting_method is not None
         is_starting_method = starting_coeffs is not None
@@ -42,9 +63,18 @@ class VectorizedIntegrator(Integrator):
 
         num_times = len(my_norm_times)
 
+        # With Newton, the step recurrence is solved within integration_group together with the
+        # stages, so the coupled system can be solved with a sparse direct solver, or with a
+        # Krylov solver and matrix-free stage and step components.
+        use_newton = formulation == 'solver-based' and solver_strategy in ['newton', 'krylov']
+        matrix_free = solver_strategy == 'krylov'
+
         # ------------------------------------------------------------------------------------
 
-        integration_group = Group(assembled_jac_type='dense')
+        if use_newton and not matrix_free:
+            integration_group = Group(assembled_jac_type='csc')
+        else:
+            integration_group = Group(assembled_jac_type='dense')
         self.add_subsystem('integration_group', integration_group)
 
         if formulation == 'optimizer-based':
@@ -63,7 +93,12 @@ class VectorizedIntegrator(Integrator):
                     units=state['units'])
             integration_group.add_subsystem('dummy_comp', comp)
 
-        comp = self._create_ode((num_times - 1) * num_stages)
+        if self.options['num_workers'] > 1:
+            comp = ParallelODEComp(ode_function=ode_function,
+                num_nodes=(num_times - 1) * num_stages,
+                num_workers=self.options['num_workers'], pool_type=self.options['pool_type'])
+        else:
+            comp = self._create_ode((num_times - 1) * num_stages)
         integration_group.add_subsystem('ode_comp', comp)
         if ode_function._time_options['targets']:
             self.connect(
@@ -74,8 +109,7 @@ class VectorizedIntegrator(Integrator):
             self._connect_multiple(
                 self._get_static_parameter_names('static_parameter_comp', 'out'),
                 self._get_static_parameter_names('integration_group.ode_comp', 'targets'),
-                [np.array([0] * self._get_stage_norm_times(), np.int)
-                 for _ in range(len(static_parameters))]
+                self._get_static_src_indices((num_times - 1) * num_stages),
             )
         if len(dynamic_parameters) > 0:
             self._connect_multiple(
@@ -83,27 +117,61 @@ class VectorizedIntegrator(Integrator):
                 self._get_dynamic_parameter_names('integration_group.ode_comp', 'targets'),
             )
 
-        comp = VectorizedStageStepComp(states=states, time_units=time_units,
-            num_times=num_times, num_stages=num_stages, num_step_vars=num_step_vars,
-            glm_A=glm_A, glm_U=glm_U, glm_B=glm_B, glm_V=glm_V,
-        )
-        integration_group.add_subsystem('vectorized_stagestep_comp', comp)
-        self.connect('time_comp.h_vec', 'integration_group.vectorized_stagestep_comp.h_vec')
+        if use_newton:
+            stage_comp_class = MatrixFreeVectorizedStageComp if matrix_free \
+                else VectorizedStageComp
+            step_comp_class = MatrixFreeVectorizedStepComp if matrix_free \
+                else VectorizedStepComp
 
-        comp = VectorizedStepComp(states=states, time_units=time_units,
-            num_times=num_times, num_stages=num_stages, num_step_vars=num_step_vars,
-            glm_B=glm_B, glm_V=glm_V,
-        )
-        self.add_subsystem('vectorized_step_comp', comp)
-        self.connect('time_comp.h_vec', 'vectorized_step_comp.h_vec')
-        self._connect_multiple(
-            self._get_state_names('starting_system', 'starting'),
-            self._get_state_names('integration_group.vectorized_stagestep_comp', 'y0'),
-        )
-        self._connect_multiple(
-            self._get_state_names('starting_system', 'starting'),
-            self._get_state_names('vectorized_step_comp', 'y0'),
-        )
+            comp = stage_comp_class(states=states, time_units=time_units,
+                num_times=num_times, num_stages=num_stages, num_step_vars=num_step_vars,
+                glm_A=glm_A, glm_U=glm_U,
+            )
+            integration_group.add_subsystem('vectorized_stage_comp', comp)
+            self.connect('time_comp.h_vec', 'integration_group.vectorized_stage_comp.h_vec')
+
+            comp = step_comp_class(states=states, time_units=time_units,
+                num_times=num_times, num_stages=num_stages, num_step_vars=num_step_vars,
+                glm_B=glm_B, glm_V=glm_V,
+            )
+            integration_group.add_subsystem('vectorized_step_comp', comp)
+            self.connect('time_comp.h_vec', 'integration_group.vectorized_step_comp.h_vec')
+            self._connect_multiple(
+                self._get_state_names('starting_system', 'starting'),
+                self._get_state_names('integration_group.vectorized_step_comp', 'y0'),
+            )
+            self._connect_multiple(
+                self._get_state_names('integration_group.vectorized_step_comp', 'y'),
+                self._get_state_names('integration_group.vectorized_stage_comp', 'y'),
+            )
+
+            stage_comp_name = 'integration_group.vectorized_stage_comp'
+            step_comp_name = 'integration_group.vectorized_step_comp'
+        else:
+            comp = VectorizedStageStepComp(states=states, time_units=time_units,
+                num_times=num_times, num_stages=num_stages, num_step_vars=num_step_vars,
+                glm_A=glm_A, glm_U=glm_U, glm_B=glm_B, glm_V=glm_V,
+            )
+            integration_group.add_subsystem('vectorized_stagestep_comp', comp)
+            self.connect('time_comp.h_vec', 'integration_group.vectorized_stagestep_comp.h_vec')
+
+            comp = VectorizedStepComp(states=states, time_units=time_units,
+                num_times=num_times, num_stages=num_stages, num_step_vars=num_step_vars,
+                glm_B=glm_B, glm_V=glm_V,
+            )
+            self.add_subsystem('vectorized_step_comp', comp)
+            self.connect('time_comp.h_vec', 'vectorized_step_comp.h_vec')
+            self._connect_multiple(
+                self._get_state_names('starting_system', 'starting'),
+                self._get_state_names('integration_group.vectorized_stagestep_comp', 'y0'),
+            )
+            self._connect_multiple(
+                self._get_state_names('starting_system', 'starting'),
+                self._get_state_names('vectorized_step_comp', 'y0'),
+            )
+
+            stage_comp_name = 'integration_group.vectorized_stagestep_comp'
+            step_comp_name = 'vectorized_step_comp'
 
         comp = VectorizedOutputComp(states=states,
             num_starting_times=len(starting_norm_times), num_my_times=len(my_norm_times),
@@ -139,30 +207,34 @@ class VectorizedIntegrator(Integrator):
         src_indices_to_ode = [np.array(idx).squeeze() for idx in src_indices_to_ode]
 
         self._connect_multiple(
-            self._get_state_names('vectorized_step_comp', 'y'),
+            self._get_state_names(step_comp_name, 'y'),
             self._get_state_names('output_comp', 'y'),
         )
 
         self._connect_multiple(
             self._get_state_names('integration_group.ode_comp', 'rate_source'),
-            self._get_state_names('vectorized_step_comp', 'F'),
+            self._get_state_names(step_comp_name, 'F'),
             src_indices_from_ode,
         )
         self._connect_multiple(
             self._get_state_names('integration_group.ode_comp', 'rate_source'),
-            self._get_state_names('integration_group.vectorized_stagestep_comp', 'F'),
+            self._get_state_names(stage_comp_name, 'F'),
             src_indices_from_ode,
         )
 
+        if self.options['dense_times'] is not None:
+            self._setup_dense_output(step_comp_name, 'integration_group.ode_comp', 'rate_source',
+                src_indices_from_ode)
+
         if formulation == 'solver-based':
             self._connect_multiple(
-                self._get_state_names('integration_group.vectorized_stagestep_comp', 'Y_out'),
+                self._get_state_names(stage_comp_name, 'Y_out'),
                 self._get_state_names('integration_group.ode_comp', 'targets'),
                 src_indices_to_ode,
             )
             self._connect_multiple(
                 self._get_state_names('integration_group.dummy_comp', 'Y'),
-                self._get_state_names('integration_group.vectorized_stagestep_comp', 'Y_in'),
+                self._get_state_names(stage_comp_name, 'Y_in'),
             )
         elif formulation == 'optimizer-based':
             self._connect_multiple(
@@ -172,23 +244,41 @@ class VectorizedIntegrator(Integrator):
             )
             self._connect_multiple(
                 self._get_state_names('integration_group.desvars_comp', 'Y'),
-                self._get_state_names('integration_group.vectorized_stagestep_comp', 'Y_in'),
+                self._get_state_names(stage_comp_name, 'Y_in'),
             )
+            # With vectorize_derivs, OpenMDAO allocates a derivative vector per constraint entry,
+            # so the memory grows with the square of the number of time steps.
+            num_constraints = (num_times - 1) * num_stages * sum(
+                np.prod(state['shape']) for state in states.values())
+            vectorize_derivs = num_constraints <= max_vectorized_constraints
+
             for state_name, state in iteritems(states):
                 integration_group.add_constraint('vectorized_stagestep_comp.Y_out:%s' % state_name,
-                    equals=0., vectorize_derivs=True,
+                    equals=0., vectorize_derivs=vectorize_derivs,
                 )
 
         if has_starting_method:
             self.starting_system.options['formulation'] = self.options['formulation']
+            self.starting_system.options['solver_strategy'] = self.options['solver_strategy']
+            self.starting_system.options['num_workers'] = self.options['num_workers']
+            self.starting_system.options['pool_type'] = self.options['pool_type']
 
         if formulation == 'solver-based':
-            if 1:
-                integration_group.nonlinear_solver = NonlinearBlockGS(iprint=2, maxiter=40, atol=1e-14, rtol=1e-12)
-            else:
-                integration_group.nonlinear_solver = NewtonSolver(iprint=2, maxiter=100)
-
-            if 1:
-                integration_group.linear_solver = LinearBlockGS(iprint=1, maxiter=40, atol=1e-14, rtol=1e-12)
-            else:
+            if solver_strategy == 'newton':
+                integration_group.nonlinear_solver = NewtonSolver(
+                    iprint=2, maxiter=100, atol=1e-14, rtol=1e-12)
                 integration_group.linear_solver = DirectSolver(assemble_jac=True, iprint=1)
+            elif solver_strategy == 'krylov':
+                # No Jacobian is assembled; one block Gauss--Seidel sweep, which solves the
+                # step recurrence exactly, preconditions GMRES.
+                integration_group.nonlinear_solver = NewtonSolver(
+                    iprint=2, maxiter=100, atol=1e-14, rtol=1e-12)
+                integration_group.linear_solver = ScipyKrylov(
+                    iprint=1, maxiter=200, atol=1e-14, rtol=1e-12)
+                integration_group.linear_solver.precon = LinearBlockGSPreconditioner(
+                    iprint=-1, maxiter=1)
+            elif solver_strategy == 'gauss-seidel':
+                integration_group.nonlinear_solver = NonlinearBlockGS(
+                    iprint=2, maxiter=40, atol=1e-14, rtol=1e-12)
+                integration_group.linear_solver = LinearBlockGS(
+                    iprint=1, maxiter=40, atol=1e-14, rtol=1e-12)
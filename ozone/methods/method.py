@@ -40,6 +40,9 @@ class GLMMethod(object):
         self.V = V
         self.starting_method = starting_method
 
+        # Error-weight rows for methods with an embedded error estimator, if any
+        self.error_weights = None
+
         lower = np.tril(A, -1)
         err = np.linalg.norm(lower - A)
         self.explicit = err < 1e-15
@@ -1,84 +1,130 @@
-from ozone.methods.runge_kutta.explicit_runge_kutta import \
-    ForwardEuler, ExplicitMidpoint, ExplicitMidpointST, HeunsMethod, RalstonsMethod, \
-    KuttaThirdOrder, KuttaThirdOrderST, RK4, RK4ST, RK6, RK6ST
-from ozone.methods.runge_kutta.implicit_runge_kutta import \
-    BackwardEuler, ImplicitMidpoint, TrapezoidalRule
-from ozone.methods.runge_kutta.gauss_legendre import GaussLegendre
-from ozone.methods.runge_kutta.lobatto import LobattoIIIA
-from ozone.methods.runge_kutta.radau import Radau
-from ozone.methods.linear_multistep.adams import AB, AM
-from ozone.methods.linear_multistep.adams_alt import ABalt, AMalt
-from ozone.methods.linear_multistep.bdf import BDF
-from ozone.methods.linear_multistep.predictor_corrector import AdamsPEC, AdamsPECE
+import importlib
+from threading import Lock
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 from ozone.utils.misc import _get_class
 
 
-method_classes = {
+_ERK = 'ozone.methods.runge_kutta.explicit_runge_kutta'
+_IRK = 'ozone.methods.runge_kutta.implicit_runge_kutta'
+_GL = 'ozone.methods.runge_kutta.gauss_legendre'
+_LOB = 'ozone.methods.runge_kutta.lobatto'
+_RAD = 'ozone.methods.runge_kutta.radau'
+_EMB = 'ozone.methods.runge_kutta.embedded_runge_kutta'
+_ADAMS = 'ozone.methods.linear_multistep.adams'
+_ADAMS_ALT = 'ozone.methods.linear_multistep.adams_alt'
+_BDF = 'ozone.methods.linear_multistep.bdf'
+_PC = 'ozone.methods.linear_multistep.predictor_corrector'
+
+
+# Module, class name, and constructor arguments of each method
+_method_specs = {
     # First-order methods
-    'ForwardEuler': ForwardEuler(),
-    'BackwardEuler': BackwardEuler(),
+    'ForwardEuler': (_ERK, 'ForwardEuler', ()),
+    'BackwardEuler': (_IRK, 'BackwardEuler', ()),
     # Runge--Kutta methods
-    'ExplicitMidpoint': ExplicitMidpoint(),
-    'ImplicitMidpoint': ImplicitMidpoint(),
-    'KuttaThirdOrder': KuttaThirdOrder(),
-    'RK4': RK4(),
-    'RK6': RK6(),
-    'RalstonsMethod': RalstonsMethod(),
-    'HeunsMethod': HeunsMethod(),
-    'GaussLegendre2': GaussLegendre(2),
-    'GaussLegendre4': GaussLegendre(4),
-    'GaussLegendre6': GaussLegendre(6),
-    'Lobatto2': LobattoIIIA(2),
-    'Lobatto4': LobattoIIIA(4),
-    'RadauI3': Radau('I', 3),
-    'RadauI5': Radau('I', 5),
-    'RadauII3': Radau('II', 3),
-    'RadauII5': Radau('II', 5),
-    'Trapezoidal': TrapezoidalRule(),
+    'ExplicitMidpoint': (_ERK, 'ExplicitMidpoint', ()),
+    'ImplicitMidpoint': (_IRK, 'ImplicitMidpoint', ()),
+    'KuttaThirdOrder': (_ERK, 'KuttaThirdOrder', ()),
+    'RK4': (_ERK, 'RK4', ()),
+    'RK6': (_ERK, 'RK6', ()),
+    'RalstonsMethod': (_ERK, 'RalstonsMethod', ()),
+    'HeunsMethod': (_ERK, 'HeunsMethod', ()),
+    'GaussLegendre2': (_GL, 'GaussLegendre', (2,)),
+    'GaussLegendre4': (_GL, 'GaussLegendre', (4,)),
+    'GaussLegendre6': (_GL, 'GaussLegendre', (6,)),
+    'Lobatto2': (_LOB, 'LobattoIIIA', (2,)),
+    'Lobatto4': (_LOB, 'LobattoIIIA', (4,)),
+    'RadauI3': (_RAD, 'Radau', ('I', 3)),
+    'RadauI5': (_RAD, 'Radau', ('I', 5)),
+    'RadauII3': (_RAD, 'Radau', ('II', 3)),
+    'RadauII5': (_RAD, 'Radau', ('II', 5)),
+    'Trapezoidal': (_IRK, 'TrapezoidalRule', ()),
+    # Embedded Runge--Kutta pairs
+    'BogackiShampine32': (_EMB, 'BogackiShampine', ()),
+    'CashKarp54': (_EMB, 'CashKarp', ()),
+    'DormandPrince54': (_EMB, 'DormandPrince', ()),
     # Adams--Bashforth family
-    'AB1': ForwardEuler(),
-    'AB2': AB(2),
-    'AB3': AB(3),
-    'AB4': AB(4),
-    'AB5': AB(5),
-    'ABalt2': ABalt(2),
-    'ABalt3': ABalt(3),
-    'ABalt4': ABalt(4),
-    'ABalt5': ABalt(5),
+    'AB1': (_ERK, 'ForwardEuler', ()),
+    'AB2': (_ADAMS, 'AB', (2,)),
+    'AB3': (_ADAMS, 'AB', (3,)),
+    'AB4': (_ADAMS, 'AB', (4,)),
+    'AB5': (_ADAMS, 'AB', (5,)),
+    'ABalt2': (_ADAMS_ALT, 'ABalt', (2,)),
+    'ABalt3': (_ADAMS_ALT, 'ABalt', (3,)),
+    'ABalt4': (_ADAMS_ALT, 'ABalt', (4,)),
+    'ABalt5': (_ADAMS_ALT, 'ABalt', (5,)),
     # Adams--Moulton family
-    'AM1': BackwardEuler(),
-    'AM2': AM(2),
-    'AM3': AM(3),
-    'AM4': AM(4),
-    'AM5': AM(5),
-    'AMalt3': AMalt(3),
-    'AMalt4': AMalt(4),
-    'AMalt5': AMalt(5),
+    'AM1': (_IRK, 'BackwardEuler', ()),
+    'AM2': (_ADAMS, 'AM', (2,)),
+    'AM3': (_ADAMS, 'AM', (3,)),
+    'AM4': (_ADAMS, 'AM', (4,)),
+    'AM5': (_ADAMS, 'AM', (5,)),
+    'AMalt3': (_ADAMS_ALT, 'AMalt', (3,)),
+    'AMalt4': (_ADAMS_ALT, 'AMalt', (4,)),
+    'AMalt5': (_ADAMS_ALT, 'AMalt', (5,)),
     # Predictor-corrector methods,
-    'AdamsPEC2': AdamsPEC(2),
-    'AdamsPEC3': AdamsPEC(3),
-    'AdamsPEC4': AdamsPEC(4),
-    'AdamsPEC5': AdamsPEC(5),
-    'AdamsPECE2': AdamsPECE(2),
-    'AdamsPECE3': AdamsPECE(3),
-    'AdamsPECE4': AdamsPECE(4),
-    'AdamsPECE5': AdamsPECE(5),
+    'AdamsPEC2': (_PC, 'AdamsPEC', (2,)),
+    'AdamsPEC3': (_PC, 'AdamsPEC', (3,)),
+    'AdamsPEC4': (_PC, 'AdamsPEC', (4,)),
+    'AdamsPEC5': (_PC, 'AdamsPEC', (5,)),
+    'AdamsPECE2': (_PC, 'AdamsPECE', (2,)),
+    'AdamsPECE3': (_PC, 'AdamsPECE', (3,)),
+    'AdamsPECE4': (_PC, 'AdamsPECE', (4,)),
+    'AdamsPECE5': (_PC, 'AdamsPECE', (5,)),
     # Backwards differentiation formula family
-    'BDF1': BackwardEuler(),
-    'BDF2': BDF(2),
-    'BDF3': BDF(3),
-    'BDF4': BDF(4),
-    'BDF5': BDF(5),
-    'BDF6': BDF(6),
+    'BDF1': (_IRK, 'BackwardEuler', ()),
+    'BDF2': (_BDF, 'BDF', (2,)),
+    'BDF3': (_BDF, 'BDF', (3,)),
+    'BDF4': (_BDF, 'BDF', (4,)),
+    'BDF5': (_BDF, 'BDF', (5,)),
+    'BDF6': (_BDF, 'BDF', (6,)),
     # Starting methods with derivatives
-    'ExplicitMidpointST': ExplicitMidpointST(),
-    'KuttaThirdOrderST': KuttaThirdOrderST(),
-    'RK4ST': RK4ST(),
-    'RK6ST': RK6ST(),
+    'ExplicitMidpointST': (_ERK, 'ExplicitMidpointST', ()),
+    'KuttaThirdOrderST': (_ERK, 'KuttaThirdOrderST', ()),
+    'RK4ST': (_ERK, 'RK4ST', ()),
+    'RK6ST': (_ERK, 'RK6ST', ()),
 }
 
 
+class LazyMethodDict(Mapping):
+    """
+    Read-only mapping from method names to methods that are built on first access.
+
+    Importing a method module and computing its coefficients is deferred until the method is
+    requested, and each method is then memoized, so importing ozone stays cheap for processes
+    that only use a few methods.
+    """
+
+    def __init__(self, specs):
+        self._specs = specs
+        self._methods = {}
+        self._lock = Lock()
+
+    def __getitem__(self, method_name):
+        method = self._methods.get(method_name)
+        if method is None:
+            module_name, class_name, args = self._specs[method_name]
+            module = importlib.import_module(module_name)
+            method = getattr(module, class_name)(*args)
+
+            with self._lock:
+                method = self._methods.setdefault(method_name, method)
+        return method
+
+    def __iter__(self):
+        return iter(self._specs)
+
+    def __len__(self):
+        return len(self._specs)
+
+
+method_classes = LazyMethodDict(_method_specs)
+
+
 family_names = [
     'ExplicitRungeKutta',
     'ImplicitRungeKutta',
@@ -108,6 +154,11 @@ method_families['ImplicitRungeKutta'] = [
     'ImplicitMidpoint',
     'Trapezoidal',
 ]
+method_families['EmbeddedRungeKutta'] = [
+    'BogackiShampine32',
+    'CashKarp54',
+    'DormandPrince54',
+]
 method_families['GaussLegendre'] = [
     'GaussLegendre2',
     'GaussLegendre4',
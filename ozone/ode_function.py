@@ -4,7 +4,12 @@ from collections import Iterable
 from six import iteritems, string_types
 import numpy as np
 
-from openmdao.utils.options_dictionary import OptionsDictionary
+
+def _get_options_dictionary():
+    # OpenMDAO is only imported once an ODE function is created, not with ozone.api
+    from openmdao.utils.options_dictionary import OptionsDictionary
+
+    return OptionsDictionary()
 
 
 class ODEFunction(object):
@@ -26,7 +31,7 @@ class ODEFunction(object):
         self._system_class = None
         self._system_init_kwargs = {}
 
-        time_options = OptionsDictionary()
+        time_options = _get_options_dictionary()
         time_options.declare('targets', default=[], types=Iterable)
         time_options.declare('units', default=None, types=string_types, allow_none=True)
 
@@ -34,6 +39,7 @@ class ODEFunction(object):
         self._states = {}
         self._static_parameters = {}
         self._dynamic_parameters = {}
+        self._events = {}
 
         self.initialize(**kwargs)
 
@@ -107,7 +113,7 @@ class ODEFunction(object):
         if name in self._states:
             raise ValueError('State {0} has already been declared.'.format(name))
 
-        options = OptionsDictionary()
+        options = _get_options_dictionary()
         options.declare('name', types=string_types)
         options.declare('rate_source', types=string_types)
         options.declare('targets', default=[], types=Iterable)
@@ -133,7 +139,8 @@ class ODEFunction(object):
 
         self._states[name] = options
 
-    def declare_parameter(self, name, targets, shape=None, units=None, dynamic=True):
+    def declare_parameter(self, name, targets, shape=None, units=None, dynamic=True,
+            interpolation='linear', interpolation_order=4, control_times=None):
         """
         Declare an input to the ODE.
 
@@ -153,9 +160,22 @@ class ODEFunction(object):
             otherwise, the parameter has the same value at all time steps (static parameter).
             A dynamic parameter should have shape (num_nodes, ...) where ... is
             defined by the shape argument.
+        interpolation : str
+            Scheme for interpolating a dynamic parameter from the time points to the stage times:
+            'linear', 'cubic' (cubic Hermite), 'bspline', or 'lagrange'.
+        interpolation_order : int
+            Order (degree + 1) of the 'bspline' and 'lagrange' interpolation.
+        control_times : int or ndarray or None
+            Control grid of a dynamic parameter, independent of the integration grid: either
+            the number of equally spaced control points or their normalized times, from 0 at
+            the initial time to 1 at the final time. The dynamic parameter then has shape
+            (num_control_points, ...) and is interpolated from the control points. If None,
+            the control points are the time points of the integration.
         """
         if dynamic:
-            self._declare_dynamic_parameter(name, targets, shape=shape, units=units)
+            self._declare_dynamic_parameter(name, targets, shape=shape, units=units,
+                interpolation=interpolation, interpolation_order=interpolation_order,
+                control_times=control_times)
         else:
             self._declare_static_parameter(name, targets, shape=shape, units=units)
 
@@ -178,7 +198,7 @@ class ODEFunction(object):
         if name in self._static_parameters:
             raise ValueError('static parameter {0} has already been declared.'.format(name))
 
-        options = OptionsDictionary()
+        options = _get_options_dictionary()
         options.declare('name', types=string_types)
         options.declare('targets', default=[], types=Iterable)
         options.declare('shape', default=(1,), types=tuple)
@@ -202,7 +222,8 @@ class ODEFunction(object):
 
         self._static_parameters[name] = options
 
-    def _declare_dynamic_parameter(self, name, targets, shape=None, units=None):
+    def _declare_dynamic_parameter(self, name, targets, shape=None, units=None,
+            interpolation='linear', interpolation_order=4, control_times=None):
         """
         Declare an input to the ODE.
 
@@ -217,15 +238,26 @@ class ODEFunction(object):
             Shape of the parameter.
         units : str or None
             Units of the parameter.
+        interpolation : str
+            Scheme for interpolating the parameter from the time points to the stage times.
+        interpolation_order : int
+            Order (degree + 1) of the 'bspline' and 'lagrange' interpolation.
+        control_times : int or ndarray or None
+            Number of equally spaced control points or their normalized times; if None, the
+            parameter is given at the time points of the integration.
         """
         if name in self._dynamic_parameters:
             raise ValueError('Dynamic parameter {0} has already been declared.'.format(name))
 
-        options = OptionsDictionary()
+        options = _get_options_dictionary()
         options.declare('name', types=string_types)
         options.declare('targets', default=[], types=Iterable)
         options.declare('shape', default=(1,), types=tuple)
         options.declare('units', default=None, types=string_types, allow_none=True)
+        options.declare('interpolation', default='linear',
+            values=['linear', 'cubic', 'bspline', 'lagrange'])
+        options.declare('interpolation_order', default=4, types=int)
+        options.declare('control_times', default=None, types=(int, np.ndarray), allow_none=True)
 
         options['name'] = name
         if isinstance(targets, string_types):
@@ -242,9 +274,49 @@ class ODEFunction(object):
             raise ValueError('shape must be of type int or Iterable or None')
         if units is not None:
             options['units'] = units
+        options['interpolation'] = interpolation
+        options['interpolation_order'] = interpolation_order
+        options['control_times'] = control_times
 
         self._dynamic_parameters[name] = options
 
+    def declare_event(self, name, expr_source, direction=0, terminal=False):
+        """
+        Declare an event, which occurs when a scalar output of the ODE crosses zero.
+
+        Events are located by the time-marching formulation, on the interpolant of the states
+        within each step, and the time of the first occurrence is output as event_time:<name>.
+
+        Parameters
+        ----------
+        name : str
+            The name of the event.
+        expr_source : str
+            The path to the variable within the ODE whose zero crossing defines the event.
+            It must have one value per node.
+        direction : int
+            1 if only crossings from negative to positive values count, -1 if only crossings
+            from positive to negative values count, and 0 if both count. Default is 0.
+        terminal : bool
+            If True, the time integration stops at the first occurrence of the event, and the
+            states at later times are held at their values at the event. Default is False.
+        """
+        if name in self._events:
+            raise ValueError('Event {0} has already been declared.'.format(name))
+
+        options = _get_options_dictionary()
+        options.declare('name', types=string_types)
+        options.declare('expr_source', types=string_types)
+        options.declare('direction', default=0, values=[-1, 0, 1])
+        options.declare('terminal', default=False, types=bool)
+
+        options['name'] = name
+        options['expr_source'] = expr_source
+        options['direction'] = direction
+        options['terminal'] = terminal
+
+        self._events[name] = options
+
     def get_test_parameters(self):
         """
         Optional method to provide default parameters; used for testing.
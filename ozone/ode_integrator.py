@@ -3,12 +3,13 @@ from six import iteritems
 
 from ozone.utils.misc import _get_class
 from ozone.methods_list import get_method
+from ozone.ensemble_ode_function import EnsembleODEFunction
 
 
 def ODEIntegrator(ode_function, formulation, method_name,
         initial_conditions=None, static_parameters=None, dynamic_parameters=None,
         initial_time=None, final_time=None, normalized_times=None, times=None,
-        **kwargs):
+        ensemble_size=None, dense_times=None, **kwargs):
     """
     Create and return an OpenMDAO group containing the ODE integrator.
 
@@ -19,7 +20,8 @@ def ODEIntegrator(ode_function, formulation, method_name,
     ode_function : ODEFunction
         The ODE function instance representing the 'f' in dy_dt = f(t, y, x).
     formulation : str
-        Formulation for solving the ODE: 'time-marching', 'solver-based', or 'optimizer-based'.
+        Formulation for solving the ODE: 'time-marching', 'solver-based', 'optimizer-based',
+        or 'parareal'.
     method_name : str
         The time integration method. The list of methods can be found in the documentation.
     initial_conditions : dict or None
@@ -29,7 +31,8 @@ def ODEIntegrator(ode_function, formulation, method_name,
         Optional dictionary of static parameter values keyed by parameter name.
         If not given here, it must be connected from outside the integrator group.
     dynamic_parameters : dict or None
-        Optional dictionary of static parameter values keyed by parameter name.
+        Optional dictionary of dynamic parameter values keyed by parameter name, at the times
+        or at the control points declared with control_times.
         If not given here, it must be connected from outside the integrator group.
     initial_time : float or None
         Only required if times is not given and not connected from outside the integrator group.
@@ -41,12 +44,105 @@ def ODEIntegrator(ode_function, formulation, method_name,
         Not necessary if times is provided.
     times : np.ndarray[:]
         Vector of times required if initial time, final time, and normalized_times are not given.
+    ensemble_size : int or None
+        If given, that many independent copies of the ODE are integrated at once, with a single
+        evaluation of the ODE system on all of their nodes. The initial conditions and static
+        parameters then have a leading ensemble axis, the dynamic parameters have an ensemble
+        axis after the time axis, and the states have shape (num_times, ensemble_size,) + shape.
+    dense_times : np.ndarray[:] or None
+        Optional vector of times, within the time interval, at which the states are also output
+        as dense_state:<name> of shape (len(dense_times),) + shape. They are interpolated from
+        the step vectors and the stage rates, without further evaluations of the ODE system.
+        These are times if times is given and normalized times otherwise. Not supported by the
+        'parareal' formulation; with 'time-marching', the time integration is always fused.
+        The events declared on the ODE function, which require the 'time-marching'
+        formulation, also fuse the time integration; their times are output as
+        event_time:<name>.
+    **kwargs
+        Additional options passed on to the integrator group, as follows.
+    fused : bool
+        With 'time-marching', performs the whole time integration within a single component
+        instead of one subsystem per stage and step. Default is False.
+    max_stored_steps : int or None
+        With the fused time integration or 'parareal', the number of step linearizations held
+        in memory at once during the derivative sweeps. Default is None, for all steps.
+    adaptive : bool
+        With 'time-marching' and an embedded Runge--Kutta pair, fuses the time integration and
+        covers each interval of the time grid with substeps chosen from the atol and rtol
+        tolerances. Default is False.
+    modified_newton : bool
+        With 'time-marching' and an implicit method, reuses the factorization of the Newton
+        matrix of the stage equations across iterations and steps, refactoring only when the
+        residual norm decreases by less than the factor max_contraction. Default is False.
+    stage_solver : str
+        With 'time-marching' and an implicit method, 'dense' (default), or 'kronecker', which
+        fuses the time integration and decouples the Newton systems of the stages by
+        diagonalizing the A matrix of the method, with the rate Jacobian at the start of each
+        step.
+    assembled_jac_type : str
+        With 'time-marching' and an implicit method, 'dense' (default), or 'csc', which
+        assembles the Jacobian of each step as a sparse matrix, factored by a sparse LU with
+        the permc_spec column ordering.
+    checkpoint_file : str or None
+        With 'time-marching', fuses the time integration and saves the state of the marching,
+        including the multistep history, to that npz file every checkpoint_interval steps
+        (default 100). The trajectory is written to files next to it as the steps complete.
+    restart : bool
+        Whether to resume a run with the same inputs, options, and ODE system from the last
+        step saved in checkpoint_file, with outputs identical to those of an uninterrupted
+        run. Default is False.
+    state_dir : str or None
+        With 'time-marching', fuses the time integration and streams the states to
+        memory-mapped npy files in that directory as the steps complete, instead of
+        outputting them; they are read back lazily with ozone.api.load_states. Only the states
+        at the final time are output, as final_state:<name>.
+    solver_strategy : str
+        With 'solver-based', 'newton' (default), which solves the coupled stage and step
+        equations with Newton and a sparse direct solver, 'gauss-seidel', which uses block
+        Gauss--Seidel iterations, or 'krylov', which uses Newton with a preconditioned GMRES
+        solver and matrix-free stage and step components, so that no Jacobian is assembled.
+    num_workers : int
+        With 'solver-based' and 'optimizer-based', splits the evaluation of the ODE system and
+        its partials over the nodes across a pool of that many workers. Default is 1.
+    pool_type : str
+        Type of the worker pools, 'process' (default) or 'thread'.
+    num_slices : int
+        With 'parareal', which requires a one-step method, the number of time slices that are
+        marched concurrently. They are coupled through the coarse_method (default 'RK4') with
+        coarse_steps steps per slice, until the slice start values change by less than
+        parareal_tol or max_iter iterations are reached. Default is 4.
 
     Returns
     -------
     Group
         The OpenMDAO Group instance representing the requested integrator.
     """
+    assert formulation == 'time-marching' or len(ode_function._events) == 0, \
+        'Events are only located by the time-marching formulation'
+
+    # OpenMDAO and the components are only imported once an integrator is created
+    from ozone.components.dynamic_parameter_comp import get_control_times
+
+    if ensemble_size is not None:
+        assert len(ode_function._events) == 0, 'Events are not supported for ensembles'
+
+        ode_function = EnsembleODEFunction(ode_function=ode_function, ensemble_size=ensemble_size)
+
+        # Values given with the ensemble axis flattened into the state or parameter axes
+        if initial_conditions is not None:
+            initial_conditions = dict(
+                (name, _reshape_ensemble_value(value, ode_function._states, name, ()))
+                for name, value in iteritems(initial_conditions))
+        if static_parameters is not None:
+            static_parameters = dict(
+                (name, _reshape_ensemble_value(value, ode_function._static_parameters, name, ()))
+                for name, value in iteritems(static_parameters))
+        if dynamic_parameters is not None:
+            dynamic_parameters = dict(
+                (name, _reshape_ensemble_value(value, ode_function._dynamic_parameters, name,
+                    np.shape(value)[:1]))
+                for name, value in iteritems(dynamic_parameters))
+
     method = get_method(method_name)
     explicit = method.explicit
     integrator_class = get_integrator(formulation, explicit)
@@ -71,6 +167,17 @@ def ODEIntegrator(ode_function, formulation, method_name,
         final_time = times[-1]
         normalized_times = (times - times[0]) / (times[-1] - times[0])
 
+        if dense_times is not None:
+            dense_times = (dense_times - times[0]) / (times[-1] - times[0])
+
+    if dense_times is not None:
+        assert isinstance(dense_times, np.ndarray) and len(dense_times.shape) == 1, \
+            'dense_times must be a 1-D array'
+
+        assert np.all(dense_times >= normalized_times[0]) \
+            and np.all(dense_times <= normalized_times[-1]), \
+            'dense_times must lie within the time interval'
+
     # ------------------------------------------------------------------------------------
     # Ensure that all initial_conditions are valid
     if initial_conditions is not None:
@@ -105,8 +212,6 @@ def ODEIntegrator(ode_function, formulation, method_name,
     # ------------------------------------------------------------------------------------
     # Ensure that all dynamic parameters are valid
     if dynamic_parameters is not None:
-        num_times = len(normalized_times)
-
         for parameter_name, value in iteritems(dynamic_parameters):
             assert parameter_name in ode_function._dynamic_parameters, \
                 'Dynamic parameter (%s) was not declared in ODEFunction' % parameter_name
@@ -114,9 +219,10 @@ def ODEIntegrator(ode_function, formulation, method_name,
             assert isinstance(value, np.ndarray), \
                 'Dynamic parameter %s must be an ndarray' % parameter_name
 
-            shape = ode_function._dynamic_parameters[parameter_name]['shape']
-            assert value.shape == (num_times,) + shape, \
-                'Dynamic parameter %s has the wrong shape' % state_name
+            parameter = ode_function._dynamic_parameters[parameter_name]
+            num_control_times = len(get_control_times(parameter, normalized_times))
+            assert value.shape == (num_control_times,) + parameter['shape'], \
+                'Dynamic parameter %s has the wrong shape' % parameter_name
 
     # ------------------------------------------------------------------------------------
 
@@ -127,20 +233,32 @@ def ODEIntegrator(ode_function, formulation, method_name,
         initial_conditions=initial_conditions,
         static_parameters=static_parameters, dynamic_parameters=dynamic_parameters,
         initial_time=initial_time, final_time=final_time, normalized_times=normalized_times,
-        all_norm_times=normalized_times,
+        all_norm_times=normalized_times, dense_times=dense_times,
         **kwargs)
 
     return integrator
 
 
+def _reshape_ensemble_value(value, variables, name, lead_shape):
+    if name not in variables:
+        return value
+
+    shape = lead_shape + variables[name]['shape']
+    if np.size(value) == np.prod(shape):
+        return np.reshape(value, shape)
+    return value
+
+
 def get_integrator(formulation, explicit):
     from ozone.integrators.explicit_tm_integrator import ExplicitTMIntegrator
     from ozone.integrators.implicit_tm_integrator import ImplicitTMIntegrator
     from ozone.integrators.vectorized_integrator import VectorizedIntegrator
+    from ozone.integrators.parareal_integrator import PararealIntegrator
 
     integrator_classes = {
         'optimizer-based': VectorizedIntegrator,
         'solver-based': VectorizedIntegrator,
         'time-marching': ExplicitTMIntegrator if explicit else ImplicitTMIntegrator,
+        'parareal': PararealIntegrator,
     }
     return _get_class(formulation, integrator_classes, 'Integrator')
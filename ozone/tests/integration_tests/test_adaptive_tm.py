@@ -0,0 +1,104 @@
+from __future__ import division
+import numpy as np
+import unittest
+from six import iteritems
+from itertools import product
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.two_d_orbit_func import TwoDOrbitFunction
+from ozone.tests.ode_function_library.three_d_orbit_func import ThreeDOrbitFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    @parameterized.expand(product(
+        ['BogackiShampine32', 'CashKarp54', 'DormandPrince54'],  # method
+        [1e-6, 1e-9],  # tolerance
+    ))
+    def test_accuracy(self, method_name, tol):
+        ode_function = TwoDOrbitFunction()
+        initial_conditions, t0, t1 = ode_function.get_test_parameters()
+
+        prob = Problem(ODEIntegrator(ode_function, 'time-marching', method_name,
+            times=np.linspace(t0, t1, 6), initial_conditions=initial_conditions,
+            adaptive=True, atol=tol, rtol=tol))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+
+        exact = ode_function.get_exact_solution(initial_conditions, t0, t1)
+        error = np.linalg.norm(prob['state:position'][-1] - exact['position'])
+        self.assertTrue(error < 1e3 * tol, 'Error when integrating with %s' % method_name)
+
+        substeps = prob.model.integration_comp.substeps
+        for substeps_i in substeps:
+            self.assertAlmostEqual(np.sum(substeps_i[:, 1]), 1., places=12)
+
+    def test_dynamic_parameters(self):
+        ode_function = ThreeDOrbitFunction()
+
+        num = 6
+        r_scal = 1e12
+        v_scal = 1e3
+        initial_conditions = {
+            'r': np.array([-140699693, -51614428, 980]) * 1e3 / r_scal,
+            'v': np.array([9.774596, -28.07828, 4.337725e-4]) * 1e3 / v_scal,
+            'm': 1000.,
+        }
+        dynamic_parameters = {
+            'd': np.random.rand(num, 1),
+            'a': np.random.rand(num, 1),
+            'b': np.random.rand(num, 1),
+        }
+
+        prob = Problem()
+        prob.model.add_subsystem('integrator', ODEIntegrator(ode_function, 'time-marching',
+            'DormandPrince54', times=np.linspace(0., 3.e6, num),
+            initial_conditions=initial_conditions, dynamic_parameters=dynamic_parameters,
+            adaptive=True, atol=1e-9, rtol=1e-9))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+            jac = prob.check_partials(compact_print=True)
+
+        # Finite differences also capture jumps in the number of accepted substeps,
+        # so only the consistency of the forward and reverse derivatives is checked here.
+        for partial_name, jac_partial in iteritems(jac['integrator.integration_comp']):
+            mag_fwd = jac_partial['magnitude'].forward
+            abs_fwd_rev = jac_partial['abs error'].forward_reverse
+
+            self.assertTrue(abs_fwd_rev < 1e-10 * max(mag_fwd, 1.))
+
+    def test_derivatives(self):
+        ode_function = TwoDOrbitFunction()
+        initial_conditions, t0, t1 = ode_function.get_test_parameters()
+
+        of = ['state:position']
+        wrt = ['initial_condition:velocity']
+
+        jacs = []
+        for num_times, kwargs in [
+                (6, dict(adaptive=True, atol=1e-10, rtol=1e-10)),
+                (401, dict(fused=True))]:
+            prob = Problem(ODEIntegrator(ode_function, 'time-marching', 'DormandPrince54',
+                times=np.linspace(t0, t1, num_times), initial_conditions=initial_conditions,
+                **kwargs))
+
+            with suppress_stdout_stderr():
+                prob.setup(check=False, mode='fwd')
+                prob.run_model()
+                jac = prob.compute_totals(of, wrt, return_format='dict')
+
+            jacs.append(jac[of[0]][wrt[0]].reshape((num_times, 2, 2))[-1])
+
+        diff = np.linalg.norm(jacs[0] - jacs[1]) / np.linalg.norm(jacs[1])
+        self.assertTrue(diff < 1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
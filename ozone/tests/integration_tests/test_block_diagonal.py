@@ -0,0 +1,51 @@
+import numpy as np
+import scipy.linalg
+import unittest
+from parameterized import parameterized
+
+from ozone.utils.block_diagonal import block_dot, block_lu_factor, block_lu_solve
+
+
+class Test(unittest.TestCase):
+
+    @parameterized.expand([
+        (2, 5, 0), (2, 5, 1),  # solved block by block
+        (7, 3, 0), (7, 3, 1),  # solved row by row for all blocks
+    ])
+    def test_solve(self, num_blocks, n, trans):
+        np.random.seed(0)
+        blocks = np.random.rand(num_blocks, n, n) + np.eye(n)
+        rhs = np.random.rand(num_blocks, n)
+
+        sol = block_lu_solve(block_lu_factor(blocks), rhs, trans=trans)
+
+        mtx = scipy.linalg.block_diag(*blocks)
+        if trans:
+            mtx = mtx.T
+        self.assertTrue(np.allclose(mtx.dot(sol.flatten()), rhs.flatten(), atol=1e-12))
+
+    def test_dot(self):
+        np.random.seed(0)
+        num_nodes, num_groups = 3, 4
+        blocks = np.random.rand(num_nodes, num_groups, 2, 3)
+
+        # Interleaved packed indices of the groups, as for the variables of an ensemble
+        row_groups = np.arange(8).reshape((2, 4)).T
+        col_groups = np.arange(12).reshape((3, 4)).T
+
+        vec = np.random.rand(num_nodes, 12)
+        adj = np.random.rand(num_nodes, 8)
+        prod = block_dot(blocks, vec, row_groups, col_groups)
+        prod_T = block_dot(blocks, adj, row_groups, col_groups, trans=True)
+
+        for i_node in range(num_nodes):
+            mtx = np.zeros((8, 12))
+            for i_group in range(num_groups):
+                mtx[np.ix_(row_groups[i_group], col_groups[i_group])] = blocks[i_node, i_group]
+
+            self.assertTrue(np.allclose(prod[i_node], mtx.dot(vec[i_node])))
+            self.assertTrue(np.allclose(prod_T[i_node], mtx.T.dot(adj[i_node])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import unittest
+from parameterized import parameterized
+
+from openmdao.api import Problem, AnalysisError
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.two_d_orbit_func import TwoDOrbitFunction
+from ozone.tests.ode_function_library.simple_homogeneous_func import \
+    SimpleHomogeneousODEFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.checkpoint_file = os.path.join(self.tmp_dir, 'orbit.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_ode(self, method_name, crash_step=None, velocity=1., **kwargs):
+        initial_conditions = {'position': np.array([1., 0.]),
+            'velocity': np.array([0., velocity])}
+
+        prob = Problem(ODEIntegrator(TwoDOrbitFunction(), 'time-marching', method_name,
+            times=np.linspace(0., 3., 31), initial_conditions=initial_conditions, **kwargs))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.final_setup()
+
+        # Count the marched intervals, and simulate a crash before the given one
+        comp = prob.model.integration_comp
+        march_interval = comp._march_interval
+        steps = []
+
+        def _march_interval(*args):
+            if len(steps) == crash_step:
+                raise AnalysisError('Simulated crash')
+            steps.append(None)
+            return march_interval(*args)
+
+        comp._march_interval = _march_interval
+
+        with suppress_stdout_stderr():
+            prob.run_model()
+            totals = prob.compute_totals(['state:position'], ['initial_condition:velocity'])
+
+        return prob['state:position'], totals['state:position', 'initial_condition:velocity'], \
+            len(steps)
+
+    @parameterized.expand([
+        ('RK4', {}),
+        ('AB3', {}),
+        ('DormandPrince54', {'adaptive': True, 'atol': 1e-8, 'rtol': 1e-8}),
+        ('RadauII5', {'modified_newton': True}),
+        ('GaussLegendre4', {'modified_newton': True, 'stage_solver': 'kronecker'}),
+        ('BDF3', {'max_stored_steps': 4}),
+    ])
+    def test_restart(self, method_name, kwargs):
+        y_ref, jac_ref, num_steps = self.run_ode(method_name, fused=True, **kwargs)
+
+        kwargs.update(checkpoint_file=self.checkpoint_file, checkpoint_interval=4)
+
+        with self.assertRaises(AnalysisError):
+            self.run_ode(method_name, crash_step=10, **kwargs)
+        self.assertTrue(os.path.exists(self.checkpoint_file))
+
+        # The checkpoint only holds the last step vector; the trajectory is in other files
+        with np.load(self.checkpoint_file) as checkpoint:
+            self.assertEqual(int(checkpoint['num_steps']), 8)
+            self.assertEqual(checkpoint['y'].ndim, 2)
+
+        # The run resumes after the last saved step, the 8th
+        y, jac, num_marched = self.run_ode(method_name, restart=True, **kwargs)
+
+        self.assertEqual(num_marched, num_steps - 8)
+        self.assertTrue(np.array_equal(y, y_ref))
+        self.assertTrue(np.allclose(jac, jac_ref, rtol=1e-8, atol=1e-10))
+
+        # A complete checkpoint skips the marching, and other inputs start it over
+        y, jac, num_marched = self.run_ode(method_name, restart=True, **kwargs)
+        self.assertEqual(num_marched, 0)
+        self.assertTrue(np.array_equal(y, y_ref))
+
+        y, jac, num_marched = self.run_ode(method_name, velocity=1.1, restart=True, **kwargs)
+        self.assertEqual(num_marched, num_steps)
+        self.assertFalse(np.allclose(y, y_ref))
+
+    def test_system_key(self):
+        def run_ode(a):
+            ode_function = SimpleHomogeneousODEFunction(system_init_kwargs={'a': a})
+            prob = Problem(ODEIntegrator(ode_function, 'time-marching', 'RK4',
+                times=np.linspace(0., 1., 11), initial_conditions={'y': 1.},
+                checkpoint_file=self.checkpoint_file, restart=True))
+
+            with suppress_stdout_stderr():
+                prob.setup(check=False)
+                prob.run_model()
+
+            return prob['state:y'][-1, 0]
+
+        # The checkpoint of another system is not restored
+        run_ode(1.)
+        self.assertTrue(np.isclose(run_ode(2.), np.exp(2.), rtol=1e-4))
+        self.assertTrue(np.isclose(run_ode(1.), np.exp(1.), rtol=1e-4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+from __future__ import division
+import numpy as np
+import unittest
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEFunction, ODEIntegrator
+from ozone.tests.ode_function_library.getting_started_oc_sys import GettingStartedOCSystem
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class ControlGridFunction(ODEFunction):
+
+    def initialize(self, control_times=None):
+        self.set_system(GettingStartedOCSystem)
+
+        self.declare_state('x', 'dx_dt', shape=1, targets=['x'])
+        self.declare_state('y', 'dy_dt', shape=1, targets=['y'])
+        self.declare_state('v', 'dv_dt', shape=1, targets=['v'])
+        self.declare_parameter('theta', 'theta', shape=1, control_times=control_times)
+
+
+class Test(unittest.TestCase):
+
+    def run_ode(self, control_times, theta, formulation, method_name):
+        prob = Problem(ODEIntegrator(ControlGridFunction(control_times=control_times),
+            formulation, method_name, times=np.linspace(0., 1., 41),
+            initial_conditions={'x': 0., 'y': 0., 'v': 0.},
+            dynamic_parameters={'theta': theta}))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+            totals = prob.compute_totals(['state:x'], ['dynamic_parameter:theta'])
+
+        return prob['state:x'], totals['state:x', 'dynamic_parameter:theta']
+
+    @parameterized.expand([
+        ('time-marching', 'RK4'),
+        ('solver-based', 'RK4'),
+        ('optimizer-based', 'BDF2'),
+    ])
+    def test_control_grid(self, formulation, method_name):
+        control_theta = np.random.rand(5, 1)
+
+        # The control points are every 10th time point, so linear interpolation from the control
+        # grid and from its linear interpolant on the time grid are equivalent.
+        theta = np.interp(np.linspace(0., 1., 41), np.linspace(0., 1., 5), control_theta[:, 0])
+
+        x_ref, jac_ref = self.run_ode(None, theta.reshape((41, 1)), formulation, method_name)
+        x, jac = self.run_ode(5, control_theta, formulation, method_name)
+
+        self.assertEqual(jac.shape, (41, 5))
+        self.assertTrue(np.allclose(x, x_ref, rtol=1e-10, atol=1e-12))
+
+        # The derivatives with respect to the control points, by the chain rule
+        mtx = np.zeros((41, 5))
+        for ind in range(5):
+            mtx[:, ind] = np.interp(np.linspace(0., 1., 41), np.linspace(0., 1., 5),
+                np.eye(5)[ind])
+        self.assertTrue(np.allclose(jac, jac_ref.dot(mtx), rtol=1e-8, atol=1e-10))
+
+    def test_wrong_shape(self):
+        with self.assertRaises(AssertionError):
+            ODEIntegrator(ControlGridFunction(control_times=np.linspace(0., 1., 5)),
+                'time-marching', 'RK4', times=np.linspace(0., 1., 41),
+                dynamic_parameters={'theta': np.zeros((41, 1))})
+
+
+if __name__ == '__main__':
+    unittest.main()
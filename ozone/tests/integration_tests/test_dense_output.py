@@ -0,0 +1,67 @@
+from __future__ import division
+import numpy as np
+import unittest
+from itertools import product
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.simple_nonlinear_func import SimpleNonlinearODEFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    def run_ode(self, formulation, method_name, times, dense_times, **kwargs):
+        prob = Problem(ODEIntegrator(SimpleNonlinearODEFunction(), formulation, method_name,
+            times=times, initial_conditions={'y': 1.}, dense_times=dense_times, **kwargs))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+
+        return prob
+
+    @parameterized.expand(product(
+        ['RK4', 'AB3', 'BDF2', 'GaussLegendre4'],
+        ['time-marching', 'solver-based'],
+    ))
+    def test_dense_output(self, method_name, formulation):
+        times = np.linspace(0., 1., 11)
+        dense_times = np.linspace(0., 1., 37)
+
+        prob = self.run_ode(formulation, method_name, times,
+            np.concatenate([times, dense_times]))
+        dense_state = prob['dense_state:y'][:, 0]
+
+        # The dense output matches the states on the time grid
+        np.testing.assert_allclose(dense_state[:len(times)], prob['state:y'][:, 0],
+            rtol=1e-12, atol=1e-12)
+
+        # Between the time points, the error is bounded by that of the interpolant or on the grid
+        exact = 2. / (2. - dense_times ** 2)
+        grid_error = np.max(np.abs(prob['state:y'][:, 0] - 2. / (2. - times ** 2)))
+        dense_error = np.max(np.abs(dense_state[len(times):] - exact))
+        self.assertLess(dense_error, max(2 * grid_error, 1e-3))
+
+    @parameterized.expand(product(
+        ['RK4', 'AB3'],
+        ['time-marching', 'solver-based'],
+    ))
+    def test_derivs(self, method_name, formulation):
+        times = np.linspace(0., 1., 6)
+        dense_times = np.array([0.05, 0.33, 0.5, 0.97])
+
+        prob = self.run_ode(formulation, method_name, times, dense_times)
+
+        with suppress_stdout_stderr():
+            totals = prob.check_totals(of=['dense_state:y'],
+                wrt=['initial_condition:y', 'initial_time', 'final_time'],
+                compact_print=True, form='central', step=1e-5)
+        for key, total in totals.items():
+            self.assertLess(total['rel error'][0], 1e-6, key)
+
+
+if __name__ == '__main__':
+    unittest.main()
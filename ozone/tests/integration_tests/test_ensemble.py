@@ -0,0 +1,166 @@
+from __future__ import division
+import numpy as np
+import unittest
+from six import iteritems
+from itertools import product
+from parameterized import parameterized
+
+from openmdao.api import Problem, ExplicitComponent
+
+from ozone.api import ODEIntegrator, ODEFunction
+from ozone.tests.ode_function_library.three_d_orbit_func import ThreeDOrbitFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        num = 6
+        ensemble_size = 3
+        r_scal = 1e12
+        v_scal = 1e3
+
+        np.random.seed(0)
+        self.initial_conditions = [{
+            'r': np.array([-140699693, -51614428, 980]) * 1e3 / r_scal * (1. + 0.1 * ind),
+            'v': np.array([9.774596, -28.07828, 4.337725e-4]) * 1e3 / v_scal,
+            'm': 1000. + 10. * ind,
+        } for ind in range(ensemble_size)]
+        self.dynamic_parameters = [{
+            'd': np.random.rand(num, 1),
+            'a': np.random.rand(num, 1),
+            'b': np.random.rand(num, 1),
+        } for ind in range(ensemble_size)]
+        self.times = np.linspace(0., 3.e6, num)
+        self.ensemble_size = ensemble_size
+
+    def run_ode(self, formulation, method_name, initial_conditions, dynamic_parameters,
+            **kwargs):
+        prob = Problem(ODEIntegrator(ThreeDOrbitFunction(), formulation, method_name,
+            times=self.times, initial_conditions=initial_conditions,
+            dynamic_parameters=dynamic_parameters, **kwargs))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+
+        return prob
+
+    # The Newton solver of unfused implicit time-marching stops at a tolerance relative to
+    # the norm over the whole ensemble, so only fused time-marching is compared exactly.
+    @parameterized.expand([
+        (False, 'RK4'), (False, 'AB3'),
+        (True, 'RK4'), (True, 'AB3'), (True, 'ImplicitMidpoint'), (True, 'GaussLegendre4'),
+    ])
+    def test_ensemble(self, fused, method_name):
+        ensemble_size = self.ensemble_size
+
+        # Initial conditions with a leading ensemble axis, dynamic parameters with an ensemble
+        # axis after the time axis
+        initial_conditions = dict(
+            (name, np.array([ic[name] for ic in self.initial_conditions]))
+            for name in ['r', 'v', 'm'])
+        dynamic_parameters = dict(
+            (name, np.stack([dp[name] for dp in self.dynamic_parameters], axis=1))
+            for name in ['d', 'a', 'b'])
+
+        prob = self.run_ode('time-marching', method_name, initial_conditions,
+            dynamic_parameters, ensemble_size=ensemble_size, fused=fused)
+
+        of = ['state:r', 'state:m']
+        wrt = ['dynamic_parameter:d', 'initial_condition:v']
+        with suppress_stdout_stderr():
+            jac = prob.compute_totals(of, wrt, return_format='dict')
+
+        for ind in range(ensemble_size):
+            prob_ref = self.run_ode('time-marching', method_name,
+                self.initial_conditions[ind], self.dynamic_parameters[ind], fused=fused)
+
+            for state_name in ['r', 'v', 'm']:
+                y_ref = prob_ref['state:%s' % state_name]
+                y = prob['state:%s' % state_name][:, ind]
+                diff = np.linalg.norm(y - y_ref) / np.linalg.norm(y_ref)
+                self.assertTrue(diff < 1e-12, 'Error when integrating with %s' % method_name)
+
+            with suppress_stdout_stderr():
+                jac_ref = prob_ref.compute_totals(of, wrt, return_format='dict')
+
+            for of_name, wrt_name in product(of, wrt):
+                jac_ref_block = jac_ref[of_name][wrt_name]
+
+                # Rows and columns of this member within the ensemble Jacobian
+                num_times = len(self.times)
+                of_size = prob_ref[of_name].size // num_times
+                wrt_size = jac_ref_block.shape[1]
+                if wrt_name.startswith('dynamic'):
+                    wrt_size //= num_times
+                    cols = np.arange(num_times * ensemble_size * wrt_size).reshape(
+                        (num_times, ensemble_size, wrt_size))[:, ind].flatten()
+                else:
+                    cols = np.arange(ensemble_size * wrt_size).reshape(
+                        (ensemble_size, wrt_size))[ind]
+                rows = np.arange(num_times * ensemble_size * of_size).reshape(
+                    (num_times, ensemble_size, of_size))[:, ind].flatten()
+
+                jac_block = jac[of_name][wrt_name][np.ix_(rows, cols)]
+                diff = np.linalg.norm(jac_block - jac_ref_block)
+                self.assertTrue(diff < 1e-10 * max(np.linalg.norm(jac_ref_block), 1.),
+                    'Error in derivatives with %s' % method_name)
+
+    @parameterized.expand([
+        ('time-marching', {}),
+        ('time-marching', {'fused': True}),
+        ('solver-based', {}),
+    ])
+    def test_static_parameters(self, formulation, kwargs):
+        y0 = np.linspace(0.5, 1.5, 4)
+        k = np.linspace(1., 2., 4)
+        times = np.linspace(0., 1., 21)
+
+        prob = Problem(ODEIntegrator(DecayODEFunction(), formulation, 'RK4',
+            times=times, initial_conditions={'y': y0}, static_parameters={'k': k},
+            ensemble_size=len(y0), **kwargs))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+
+        self.assertEqual(prob['state:y'].shape, (len(times), len(y0), 1))
+
+        y_exact = y0 * np.exp(-k)
+        diff = np.linalg.norm(prob['state:y'][-1, :, 0] - y_exact) / np.linalg.norm(y_exact)
+        self.assertTrue(diff < 1e-6)
+
+
+class DecaySystem(ExplicitComponent):
+
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+
+    def setup(self):
+        num = self.options['num_nodes']
+
+        self.add_input('y', shape=(num, 1))
+        self.add_input('k', shape=(num, 1))
+        self.add_output('dy_dt', shape=(num, 1))
+
+        self.declare_partials('dy_dt', 'y', rows=np.arange(num), cols=np.arange(num))
+        self.declare_partials('dy_dt', 'k', rows=np.arange(num), cols=np.arange(num))
+
+    def compute(self, inputs, outputs):
+        outputs['dy_dt'] = -inputs['k'] * inputs['y']
+
+    def compute_partials(self, inputs, partials):
+        partials['dy_dt', 'y'] = -inputs['k'][:, 0]
+        partials['dy_dt', 'k'] = -inputs['y'][:, 0]
+
+
+class DecayODEFunction(ODEFunction):
+
+    def initialize(self):
+        self.set_system(DecaySystem)
+        self.declare_state('y', 'dy_dt', targets='y')
+        self.declare_parameter('k', 'k', dynamic=False)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+from __future__ import division
+import numpy as np
+import unittest
+from six import iteritems
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.projectile_dynamics_func import ProjectileFunction
+from ozone.tests.ode_function_library.projectile_dynamics_sys import ProjectileSystem
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class ProjectileEventSystem(ProjectileSystem):
+
+    def setup(self):
+        super(ProjectileEventSystem, self).setup()
+
+        num = self.options['num_nodes']
+
+        self.add_input('y', shape=(num, 1))
+        self.add_output('altitude', shape=num)
+        self.add_output('vertical_speed', shape=num)
+
+        arange = np.arange(num)
+        self.declare_partials('altitude', 'y', val=1., rows=arange, cols=arange)
+        self.declare_partials('vertical_speed', 'vy', val=1., rows=arange, cols=arange)
+
+    def compute(self, inputs, outputs):
+        super(ProjectileEventSystem, self).compute(inputs, outputs)
+
+        outputs['altitude'] = inputs['y'][:, 0]
+        outputs['vertical_speed'] = inputs['vy'][:, 0]
+
+
+class ProjectileEventFunction(ProjectileFunction):
+
+    def initialize(self, terminal=True):
+        self.set_system(ProjectileEventSystem)
+
+        self.declare_state('x', 'dx_dt', shape=1)
+        self.declare_state('y', 'dy_dt', shape=1, targets=['y'])
+        self.declare_state('vx', 'dvx_dt', shape=1, targets=['vx'])
+        self.declare_state('vy', 'dvy_dt', shape=1, targets=['vy'])
+
+        self.declare_event('apex', 'vertical_speed', direction=-1)
+        self.declare_event('touchdown', 'altitude', direction=-1, terminal=terminal)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.times = np.linspace(0., 1., 11)
+        self.initial_conditions = {'x': 0., 'y': 0.5, 'vx': 1., 'vy': 2.}
+
+        g = 9.81
+        self.apex_time = 2. / g
+        self.touchdown_time = (2. + np.sqrt(2. ** 2 + 2 * g * 0.5)) / g
+
+    def run_ode(self, method_name, terminal=True, **kwargs):
+        prob = Problem(ODEIntegrator(ProjectileEventFunction(terminal=terminal),
+            'time-marching', method_name, times=self.times,
+            initial_conditions=self.initial_conditions, **kwargs))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+
+        return prob
+
+    # The trajectory is quadratic, so these methods and their interpolants are exact.
+    @parameterized.expand([
+        ('RK4', {}), ('GaussLegendre4', {}), ('BDF2', {}),
+        ('RK4', {'max_stored_steps': 2}),
+        ('DormandPrince54', {'adaptive': True, 'atol': 1e-10, 'rtol': 1e-10}),
+    ])
+    def test_event_times(self, method_name, kwargs):
+        prob = self.run_ode(method_name, **kwargs)
+
+        np.testing.assert_allclose(prob['event_time:apex'], self.apex_time, rtol=1e-12)
+        np.testing.assert_allclose(prob['event_time:touchdown'], self.touchdown_time,
+            rtol=1e-12)
+
+        # After touchdown, the states are held at their values at the event
+        after = self.times > self.touchdown_time
+        np.testing.assert_allclose(prob['state:y'][after], 0., atol=1e-12)
+        np.testing.assert_allclose(prob['state:x'][after], self.touchdown_time, rtol=1e-12)
+
+    def test_non_terminal(self):
+        prob = self.run_ode('RK4', terminal=False)
+
+        # The states are not held, and the event times are recorded
+        exact = ProjectileFunction().get_exact_solution(self.initial_conditions, 0., self.times)
+        np.testing.assert_allclose(prob['state:y'][:, 0], exact['y'], atol=1e-12)
+
+        event_log = prob.model.integration_comp.event_log
+        np.testing.assert_allclose(event_log['touchdown'], [self.touchdown_time], rtol=1e-12)
+        np.testing.assert_allclose(event_log['apex'], [self.apex_time], rtol=1e-12)
+
+    @parameterized.expand([
+        ('RK4', {}), ('ImplicitMidpoint', {}), ('ForwardEuler', {'max_stored_steps': 3}),
+        ('DormandPrince54', {'adaptive': True, 'atol': 1e-8, 'rtol': 1e-8}),
+    ])
+    def test_derivs(self, method_name, kwargs):
+        prob = self.run_ode(method_name, **kwargs)
+
+        with suppress_stdout_stderr():
+            totals = prob.check_totals(
+                of=['event_time:apex', 'event_time:touchdown', 'state:x', 'state:vy'],
+                wrt=['initial_condition:y', 'initial_condition:vy', 'final_time'],
+                compact_print=True, form='central', step=1e-6)
+        for key, total in iteritems(totals):
+            self.assertLess(total['abs error'][0], 1e-6, key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+from __future__ import division
+import numpy as np
+import unittest
+from six import iteritems
+from itertools import product
+from parameterized import parameterized
+
+from openmdao.api import Problem, IndepVarComp
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.simple_linear_func import SimpleLinearODEFunction
+from ozone.tests.ode_function_library.simple_nonlinear_func import SimpleNonlinearODEFunction
+from ozone.tests.ode_function_library.three_d_orbit_func import ThreeDOrbitFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    def run_ode(self, method_name, ode_function, fused, mode='fwd', max_stored_steps=None):
+        times = np.linspace(0., 1.e-2, 7)
+        y0 = -1.
+
+        prob = Problem()
+        prob.model.add_subsystem('inputs_comp', IndepVarComp('y0', y0))
+
+        integrator = ODEIntegrator(ode_function, 'time-marching', method_name,
+            times=times, fused=fused, max_stored_steps=max_stored_steps)
+        prob.model.add_subsystem('integrator', integrator)
+        prob.model.connect('inputs_comp.y0', 'integrator.initial_condition:y')
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False, mode=mode)
+            prob.run_model()
+
+        return prob
+
+    @parameterized.expand(product(
+        [
+            'ForwardEuler', 'ExplicitMidpoint', 'RK4',
+            'BackwardEuler', 'ImplicitMidpoint', 'GaussLegendre4',
+            'AB2', 'AB4', 'AM3', 'BDF3',
+            'AdamsPEC2', 'AdamsPECE2',
+        ],  # method
+        [SimpleLinearODEFunction(), SimpleNonlinearODEFunction()],  # ODE Function
+        ['fwd', 'rev'],
+        [None, 2],  # max_stored_steps
+    ))
+    def test_fused(self, method_name, ode_function, mode, max_stored_steps):
+        prob_ref = self.run_ode(method_name, ode_function, False, mode)
+        prob = self.run_ode(method_name, ode_function, True, mode, max_stored_steps)
+
+        y_ref = prob_ref['integrator.state:y']
+        y = prob['integrator.state:y']
+        diff = np.linalg.norm(y - y_ref) / np.linalg.norm(y_ref)
+        self.assertTrue(diff < 1e-12, 'Error when integrating with %s' % method_name)
+
+        of = ['integrator.state:y']
+        wrt = ['inputs_comp.y0']
+        jac_ref = prob_ref.compute_totals(of, wrt, return_format='dict')
+        jac = prob.compute_totals(of, wrt, return_format='dict')
+        diff = np.linalg.norm(jac[of[0]][wrt[0]] - jac_ref[of[0]][wrt[0]])
+        self.assertTrue(diff < 1e-12, 'Error in derivatives with %s' % method_name)
+
+    def test_dynamic_parameters(self):
+        ode_function = ThreeDOrbitFunction()
+
+        num = 8
+        r_scal = 1e12
+        v_scal = 1e3
+        initial_conditions = {
+            'r': np.array([-140699693, -51614428, 980]) * 1e3 / r_scal,
+            'v': np.array([9.774596, -28.07828, 4.337725e-4]) * 1e3 / v_scal,
+            'm': 1000.,
+        }
+        dynamic_parameters = {
+            'd': np.random.rand(num, 1),
+            'a': np.random.rand(num, 1),
+            'b': np.random.rand(num, 1),
+        }
+
+        prob = Problem()
+        prob.model.add_subsystem('integrator', ODEIntegrator(ode_function, 'time-marching', 'RK4',
+            times=np.linspace(0., 3.e6, num), initial_conditions=initial_conditions,
+            dynamic_parameters=dynamic_parameters, fused=True))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+            jac = prob.check_partials(compact_print=True)
+
+        for partial_name, jac_partial in iteritems(jac['integrator.integration_comp']):
+            mag_fd = jac_partial['magnitude'].fd
+            mag_fwd = jac_partial['magnitude'].forward
+            mag_rev = jac_partial['magnitude'].reverse
+
+            abs_fwd = jac_partial['abs error'].forward
+            abs_rev = jac_partial['abs error'].reverse
+
+            rel_fwd = jac_partial['rel error'].forward
+            rel_rev = jac_partial['rel error'].reverse
+
+            non_zero = np.max([mag_fd, mag_fwd, mag_rev]) > 1e-12
+            if non_zero:
+                self.assertTrue(rel_fwd < 1e-3 or abs_fwd < 1e-3)
+                self.assertTrue(rel_rev < 1e-3 or abs_rev < 1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
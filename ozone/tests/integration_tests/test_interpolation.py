@@ -0,0 +1,90 @@
+from __future__ import division
+import numpy as np
+from six import iteritems
+import unittest
+from parameterized import parameterized
+import scipy.sparse
+
+from openmdao.api import Problem
+
+from ozone.components.dynamic_parameter_comp import DynamicParameterComp
+from ozone.utils.sparse_interpolation import get_sparse_interpolation
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+from ozone.utils.var_names import get_name
+
+
+def get_error(interpolation, num_in, order=4):
+    in_vec = np.linspace(0., 1., num_in) ** 1.5
+    out_vec = np.linspace(0., 1., 7 * num_in)
+
+    data, rows, cols = get_sparse_interpolation(interpolation, in_vec, out_vec, order)
+    mtx = scipy.sparse.csr_matrix((data, (rows, cols)), shape=(len(out_vec), num_in))
+
+    return np.max(np.abs(mtx.dot(np.sin(3 * in_vec)) - np.sin(3 * out_vec)))
+
+
+class Test(unittest.TestCase):
+
+    @parameterized.expand([
+        ('linear', 2),
+        ('cubic', 3),
+        ('bspline', 4),
+        ('lagrange', 4),
+    ])
+    def test_order(self, interpolation, order):
+        error1 = get_error(interpolation, 41)
+        error2 = get_error(interpolation, 81)
+
+        self.assertTrue(np.log2(error1 / error2) > order - 0.2)
+
+    def test_chebyshev(self):
+        num_in = 20
+        in_vec = 0.5 - 0.5 * np.cos(np.pi * np.arange(num_in) / (num_in - 1))
+        out_vec = np.linspace(0., 1., 101)
+
+        data, rows, cols = get_sparse_interpolation('lagrange', in_vec, out_vec, num_in)
+        mtx = scipy.sparse.csr_matrix((data, (rows, cols)), shape=(len(out_vec), num_in))
+
+        error = np.max(np.abs(mtx.dot(np.sin(3 * in_vec)) - np.sin(3 * out_vec)))
+        self.assertTrue(error < 1e-12)
+
+    def test_dynamic_parameter_comp(self):
+        dynamic_parameters = {
+            'p1': {'shape': (1,), 'units': None, 'interpolation': 'linear',
+                'interpolation_order': 4, 'control_times': None},
+            'p2': {'shape': (2, 3), 'units': None, 'interpolation': 'cubic',
+                'interpolation_order': 4, 'control_times': None},
+            'p3': {'shape': (2,), 'units': None, 'interpolation': 'bspline',
+                'interpolation_order': 3, 'control_times': None},
+            'p4': {'shape': (1,), 'units': None, 'interpolation': 'lagrange',
+                'interpolation_order': 5, 'control_times': None},
+        }
+        normalized_times = np.linspace(0., 1., 9) ** 1.5
+        stage_norm_times = np.linspace(0., 1., 25)
+
+        prob = Problem(DynamicParameterComp(dynamic_parameters=dynamic_parameters,
+            normalized_times=normalized_times, stage_norm_times=stage_norm_times))
+        prob.setup(check=False)
+
+        for name in dynamic_parameters:
+            prob[get_name('in', name)] = np.random.rand(*prob[get_name('in', name)].shape)
+        prob.run_model()
+
+        for name, parameter in iteritems(dynamic_parameters):
+            data, rows, cols = get_sparse_interpolation(parameter['interpolation'],
+                normalized_times, stage_norm_times, parameter['interpolation_order'])
+            mtx = scipy.sparse.csr_matrix((data, (rows, cols)), shape=(25, 9))
+
+            value = prob[get_name('in', name)].reshape((9, -1))
+            self.assertTrue(np.allclose(
+                prob[get_name('out', name)].reshape((25, -1)), mtx.dot(value)))
+
+        with suppress_stdout_stderr():
+            jac = prob.check_partials(compact_print=True)
+        for partial_name, jac_partial in iteritems(jac['']):
+            self.assertTrue(jac_partial['abs error'].forward < 1e-6)
+            self.assertTrue(jac_partial['abs error'].reverse < 1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import numpy as np
+import scipy.linalg
+import unittest
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.methods_list import get_method
+from ozone.tests.ode_function_library.two_d_orbit_func import TwoDOrbitFunction
+from ozone.utils.kronecker_solver import KroneckerStageSolver
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    @parameterized.expand([
+        ('RadauII5',), ('GaussLegendre6',), ('Lobatto4',), ('Trapezoidal',), ('BDF3',),
+    ])
+    def test_solve(self, method_name):
+        glm_A = get_method(method_name).A
+        num_stages = glm_A.shape[0]
+
+        jac = np.random.rand(5, 5) - 0.5
+        rhs = np.random.rand(num_stages, 5)
+
+        solver = KroneckerStageSolver(glm_A)
+        self.assertTrue(solver.diagonalizable)
+
+        sol = solver.solve(solver.factor(0.3, jac), rhs)
+        mtx = np.eye(num_stages * 5) - 0.3 * np.kron(glm_A, jac)
+        self.assertTrue(np.allclose(mtx.dot(sol.flatten()), rhs.flatten(), atol=1e-12))
+
+        # A block diagonal Jacobian, given by its blocks
+        blocks = np.random.rand(3, 2, 2) - 0.5
+        rhs = np.random.rand(num_stages, 3, 2)
+
+        sol = solver.solve(solver.factor(0.3, blocks), rhs)
+        mtx = np.eye(num_stages * 6) - 0.3 * np.kron(glm_A, scipy.linalg.block_diag(*blocks))
+        self.assertTrue(np.allclose(mtx.dot(sol.flatten()), rhs.flatten(), atol=1e-12))
+
+    def run_ode(self, method_name, stage_solver, modified_newton):
+        initial_conditions = {'position': np.array([1., 0.]), 'velocity': np.array([0., 1.])}
+
+        prob = Problem(ODEIntegrator(TwoDOrbitFunction(), 'time-marching', method_name,
+            times=np.linspace(0., 3., 31), initial_conditions=initial_conditions,
+            stage_solver=stage_solver, modified_newton=modified_newton))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+            totals = prob.compute_totals(['state:position'], ['initial_condition:velocity'])
+
+        return prob['state:position'], totals['state:position', 'initial_condition:velocity']
+
+    @parameterized.expand([
+        ('RadauII5', False),
+        ('GaussLegendre4', False),
+        ('RadauII5', True),
+    ])
+    def test_integration(self, method_name, modified_newton):
+        y_ref, jac_ref = self.run_ode(method_name, 'dense', False)
+        y, jac = self.run_ode(method_name, 'kronecker', modified_newton)
+
+        self.assertTrue(np.allclose(y, y_ref, rtol=1e-8, atol=1e-8))
+        self.assertTrue(np.allclose(jac, jac_ref, rtol=1e-6, atol=1e-6))
+
+
+if __name__ == '__main__':
+    unittest.main()
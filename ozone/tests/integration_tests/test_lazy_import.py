@@ -0,0 +1,36 @@
+import subprocess
+import sys
+import unittest
+
+from ozone.methods_list import LazyMethodDict, get_method, method_classes
+
+
+class Test(unittest.TestCase):
+
+    def test_import(self):
+        source = 'import sys, ozone.api; print(" ".join(sorted(sys.modules)))'
+        output = subprocess.check_output([sys.executable, '-c', source])
+        modules = output.decode().split()
+
+        self.assertEqual([name for name in modules if name.split('.')[0] == 'openmdao'], [])
+        self.assertNotIn('scipy.sparse.linalg', modules)
+        self.assertNotIn('ozone.methods.method', modules)
+
+    def test_memoization(self):
+        methods = LazyMethodDict({'RK4': ('ozone.methods.runge_kutta.explicit_runge_kutta',
+            'RK4', ())})
+        self.assertEqual(len(methods._methods), 0)
+
+        method = methods['RK4']
+        self.assertTrue(methods['RK4'] is method)
+        self.assertEqual(list(methods), ['RK4'])
+
+        self.assertTrue(get_method('GaussLegendre4') is method_classes['GaussLegendre4'])
+        self.assertEqual(get_method('GaussLegendre4').num_stages, 2)
+
+        with self.assertRaises(ValueError):
+            get_method('RK5')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import numpy as np
+import unittest
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.two_d_orbit_func import TwoDOrbitFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    def run_ode(self, method_name, fused, modified_newton):
+        initial_conditions = {'position': np.array([1., 0.]), 'velocity': np.array([0., 1.])}
+
+        prob = Problem(ODEIntegrator(TwoDOrbitFunction(), 'time-marching', method_name,
+            times=np.linspace(0., 3., 31), initial_conditions=initial_conditions,
+            fused=fused, modified_newton=modified_newton))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+            totals = prob.compute_totals(['state:position'], ['initial_condition:velocity'])
+
+        if fused:
+            num_factorizations = prob.model.integration_comp.num_factorizations
+        else:
+            num_factorizations = sum(
+                group.nonlinear_solver.num_factorizations if modified_newton else 0
+                for group in prob.model.integration_group._subsystems_allprocs)
+
+        return (prob['state:position'], totals['state:position', 'initial_condition:velocity'],
+            num_factorizations)
+
+    @parameterized.expand([
+        ('RadauII5', False),
+        ('BDF2', False),
+        ('RadauII5', True),
+        ('BDF2', True),
+    ])
+    def test_modified_newton(self, method_name, fused):
+        y_ref, jac_ref, num_ref = self.run_ode(method_name, fused, False)
+        y, jac, num_factorizations = self.run_ode(method_name, fused, True)
+
+        self.assertTrue(np.allclose(y, y_ref, rtol=1e-8, atol=1e-8))
+        self.assertTrue(np.allclose(jac, jac_ref, rtol=1e-6, atol=1e-6))
+
+        # Far fewer factorizations than steps
+        self.assertTrue(num_factorizations < 10)
+        if fused:
+            self.assertTrue(num_ref >= 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
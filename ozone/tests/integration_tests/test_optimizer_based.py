@@ -0,0 +1,41 @@
+import numpy as np
+import unittest
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.three_d_orbit_func import ThreeDOrbitFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    @parameterized.expand([
+        (11, True),
+        # 28,000 stage constraints, whose vectorized derivatives would not fit in memory
+        (1001, False),
+    ])
+    def test_long_horizon(self, num_times, vectorize_derivs):
+        ode_function = ThreeDOrbitFunction()
+        initial_conditions, t0, t1 = ode_function.get_test_parameters()
+
+        prob = Problem(ODEIntegrator(ode_function, 'optimizer-based', 'RK4',
+            times=np.linspace(t0, t1, num_times), initial_conditions=initial_conditions))
+
+        name = 'integration_group.vectorized_stagestep_comp.Y_out:r'
+        with suppress_stdout_stderr():
+            prob.setup(check=False, mode='fwd')
+            prob.run_model()
+            jac = prob.compute_totals([name], ['initial_condition:r'])[
+                name, 'initial_condition:r']
+
+        constraints = prob.model.integration_group.get_constraints()
+        self.assertEqual(constraints[name]['vectorize_derivs'], vectorize_derivs)
+
+        # With the stage rates fixed by the design variables, each stage value moves with y0
+        self.assertTrue(np.allclose(jac, np.tile(np.eye(3), ((num_times - 1) * 4, 1))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+from __future__ import division
+import gc
+import numpy as np
+import unittest
+from six import iteritems
+from itertools import product
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.components.parallel_ode_comp import ParallelODEComp
+from ozone.tests.ode_function_library.simple_nonlinear_func import SimpleNonlinearODEFunction
+from ozone.tests.ode_function_library.three_d_orbit_func import ThreeDOrbitFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+from ozone.utils.misc import _Finalizer
+
+
+class Test(unittest.TestCase):
+
+    def run_ode(self, formulation, method_name, **kwargs):
+        ode_function = ThreeDOrbitFunction()
+
+        num = 6
+        r_scal = 1e12
+        v_scal = 1e3
+        initial_conditions = {
+            'r': np.array([-140699693, -51614428, 980]) * 1e3 / r_scal,
+            'v': np.array([9.774596, -28.07828, 4.337725e-4]) * 1e3 / v_scal,
+            'm': 1000.,
+        }
+        np.random.seed(0)
+        dynamic_parameters = {
+            'd': np.random.rand(num, 1),
+            'a': np.random.rand(num, 1),
+            'b': np.random.rand(num, 1),
+        }
+
+        prob = Problem(ODEIntegrator(ode_function, formulation, method_name,
+            times=np.linspace(0., 3.e6, num), initial_conditions=initial_conditions,
+            dynamic_parameters=dynamic_parameters, **kwargs))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+
+        return prob
+
+    @parameterized.expand(product(
+        ['RK4', 'AB3'],  # method
+        ['thread', 'process'],  # pool_type
+    ))
+    def test_parallel(self, method_name, pool_type):
+        prob_ref = self.run_ode('solver-based', method_name)
+        prob = self.run_ode('solver-based', method_name, num_workers=3, pool_type=pool_type)
+
+        for state_name in ['r', 'v', 'm']:
+            y_ref = prob_ref['state:%s' % state_name]
+            y = prob['state:%s' % state_name]
+            diff = np.linalg.norm(y - y_ref) / np.linalg.norm(y_ref)
+            self.assertTrue(diff < 1e-10, 'Error when integrating with %s' % method_name)
+
+        of = ['state:r', 'state:m']
+        wrt = ['dynamic_parameter:d', 'initial_condition:v']
+        with suppress_stdout_stderr():
+            jac_ref = prob_ref.compute_totals(of, wrt, return_format='dict')
+            jac = prob.compute_totals(of, wrt, return_format='dict')
+        for of_name, wrt_name in product(of, wrt):
+            diff = np.linalg.norm(jac[of_name][wrt_name] - jac_ref[of_name][wrt_name])
+            self.assertTrue(diff < 1e-10 * max(np.linalg.norm(jac_ref[of_name][wrt_name]), 1.),
+                'Error in derivatives with %s' % method_name)
+
+    def test_partials(self):
+        prob = Problem(ParallelODEComp(ode_function=SimpleNonlinearODEFunction(),
+            num_nodes=10, num_workers=3, pool_type='thread'))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob['y'] = np.random.rand(10, 1)
+            prob['t'] = np.random.rand(10)
+            prob.run_model()
+            jac = prob.check_partials(compact_print=True)
+
+        for partial_name, jac_partial in iteritems(jac['']):
+            self.assertTrue(jac_partial['rel error'].forward < 1e-5)
+            self.assertTrue(jac_partial['rel error'].reverse < 1e-5)
+
+    def test_pool_shutdown(self):
+        prob = Problem(ParallelODEComp(ode_function=SimpleNonlinearODEFunction(),
+            num_nodes=10, num_workers=3, pool_type='process'))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+            workers = list(prob.model.pool._pool)
+
+            # Setting up again shuts down the workers of the previous setup
+            prob.setup(check=False)
+            prob.run_model()
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+
+        workers = list(prob.model.pool._pool)
+        prob.model.close()
+        self.assertIsNone(prob.model.pool)
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+
+        # Setting up an integrator again replaces its ODE component
+        prob = self.run_ode('solver-based', 'RK4', num_workers=3, pool_type='process')
+        workers = list(prob.model.integration_group.ode_comp.pool._pool)
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+        prob.model.integration_group.ode_comp.close()
+
+    def test_finalizer_fallback(self):
+        # The finalizer used on Python 2, which has no weakref.finalize
+        class Owner(object):
+            pass
+
+        calls = []
+        owner = Owner()
+        finalizer = _Finalizer(owner, calls.append, ('pool',))
+        del owner
+        gc.collect()
+        self.assertEqual(calls, ['pool'])
+
+        finalizer()
+        self.assertEqual(calls, ['pool'])
+
+
+if __name__ == '__main__':
+    unittest.main()
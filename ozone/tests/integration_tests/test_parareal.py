@@ -0,0 +1,109 @@
+from __future__ import division
+import numpy as np
+import unittest
+from itertools import product
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.three_d_orbit_func import ThreeDOrbitFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    def run_ode(self, formulation, method_name, **kwargs):
+        ode_function = ThreeDOrbitFunction()
+
+        num = 11
+        r_scal = 1e12
+        v_scal = 1e3
+        initial_conditions = {
+            'r': np.array([-140699693, -51614428, 980]) * 1e3 / r_scal,
+            'v': np.array([9.774596, -28.07828, 4.337725e-4]) * 1e3 / v_scal,
+            'm': 1000.,
+        }
+        np.random.seed(0)
+        dynamic_parameters = {
+            'd': np.random.rand(num, 1),
+            'a': np.random.rand(num, 1),
+            'b': np.random.rand(num, 1),
+        }
+
+        prob = Problem(ODEIntegrator(ode_function, formulation, method_name,
+            times=np.linspace(0., 3.e6, num), initial_conditions=initial_conditions,
+            dynamic_parameters=dynamic_parameters, **kwargs))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+
+        return prob
+
+    @parameterized.expand(product(
+        ['RK4', 'ImplicitMidpoint'],  # method
+        ['thread', 'process'],  # pool_type
+    ))
+    def test_parareal(self, method_name, pool_type):
+        prob_ref = self.run_ode('time-marching', method_name, fused=True)
+        prob = self.run_ode('parareal', method_name, num_slices=3, pool_type=pool_type,
+            coarse_method='ForwardEuler', coarse_steps=2)
+
+        for state_name in ['r', 'v', 'm']:
+            y_ref = prob_ref['state:%s' % state_name]
+            y = prob['state:%s' % state_name]
+            diff = np.linalg.norm(y - y_ref) / np.linalg.norm(y_ref)
+            self.assertTrue(diff < 1e-9, 'Error when integrating with %s' % method_name)
+
+        of = ['state:r', 'state:m']
+        wrt = ['dynamic_parameter:d', 'initial_condition:v']
+        with suppress_stdout_stderr():
+            jac_ref = prob_ref.compute_totals(of, wrt, return_format='dict')
+            jac_fwd = prob.compute_totals(of, wrt, return_format='dict')
+            prob.model._mode = 'rev'
+            jac_rev = prob.compute_totals(of, wrt, return_format='dict')
+        for jac in [jac_fwd, jac_rev]:
+            for of_name, wrt_name in product(of, wrt):
+                diff = np.linalg.norm(jac[of_name][wrt_name] - jac_ref[of_name][wrt_name])
+                self.assertTrue(
+                    diff < 1e-8 * max(np.linalg.norm(jac_ref[of_name][wrt_name]), 1.),
+                    'Error in derivatives with %s' % method_name)
+
+    def test_iterations(self):
+        prob = self.run_ode('parareal', 'RK4', num_slices=5, pool_type='thread')
+        comp = prob.model.integration_comp
+
+        # The fine solution is reached once every slice has started from an exact value
+        self.assertTrue(comp.num_iterations <= 5)
+
+        prob = self.run_ode('parareal', 'RK4', num_slices=5, pool_type='thread',
+            max_iter=1)
+        self.assertEqual(prob.model.integration_comp.num_iterations, 1)
+
+    def test_worker_shutdown(self):
+        prob = self.run_ode('parareal', 'RK4', num_slices=3, pool_type='process')
+        processes = [slice_.process for slice_ in prob.model.integration_comp.slices]
+
+        # Setting up again shuts down the workers of the previous setup
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+        self.assertFalse(any(process.is_alive() for process in processes))
+
+        comp = prob.model.integration_comp
+        processes = [slice_.process for slice_ in comp.slices]
+        comp.close()
+        self.assertIsNone(comp.slices)
+        self.assertFalse(any(process.is_alive() for process in processes))
+
+        prob = self.run_ode('parareal', 'RK4', num_slices=3, pool_type='thread')
+        comp = prob.model.integration_comp
+        pool = comp.pool
+        comp.close()
+        self.assertIsNone(comp.pool)
+        self.assertFalse(any(worker.is_alive() for worker in pool._pool))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+import unittest
+from itertools import product
+from parameterized import parameterized
+
+from ozone.methods_list import get_method
+from ozone.utils.recurrence_solver import RecurrenceSolver
+
+
+class Test(unittest.TestCase):
+
+    @parameterized.expand(product(
+        ['RK4', 'BDF3', 'AB3'],  # method
+        [(), (4,)],  # shape of the right-hand side columns
+        ['N', 'T'],  # trans
+    ))
+    def test_solve(self, method_name, ncol_shape, trans):
+        glm_V = np.array(get_method(method_name).V)
+        num_times, size = 7, 3
+
+        # Identity on the diagonal and -glm_V on the subdiagonal blocks
+        mtx = scipy.sparse.identity(num_times * glm_V.shape[0] * size, format='csc') \
+            - scipy.sparse.kron(scipy.sparse.eye(num_times, k=-1),
+                scipy.sparse.kron(glm_V, np.eye(size)), format='csc')
+        if trans == 'T':
+            mtx = mtx.T.tocsc()
+
+        np.random.seed(0)
+        rhs = np.random.rand(*((mtx.shape[0],) + ncol_shape))
+
+        solver = RecurrenceSolver(glm_V, num_times, size)
+        sol = solver.solve(rhs, trans)
+
+        self.assertEqual(solver.is_cumsum, method_name == 'RK4')
+        self.assertEqual(sol.shape, rhs.shape)
+        self.assertTrue(np.allclose(sol, scipy.sparse.linalg.spsolve(mtx, rhs)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+from __future__ import division
+import numpy as np
+import unittest
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.simple_nonlinear_func import SimpleNonlinearODEFunction
+from ozone.utils.setup_cache import SetupCache, setup_cache
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    def run_ode(self, formulation, method_name):
+        prob = Problem(ODEIntegrator(SimpleNonlinearODEFunction(), formulation, method_name,
+            times=np.linspace(0., 1., 11), initial_conditions={'y': 1.}))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+            totals = prob.compute_totals(['state:y'], ['initial_condition:y'])
+
+        return prob['state:y'], totals['state:y', 'initial_condition:y']
+
+    @parameterized.expand([
+        ('solver-based', 'RK4'),
+        ('solver-based', 'AB3'),
+        ('optimizer-based', 'BDF2'),
+    ])
+    def test_repeated_setup(self, formulation, method_name):
+        setup_cache.clear()
+
+        y_ref, jac_ref = self.run_ode(formulation, method_name)
+        num_misses = setup_cache.num_misses
+        self.assertTrue(num_misses > 0)
+
+        y, jac = self.run_ode(formulation, method_name)
+        self.assertEqual(setup_cache.num_misses, num_misses)
+        self.assertTrue(setup_cache.num_hits >= num_misses)
+
+        self.assertTrue(np.array_equal(y, y_ref))
+        self.assertTrue(np.array_equal(jac, jac_ref))
+
+    def test_lru_bound(self):
+        cache = SetupCache(max_bytes=2 * 8 * 10)
+
+        for ind in range(3):
+            cache.get(ind, lambda: np.zeros(10))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.nbytes, 2 * 8 * 10)
+
+        # Key 0 was evicted, and key 1 becomes the most recently used
+        cache.get(1, lambda: np.zeros(10))
+        cache.get(3, lambda: np.zeros(10))
+        self.assertEqual(cache.num_hits, 1)
+        self.assertEqual(cache.num_misses, 4)
+        self.assertTrue(1 in cache._entries and 3 in cache._entries)
+
+        # Values larger than the bound are returned but not stored
+        value = cache.get(4, lambda: np.zeros(100))
+        self.assertEqual(value.shape, (100,))
+        self.assertTrue(4 not in cache._entries)
+
+        with self.assertRaises(ValueError):
+            cache.get(1, None)[:] = 1.
+
+
+if __name__ == '__main__':
+    unittest.main()
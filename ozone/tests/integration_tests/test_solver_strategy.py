@@ -0,0 +1,56 @@
+from __future__ import division
+import numpy as np
+import unittest
+from itertools import product
+from parameterized import parameterized
+
+from openmdao.api import Problem, IndepVarComp
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.simple_nonlinear_func import SimpleNonlinearODEFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    def run_ode(self, method_name, formulation, **kwargs):
+        times = np.linspace(0., 1.e-2, 7)
+        y0 = -1.
+
+        prob = Problem()
+        prob.model.add_subsystem('inputs_comp', IndepVarComp('y0', y0))
+
+        integrator = ODEIntegrator(SimpleNonlinearODEFunction(), formulation, method_name,
+            times=times, **kwargs)
+        prob.model.add_subsystem('integrator', integrator)
+        prob.model.connect('inputs_comp.y0', 'integrator.initial_condition:y')
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+
+        return prob
+
+    @parameterized.expand(product(
+        ['RK4', 'ImplicitMidpoint', 'AB3', 'BDF2'],  # method
+        ['newton', 'gauss-seidel', 'krylov'],  # solver_strategy
+    ))
+    def test_solver_strategy(self, method_name, solver_strategy):
+        prob_ref = self.run_ode(method_name, 'time-marching')
+        prob = self.run_ode(method_name, 'solver-based', solver_strategy=solver_strategy)
+
+        y_ref = prob_ref['integrator.state:y']
+        y = prob['integrator.state:y']
+        diff = np.linalg.norm(y - y_ref) / np.linalg.norm(y_ref)
+        self.assertTrue(diff < 1e-10, 'Error when integrating with %s' % method_name)
+
+        of = ['integrator.state:y']
+        wrt = ['inputs_comp.y0']
+        jac_ref = prob_ref.compute_totals(of, wrt, return_format='dict')
+        jac = prob.compute_totals(of, wrt, return_format='dict')
+        diff = np.linalg.norm(jac[of[0]][wrt[0]] - jac_ref[of[0]][wrt[0]])
+        self.assertTrue(diff < 1e-10, 'Error in derivatives with %s' % method_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
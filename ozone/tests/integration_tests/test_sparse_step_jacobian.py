@@ -0,0 +1,49 @@
+import numpy as np
+import unittest
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator
+from ozone.tests.ode_function_library.heat_equation_func import HeatEquationFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    def run_ode(self, method_name, assembled_jac_type, **kwargs):
+        ode_function = HeatEquationFunction(num_points=20)
+        initial_conditions, t0, t1 = ode_function.get_test_parameters()
+
+        prob = Problem(ODEIntegrator(ode_function, 'time-marching', method_name,
+            times=np.linspace(t0, t1, 11), initial_conditions=initial_conditions,
+            assembled_jac_type=assembled_jac_type, **kwargs))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+            totals = prob.compute_totals(['state:T'], ['initial_condition:T'])
+
+        return prob, prob['state:T'], totals['state:T', 'initial_condition:T']
+
+    @parameterized.expand([
+        ('RadauII5', {}),
+        ('BDF2', {}),
+        ('GaussLegendre4', {'permc_spec': 'NATURAL'}),
+        ('RadauII5', {'modified_newton': True}),
+    ])
+    def test_csc(self, method_name, kwargs):
+        prob, y_ref, jac_ref = self.run_ode(method_name, 'dense')
+        prob, y, jac = self.run_ode(method_name, 'csc', **kwargs)
+
+        self.assertTrue(np.allclose(y, y_ref, rtol=1e-8, atol=1e-10))
+        self.assertTrue(np.allclose(jac, jac_ref, rtol=1e-6, atol=1e-8))
+
+        # The step Jacobian is factored by the sparse LU
+        group = prob.model.integration_group.step_0
+        self.assertTrue(hasattr(group.linear_solver, '_lu'))
+        self.assertFalse(hasattr(group.linear_solver, '_lup'))
+
+
+if __name__ == '__main__':
+    unittest.main()
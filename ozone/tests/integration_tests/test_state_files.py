@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import unittest
+from parameterized import parameterized
+
+from openmdao.api import Problem
+
+from ozone.api import ODEIntegrator, load_states
+from ozone.tests.ode_function_library.two_d_orbit_func import TwoDOrbitFunction
+from ozone.utils.suppress_printing import suppress_stdout_stderr
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        # The directory of the state files is created on the first run
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_dir = os.path.join(self.tmp_dir, 'states')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_ode(self, method_name, out_name, **kwargs):
+        initial_conditions = {'position': np.array([1., 0.]), 'velocity': np.array([0., 1.])}
+
+        prob = Problem(ODEIntegrator(TwoDOrbitFunction(), 'time-marching', method_name,
+            times=np.linspace(0., 3., 31), initial_conditions=initial_conditions, **kwargs))
+
+        with suppress_stdout_stderr():
+            prob.setup(check=False)
+            prob.run_model()
+            totals = prob.compute_totals([out_name], ['initial_condition:velocity'])
+
+        return prob, totals[out_name, 'initial_condition:velocity']
+
+    @parameterized.expand([
+        ('RK4', {}),
+        ('AB3', {}),
+        ('RadauII5', {'max_stored_steps': 4}),
+        ('BDF3', {'checkpoint_file': 'checkpoint.npz'}),
+    ])
+    def test_streamed_states(self, method_name, kwargs):
+        if 'checkpoint_file' in kwargs:
+            kwargs['checkpoint_file'] = os.path.join(self.state_dir, kwargs['checkpoint_file'])
+
+        prob_ref, jac_ref = self.run_ode(method_name, 'state:position', fused=True)
+        prob, jac = self.run_ode(method_name, 'final_state:position',
+            state_dir=self.state_dir, **kwargs)
+
+        states = load_states(self.state_dir, ['position', 'velocity'])
+        for state_name in ['position', 'velocity']:
+            state = prob_ref['state:' + state_name]
+            self.assertTrue(isinstance(states[state_name], np.memmap))
+            self.assertTrue(np.array_equal(states[state_name], state))
+            self.assertTrue(np.array_equal(prob['final_state:' + state_name], state[-1]))
+
+        # The trajectory is not output
+        with self.assertRaises(Exception):
+            prob['state:position']
+
+        self.assertTrue(np.allclose(jac, jac_ref[-2:], rtol=1e-10, atol=1e-12))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,20 @@
+import numpy as np
+
+from ozone.api import ODEFunction
+from ozone.tests.ode_function_library.heat_equation_sys import HeatEquationSystem
+
+
+class HeatEquationFunction(ODEFunction):
+
+    def initialize(self, num_points=100):
+        self.num_points = num_points
+
+        self.set_system(HeatEquationSystem, {'num_points': num_points})
+        self.declare_state('T', 'dT_dt', shape=num_points, targets='T')
+
+    def get_test_parameters(self):
+        t0 = 0.
+        t1 = 0.1
+        x = np.linspace(0., 1., self.num_points + 2)[1:-1]
+        initial_conditions = {'T': np.sin(np.pi * x)}
+        return initial_conditions, t0, t1
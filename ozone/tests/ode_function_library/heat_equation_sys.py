@@ -0,0 +1,44 @@
+import numpy as np
+import scipy.sparse
+
+from openmdao.api import ExplicitComponent
+
+
+class HeatEquationSystem(ExplicitComponent):
+    """
+    Semi-discretized nonlinear heat equation, dT/dt = d2T/dx2 - T^3, on num_points interior
+    points of [0, 1] with zero boundary values, with sparse partials.
+    """
+
+    def initialize(self):
+        self.options.declare('num_nodes', default=1, types=int)
+        self.options.declare('num_points', default=100, types=int)
+
+    def setup(self):
+        num = self.options['num_nodes']
+        num_points = self.options['num_points']
+
+        self.add_input('T', shape=(num, num_points))
+        self.add_output('dT_dt', shape=(num, num_points))
+
+        # Second-difference matrix on each node
+        h = 1. / (num_points + 1)
+        laplacian = scipy.sparse.diags(
+            [np.ones(num_points - 1), -2 * np.ones(num_points), np.ones(num_points - 1)],
+            [-1, 0, 1]) / h ** 2
+        self.mtx = scipy.sparse.block_diag([laplacian] * num, format='csr')
+
+        coo = self.mtx.tocoo()
+        self.diag_indices = np.where(coo.row == coo.col)[0]
+        self.data = coo.data
+
+        self.declare_partials('dT_dt', 'T', rows=coo.row, cols=coo.col)
+
+    def compute(self, inputs, outputs):
+        T = inputs['T'].flatten()
+        outputs['dT_dt'] = (self.mtx.dot(T) - T ** 3).reshape(outputs['dT_dt'].shape)
+
+    def compute_partials(self, inputs, partials):
+        data = self.data.copy()
+        data[self.diag_indices] -= 3 * inputs['T'].flatten() ** 2
+        partials['dT_dt', 'T'] = data
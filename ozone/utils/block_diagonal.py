@@ -0,0 +1,111 @@
+import numpy as np
+import scipy.linalg
+
+
+def block_dot(blocks, vec, row_groups, col_groups, trans=False):
+    """
+    Multiply packed vectors by a matrix that is block diagonal over the nodes and the groups.
+
+    Parameters
+    ----------
+    blocks : ndarray
+        Blocks of shape (num_nodes, num_groups, num_group_rows, num_group_cols).
+    vec : ndarray
+        Packed vectors of shape (num_nodes, num_cols), or (num_nodes, num_rows) with trans.
+    row_groups : ndarray
+        Packed indices of the rows of each group, of shape (num_groups, num_group_rows).
+    col_groups : ndarray
+        Packed indices of the columns of each group, of shape (num_groups, num_group_cols).
+    trans : bool
+        Whether to multiply by the transpose.
+
+    Returns
+    -------
+    ndarray
+        Packed products of shape (num_nodes, num_rows), or (num_nodes, num_cols) with trans.
+    """
+    if not trans:
+        out = np.zeros((vec.shape[0], row_groups.size))
+        out[:, row_groups] = np.einsum('igab,igb->iga', blocks, vec[:, col_groups])
+    else:
+        out = np.zeros((vec.shape[0], col_groups.size))
+        out[:, col_groups] = np.einsum('igab,iga->igb', blocks, vec[:, row_groups])
+    return out
+
+
+def block_lu_factor(blocks):
+    """
+    LU-factor each block of a block diagonal matrix.
+
+    Parameters
+    ----------
+    blocks : ndarray
+        Square blocks of shape (num_blocks, n, n), real or complex.
+
+    Returns
+    -------
+    tuple
+        The LU factors, of shape (num_blocks, n, n), and the pivots, of shape (num_blocks, n).
+    """
+    factors = [scipy.linalg.lu_factor(block) for block in blocks]
+    return (np.array([lu for lu, piv in factors]).reshape(blocks.shape),
+        np.array([piv for lu, piv in factors]).reshape(blocks.shape[:2]))
+
+
+def block_lu_solve(factors, rhs, trans=0):
+    """
+    Solve a block diagonal system from the factors of its blocks.
+
+    With more blocks than rows per block, e.g., for the stage systems of a large ensemble,
+    the substitutions are carried out row by row for all blocks at once, instead of block by
+    block.
+
+    Parameters
+    ----------
+    factors : tuple
+        Factors returned by block_lu_factor.
+    rhs : ndarray
+        Right-hand side of shape (num_blocks, n).
+    trans : int
+        0 to solve the system, 1 to solve its transpose.
+
+    Returns
+    -------
+    ndarray
+        Solution of shape (num_blocks, n).
+    """
+    lu, piv = factors
+    num_blocks, n = piv.shape
+
+    sol = np.array(rhs, np.result_type(lu, rhs))
+    if num_blocks <= n:
+        for ind in range(num_blocks):
+            sol[ind] = scipy.linalg.lu_solve((lu[ind], piv[ind]), rhs[ind], trans=trans)
+        return sol
+
+    # The row interchanges of A = P L U, applied in reverse order for the transpose
+    blocks = np.arange(num_blocks)
+
+    def swap(i):
+        row = sol[:, i].copy()
+        sol[:, i] = sol[blocks, piv[:, i]]
+        sol[blocks, piv[:, i]] = row
+
+    if trans == 0:
+        for i in range(n):
+            swap(i)
+        for i in range(n):
+            sol[:, i] -= np.einsum('ij,ij->i', lu[:, i, :i], sol[:, :i])
+        for i in range(n - 1, -1, -1):
+            sol[:, i] -= np.einsum('ij,ij->i', lu[:, i, i + 1:], sol[:, i + 1:])
+            sol[:, i] /= lu[:, i, i]
+    else:
+        for i in range(n):
+            sol[:, i] -= np.einsum('ij,ij->i', lu[:, :i, i], sol[:, :i])
+            sol[:, i] /= lu[:, i, i]
+        for i in range(n - 1, -1, -1):
+            sol[:, i] -= np.einsum('ij,ij->i', lu[:, i + 1:, i], sol[:, i + 1:])
+        for i in range(n - 1, -1, -1):
+            swap(i)
+
+    return sol
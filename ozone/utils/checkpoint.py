@@ -0,0 +1,206 @@
+import hashlib
+import os
+
+import numpy as np
+from six import iteritems
+
+
+def get_checkpoint_key(arrays, options=()):
+    """
+    Return a hex digest of the values of the arrays and of the repr of the options.
+
+    Parameters
+    ----------
+    arrays : list of ndarray
+        Arrays that, together with the options, determine the integration.
+    options : tuple
+        Other values that determine the integration, identified by their repr.
+
+    Returns
+    -------
+    str
+        The digest, which changes if any of the values change.
+    """
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(repr((array.shape, array.dtype.str)).encode('utf-8'))
+        digest.update(array.tobytes())
+    digest.update(repr(options).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def save_checkpoint(filename, key, arrays):
+    """
+    Write the arrays and the key to an npz file, replacing it atomically.
+
+    The arrays are first written to a temporary file next to filename, so that a crash while
+    writing leaves the previous checkpoint intact.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the checkpoint file.
+    key : str
+        Key of the integration, from get_checkpoint_key.
+    arrays : dict
+        Arrays to save, keyed by name.
+    """
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        np.savez(f, checkpoint_key=np.array(key), **arrays)
+
+    getattr(os, 'replace', os.rename)(tmp_filename, filename)
+
+
+def load_checkpoint(filename, key):
+    """
+    Return the arrays saved in a checkpoint file if it exists and has the given key.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the checkpoint file.
+    key : str
+        Key of the integration, from get_checkpoint_key.
+
+    Returns
+    -------
+    dict or None
+        The saved arrays keyed by name, or None if there is no checkpoint of this integration.
+    """
+    if not os.path.exists(filename):
+        return None
+
+    with np.load(filename) as data:
+        if str(data['checkpoint_key']) != key:
+            return None
+
+        return dict((name, data[name]) for name in data.files if name != 'checkpoint_key')
+
+
+class TrajectoryCheckpoint(object):
+    """
+    Checkpoint of a time-marching run whose trajectory is written to files as it is computed.
+
+    The trajectory arrays, e.g., the step vectors, are memory-mapped npy files next to the
+    checkpoint file, and the substep records of the steps are appended to a raw file, so each
+    save only writes the steps completed since the previous one and the arrays of the
+    checkpoint itself.
+    """
+
+    def __init__(self, filename, key, shapes, record_size=None):
+        """
+        Store the file names; the files are only opened by the open method.
+
+        Parameters
+        ----------
+        filename : str
+            Path of the checkpoint file.
+        key : str
+            Key of the integration, from get_checkpoint_key.
+        shapes : dict
+            Shapes of the trajectory arrays, keyed by name.
+        record_size : int or None
+            Number of values of a substep record, or None if there are no substep records.
+        """
+        root = os.path.splitext(filename)[0]
+
+        self.filename = filename
+        self.key = key
+        self.shapes = shapes
+        self.record_size = record_size
+        self.array_filenames = dict((name, '%s_%s.npy' % (root, name)) for name in shapes)
+        self.records_filename = root + '_substeps.bin'
+
+        # The steps and substep records already written to the trajectory files
+        self.num_saved_steps = 0
+        self.num_saved_records = 0
+
+    def open(self, restart):
+        """
+        Open the trajectory arrays and return them with the saved checkpoint, if any.
+
+        Parameters
+        ----------
+        restart : bool
+            Whether to resume from the checkpoint file if it holds a checkpoint with the key;
+            otherwise, the trajectory files are created anew.
+
+        Returns
+        -------
+        dict
+            Memory-mapped trajectory arrays, keyed by name.
+        dict or None
+            The saved arrays, with the substep records of each saved step as a list under
+            'records', or None if there is no checkpoint to resume from.
+        """
+        filenames = list(self.array_filenames.values())
+        if self.record_size is not None:
+            filenames.append(self.records_filename)
+
+        checkpoint = None
+        if restart and all(os.path.exists(filename) for filename in filenames):
+            checkpoint = load_checkpoint(self.filename, self.key)
+
+        if checkpoint is None:
+            # A checkpoint left by an earlier run must not refer to the new files
+            if os.path.exists(self.filename):
+                os.remove(self.filename)
+            if self.record_size is not None:
+                open(self.records_filename, 'wb').close()
+        else:
+            self.num_saved_steps = int(checkpoint['num_steps'])
+            self.num_saved_records = int(checkpoint['num_records'])
+            if self.record_size is not None:
+                checkpoint['records'] = self._read_records()
+
+        arrays = dict((name, np.lib.format.open_memmap(self.array_filenames[name],
+            mode='w+' if checkpoint is None else 'r+', dtype=float, shape=shape))
+            for name, shape in iteritems(self.shapes))
+
+        return arrays, checkpoint
+
+    def _read_records(self):
+        # Records appended after the checkpoint, before an interruption, are discarded
+        size = 1 + self.record_size
+        with open(self.records_filename, 'r+b') as f:
+            records = np.fromfile(f, count=self.num_saved_records * size).reshape(
+                (self.num_saved_records, size))
+            f.truncate(records.nbytes)
+
+        offsets = np.searchsorted(records[:, 0], np.arange(self.num_saved_steps + 1))
+        return [records[offsets[i_step]:offsets[i_step + 1], 1:]
+            for i_step in range(self.num_saved_steps)]
+
+    def save(self, num_steps, arrays, saved_arrays, records=None):
+        """
+        Write the trajectory up to num_steps and then the checkpoint that refers to it.
+
+        Parameters
+        ----------
+        num_steps : int
+            Number of steps completed.
+        arrays : dict
+            Trajectory arrays returned by open.
+        saved_arrays : dict
+            Arrays to save in the checkpoint, keyed by name.
+        records : list of ndarray or None
+            Substep records of shape (num_substeps, record_size) of each step completed since
+            the previous save.
+        """
+        # The trajectory is complete on disk before the checkpoint that refers to it is written
+        for array in arrays.values():
+            array.flush()
+
+        if records is not None:
+            with open(self.records_filename, 'ab') as f:
+                for i_step, step_records in enumerate(records, self.num_saved_steps):
+                    np.hstack([np.full((len(step_records), 1), float(i_step)),
+                        step_records]).tofile(f)
+                    self.num_saved_records += len(step_records)
+        self.num_saved_steps = num_steps
+
+        saved_arrays = dict(saved_arrays, num_steps=np.array(num_steps),
+            num_records=np.array(self.num_saved_records))
+        save_checkpoint(self.filename, self.key, saved_arrays)
@@ -0,0 +1,118 @@
+import numpy as np
+
+from ozone.utils.block_diagonal import block_lu_factor, block_lu_solve
+
+
+class KroneckerStageSolver(object):
+    """
+    Solver for the Newton systems (I - h A x J) dF = r of the stages of implicit methods.
+
+    With the same Jacobian J of the rates for all stages, the Newton matrix of the stage
+    equations is the Kronecker product form I - h A x J. Diagonalizing A = T diag(lambda) T^-1
+    once per method decouples it into the num_stages systems (I - h lambda_k J) of the size of
+    the state vector, in the stage variables T^-1 dF. The eigenvalues of A come in complex
+    conjugate pairs, and the solution for the second one of a pair is the conjugate of the
+    first, so only one complex system is factored per pair. If J is block diagonal, e.g., over
+    the members of an ensemble, only its blocks are given, and each system is factored and
+    solved block by block.
+    """
+
+    def __init__(self, glm_A, max_cond=1e8):
+        """
+        Diagonalize glm_A.
+
+        Parameters
+        ----------
+        glm_A : ndarray
+            The A matrix of the method, of shape (num_stages, num_stages).
+        max_cond : float
+            Largest condition number of the eigenvector matrix for which glm_A is treated as
+            diagonalizable.
+        """
+        self.num_stages = glm_A.shape[0]
+
+        eigvals, mtx_T = np.linalg.eig(glm_A)
+
+        self.diagonalizable = np.linalg.cond(mtx_T) < max_cond
+        if not self.diagonalizable:
+            return
+
+        self.eigvals = eigvals
+        self.mtx_T = mtx_T
+        self.mtx_T_inv = np.linalg.inv(mtx_T)
+
+        # For each eigenvalue, the index of the one whose system is factored and whether the
+        # solution is conjugated, which pairs up the complex conjugate eigenvalues.
+        self.sources = []
+        for ind, eigval in enumerate(eigvals):
+            source = (ind, False)
+            if abs(eigval.imag) > 1e-14 * max(1., abs(eigval)):
+                for ind2 in range(ind):
+                    if self.sources[ind2] == (ind2, False) and \
+                            abs(eigvals[ind2] - np.conj(eigval)) <= 1e-12 * max(1., abs(eigval)):
+                        source = (ind2, True)
+                        break
+            self.sources.append(source)
+
+    def factor(self, h, jac):
+        """
+        Factor the decoupled systems.
+
+        Parameters
+        ----------
+        h : float
+            Step size.
+        jac : ndarray
+            Jacobian of the rates with respect to the states, shared by the stages, of shape
+            (num_state_vars, num_state_vars), or its diagonal blocks, of shape
+            (num_blocks, block_size, block_size).
+
+        Returns
+        -------
+        dict
+            LU factors of I - h lambda_k J, from block_lu_factor, keyed by the index k of the
+            factored eigenvalues.
+        """
+        blocks = jac.reshape((-1,) + jac.shape[-2:])
+        eye = np.eye(blocks.shape[1])
+
+        factors = {}
+        for ind, (source, conj) in enumerate(self.sources):
+            if source == ind:
+                eigval = self.eigvals[ind]
+                if abs(eigval.imag) > 1e-14 * max(1., abs(eigval)):
+                    factors[ind] = block_lu_factor(eye - h * eigval * blocks)
+                else:
+                    factors[ind] = block_lu_factor(eye - h * eigval.real * blocks)
+        return factors
+
+    def solve(self, factors, rhs):
+        """
+        Solve the Newton system for a right-hand side given per stage.
+
+        Parameters
+        ----------
+        factors : dict
+            Factors returned by factor.
+        rhs : ndarray
+            Right-hand side of shape (num_stages, num_state_vars), or, with the Jacobian given
+            by its blocks, (num_stages, num_blocks, block_size).
+
+        Returns
+        -------
+        ndarray
+            Solution of the shape of rhs.
+        """
+        lu, piv = next(iter(factors.values()))
+        rhs_transformed = np.einsum('ij,j...->i...',
+            self.mtx_T_inv, rhs.reshape((self.num_stages,) + piv.shape))
+
+        sol_transformed = np.zeros(rhs_transformed.shape, complex)
+        for ind, (source, conj) in enumerate(self.sources):
+            if not conj:
+                sol_transformed[ind] = block_lu_solve(factors[ind], rhs_transformed[ind])
+        for ind, (source, conj) in enumerate(self.sources):
+            if conj:
+                sol_transformed[ind] = np.conj(sol_transformed[source])
+
+        return np.einsum('ij,j...->i...', self.mtx_T, sol_transformed).real.reshape(rhs.shape)
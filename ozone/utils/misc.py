@@ -1,3 +1,12 @@
+import atexit
+import weakref
+
+try:
+    from weakref import finalize
+except ImportError:
+    finalize = None
+
+
 def _get_class(name, classes, label):
     if name not in classes:
         msg = '%s name %s is invalid. Valid options are:\n' % (label, name)
@@ -6,3 +15,44 @@ def _get_class(name, classes, label):
         raise ValueError(msg)
     else:
         return classes[name]
+
+
+def get_finalizer(obj, func, *args):
+    """
+    Return a callable that calls func(*args) once, at the latest when obj is collected.
+
+    It is also called at the exit of the interpreter. This is weakref.finalize, which Python 2
+    does not have; there, a weak reference callback and atexit are used instead.
+
+    Parameters
+    ----------
+    obj : object
+        Object whose collection triggers the call; func and args must not refer to it.
+    func : callable
+        Function to call.
+    *args
+        Arguments of func.
+
+    Returns
+    -------
+    callable
+        Calls func(*args) if it has not been called yet.
+    """
+    if finalize is not None:
+        return finalize(obj, func, *args)
+
+    return _Finalizer(obj, func, args)
+
+
+class _Finalizer(object):
+
+    def __init__(self, obj, func, args):
+        self._call = (func, args)
+        self._ref = weakref.ref(obj, lambda ref: self())
+        atexit.register(self)
+
+    def __call__(self):
+        if self._call is not None:
+            func, args = self._call
+            self._call = None
+            func(*args)
@@ -0,0 +1,85 @@
+from openmdao.api import NewtonSolver
+
+
+class ModifiedNewtonSolver(NewtonSolver):
+    """
+    Newton solver that reuses the factorization of its DirectSolver across iterations.
+
+    The Jacobian is only reassembled and refactored when the residual norm decreases by less
+    than the factor max_contraction in an iteration; otherwise, the Newton update is computed
+    with the last factorization. The factorization is kept in the shared dict, so if the same
+    dict is given to the solvers of several groups with the same variables, e.g., the step
+    groups of the time-marching integrator, each group starts from the factorization of the
+    group solved before it. The derivative solves are unaffected, since the DirectSolver
+    refactors the Jacobian when the model is linearized.
+    """
+
+    def __init__(self, shared=None, **kwargs):
+        """
+        Initialize the solver.
+
+        Parameters
+        ----------
+        shared : dict or None
+            Dictionary holding the factorization, shared with other solvers, or None.
+        **kwargs : dict
+            Options of the solver.
+        """
+        super(ModifiedNewtonSolver, self).__init__(**kwargs)
+
+        self.shared = {} if shared is None else shared
+        self.num_factorizations = 0
+
+    def _declare_options(self):
+        super(ModifiedNewtonSolver, self)._declare_options()
+
+        self.options.declare('max_contraction', default=0.5, lower=0., upper=1.,
+            desc='Largest ratio of successive residual norms before the Jacobian is refactored')
+
+    def _iter_initialize(self):
+        self._last_norm = None
+        norm0, norm = super(ModifiedNewtonSolver, self)._iter_initialize()
+
+        size = len(self._system._outputs._data)
+        self._refresh = self.shared.get('size') != size
+        return norm0, norm
+
+    def _iter_get_norm(self):
+        norm = super(ModifiedNewtonSolver, self)._iter_get_norm()
+
+        if self._last_norm is not None:
+            self._refresh = norm > self.options['max_contraction'] * self._last_norm
+        self._last_norm = norm
+        return norm
+
+    def _iter_execute(self):
+        system = self._system
+        linear_solver = self.linear_solver
+
+        if self._refresh:
+            super(ModifiedNewtonSolver, self)._iter_execute()
+            self.num_factorizations += 1
+
+            self.shared['size'] = len(system._outputs._data)
+            self.shared['factors'] = dict(
+                (name, getattr(linear_solver, name)) for name in ('_lup', '_lu')
+                if hasattr(linear_solver, name))
+            return
+
+        for name, factors in self.shared['factors'].items():
+            setattr(linear_solver, name, factors)
+
+        self._solver_info.append_subsolver()
+
+        system._vectors['residual']['linear'].set_vec(system._residuals)
+        system._vectors['residual']['linear'] *= -1.0
+
+        linear_solver.solve(['linear'], 'fwd')
+
+        if self.linesearch:
+            self.linesearch._do_subsolve = False
+            self.linesearch.solve()
+        else:
+            system._outputs += system._vectors['output']['linear']
+
+        self._solver_info.pop()
@@ -0,0 +1,407 @@
+import numpy as np
+from six import iteritems
+
+from openmdao.api import Problem, IndepVarComp
+from openmdao.utils.units import get_conversion
+
+from ozone.ensemble_ode_function import EnsembleODEFunction
+from ozone.utils.var_names import get_name
+from ozone.utils.units import get_rate_units
+from ozone.utils.packed_layout import get_offsets
+
+
+class ODEEvaluator(object):
+    """
+    Evaluates the ODE system and its derivatives directly, outside of the integrator's model.
+
+    The ODE system is wrapped in a small stand-alone Problem with num_nodes evaluation points.
+    All states, dynamic parameters, and static parameters are exchanged in packed form:
+    states and rates are (num_nodes, num_state_vars) arrays in which each state occupies
+    a contiguous column range, in declaration order. The values of the event functions are
+    (num_nodes, num_events) arrays.
+
+    The rates at each node only depend on the inputs at that node, and for an ensemble, those
+    of each member only depend on the states and parameters of that member, so the Jacobians
+    of the rates are block diagonal over the nodes and the groups of variables of the members.
+    The packed indices of each group are the rows of state_groups, static_groups, and
+    dynamic_groups; without an ensemble, there is a single group.
+    """
+
+    def __init__(self, ode_function, num_nodes):
+        """
+        Create and set up the Problem containing the ODE system.
+
+        Parameters
+        ----------
+        ode_function : ODEFunction
+            The ODE function instance representing the 'f' in dy_dt = f(t, y, x).
+        num_nodes : int
+            Number of points at which the ODE system is evaluated simultaneously.
+        """
+        self.ode_function = ode_function
+        self.num_nodes = num_nodes
+
+        states = ode_function._states
+        static_parameters = ode_function._static_parameters
+        dynamic_parameters = ode_function._dynamic_parameters
+        time_options = ode_function._time_options
+        time_units = time_options['units']
+
+        self.state_offsets, self.num_state_vars = get_offsets(states)
+        self.static_offsets, self.num_static_vars = get_offsets(static_parameters)
+        self.dynamic_offsets, self.num_dynamic_vars = get_offsets(dynamic_parameters)
+
+        self.num_groups = 1
+        if isinstance(ode_function, EnsembleODEFunction):
+            self.num_groups = ode_function.ensemble_size
+
+        self.state_groups = self._get_group_indices(states, self.state_offsets)
+        self.static_groups = self._get_group_indices(static_parameters, self.static_offsets)
+        self.dynamic_groups = self._get_group_indices(dynamic_parameters, self.dynamic_offsets)
+
+        comp = IndepVarComp()
+        self._wrt = wrt = []
+
+        for state_name, state in iteritems(states):
+            if state['targets']:
+                name = get_name('state', state_name)
+                comp.add_output(name, shape=(num_nodes,) + state['shape'], units=state['units'])
+                wrt.append('inputs_comp.' + name)
+
+        if time_options['targets']:
+            comp.add_output('time', shape=num_nodes, units=time_units)
+            wrt.append('inputs_comp.time')
+
+        for parameter_name, parameter in iteritems(static_parameters):
+            if parameter['targets']:
+                name = get_name('static_parameter', parameter_name)
+                comp.add_output(name, shape=(num_nodes,) + parameter['shape'],
+                    units=parameter['units'])
+                wrt.append('inputs_comp.' + name)
+
+        for parameter_name, parameter in iteritems(dynamic_parameters):
+            if parameter['targets']:
+                name = get_name('dynamic_parameter', parameter_name)
+                comp.add_output(name, shape=(num_nodes,) + parameter['shape'],
+                    units=parameter['units'])
+                wrt.append('inputs_comp.' + name)
+
+        prob = Problem()
+        prob.model.add_subsystem('inputs_comp', comp)
+        prob.model.add_subsystem('ode_comp', ode_function._system_class(
+            num_nodes=num_nodes, **ode_function._system_init_kwargs))
+
+        for state_name, state in iteritems(states):
+            for target in state['targets']:
+                prob.model.connect('inputs_comp.' + get_name('state', state_name),
+                    'ode_comp.' + target)
+
+        for target in time_options['targets']:
+            prob.model.connect('inputs_comp.time', 'ode_comp.' + target)
+
+        for parameter_name, parameter in iteritems(static_parameters):
+            for target in parameter['targets']:
+                prob.model.connect('inputs_comp.' + get_name('static_parameter', parameter_name),
+                    'ode_comp.' + target)
+
+        for parameter_name, parameter in iteritems(dynamic_parameters):
+            for target in parameter['targets']:
+                prob.model.connect('inputs_comp.' + get_name('dynamic_parameter', parameter_name),
+                    'ode_comp.' + target)
+
+        prob.setup(check=False)
+        prob.final_setup()
+
+        self.prob = prob
+        self._of = ['ode_comp.' + state['rate_source'] for state in states.values()]
+        self._event_of = [
+            'ode_comp.' + event['expr_source'] for event in ode_function._events.values()]
+
+        # Conversion from the units of each rate_source to the rate units of its state
+        meta = prob.model._var_allprocs_abs2meta
+        prom2abs = prob.model._var_allprocs_prom2abs_list['output']
+        self.rate_conversions = {}
+        for state_name, state in iteritems(states):
+            rate_units = meta[prom2abs['ode_comp.' + state['rate_source']][0]]['units']
+            units = get_rate_units(state['units'], time_units)
+            if rate_units is None or units is None:
+                self.rate_conversions[state_name] = (1., 0.)
+            else:
+                self.rate_conversions[state_name] = get_conversion(rate_units, units)
+
+    def set_inputs(self, states, times=None, static_parameters=None, dynamic_parameters=None):
+        """
+        Set the values of all ODE inputs.
+
+        Parameters
+        ----------
+        states : ndarray
+            Packed state values of shape (num_nodes, num_state_vars).
+        times : ndarray or None
+            Times of shape (num_nodes,).
+        static_parameters : ndarray or None
+            Packed static parameter values of shape (num_static_vars,).
+        dynamic_parameters : ndarray or None
+            Packed dynamic parameter values of shape (num_nodes, num_dynamic_vars).
+        """
+        for name, value in self._get_input_values(
+                states, times, static_parameters, dynamic_parameters):
+            self.prob[name] = value
+
+    def _get_input_values(self, states, times, static_parameters, dynamic_parameters):
+        # The values of the outputs of inputs_comp, unpacked from the packed arrays
+        ode_function = self.ode_function
+        num_nodes = self.num_nodes
+
+        for state_name, state in iteritems(ode_function._states):
+            if state['targets']:
+                ind1, ind2 = self.state_offsets[state_name]
+                yield 'inputs_comp.' + get_name('state', state_name), \
+                    states[:, ind1:ind2].reshape((num_nodes,) + state['shape'])
+
+        if ode_function._time_options['targets']:
+            yield 'inputs_comp.time', times
+
+        for parameter_name, parameter in iteritems(ode_function._static_parameters):
+            if parameter['targets']:
+                ind1, ind2 = self.static_offsets[parameter_name]
+                yield 'inputs_comp.' + get_name('static_parameter', parameter_name), \
+                    np.einsum('i,...->i...', np.ones(num_nodes),
+                        static_parameters[ind1:ind2].reshape(parameter['shape']))
+
+        for parameter_name, parameter in iteritems(ode_function._dynamic_parameters):
+            if parameter['targets']:
+                ind1, ind2 = self.dynamic_offsets[parameter_name]
+                yield 'inputs_comp.' + get_name('dynamic_parameter', parameter_name), \
+                    dynamic_parameters[:, ind1:ind2].reshape((num_nodes,) + parameter['shape'])
+
+    def compute_rates(self, states, times=None, static_parameters=None, dynamic_parameters=None):
+        """
+        Evaluate the ODE system.
+
+        Parameters
+        ----------
+        states : ndarray
+            Packed state values of shape (num_nodes, num_state_vars).
+        times : ndarray or None
+            Times of shape (num_nodes,).
+        static_parameters : ndarray or None
+            Packed static parameter values of shape (num_static_vars,).
+        dynamic_parameters : ndarray or None
+            Packed dynamic parameter values of shape (num_nodes, num_dynamic_vars).
+
+        Returns
+        -------
+        ndarray
+            Packed rates of shape (num_nodes, num_state_vars).
+        """
+        self.set_inputs(states, times, static_parameters, dynamic_parameters)
+
+        # Problem.run_model would clear the iprint stack that all solvers share,
+        # including those of the model in which the ODE is evaluated.
+        self.prob.model.run_solve_nonlinear()
+
+        return self._get_rates(self.prob, offsets=True)
+
+    def _get_rates(self, vector, offsets):
+        # The packed rates, or with offsets=False, derivatives of the rates, from the rate
+        # sources in the outputs of the problem or in a vector of the model
+        rates = np.empty((self.num_nodes, self.num_state_vars))
+        for state_name, state in iteritems(self.ode_function._states):
+            ind1, ind2 = self.state_offsets[state_name]
+            factor, offset = self.rate_conversions[state_name]
+            rates[:, ind1:ind2] = (vector['ode_comp.' + state['rate_source']].reshape(
+                (self.num_nodes, ind2 - ind1)) + (offset if offsets else 0.)) * factor
+
+        return rates
+
+    def compute_events(self):
+        """
+        Return the values of the event functions at the point of the last compute_rates call.
+
+        Returns
+        -------
+        ndarray
+            Event function values of shape (num_nodes, num_events).
+        """
+        events = np.empty((self.num_nodes, len(self._event_of)))
+        for ind, of in enumerate(self._event_of):
+            events[:, ind] = self.prob[of].reshape(self.num_nodes)
+
+        return events
+
+    def compute_jacobians(self):
+        """
+        Compute the derivatives of the rates at the point given by the last compute_rates call.
+
+        Only the diagonal blocks of the Jacobians are computed. Since the nodes and the groups
+        are independent, seeding one entry of the inputs of a group on all nodes and in all
+        groups at once gives the corresponding column of every block in a single linear
+        solve of the ODE system, so the number of solves is that of the entries of one group.
+        The blocks of group g relate the rates state_groups[g] to the states state_groups[g],
+        the static parameters static_groups[g], and the dynamic parameters dynamic_groups[g].
+
+        Returns
+        -------
+        ndarray
+            d(rates)/d(states) blocks of shape (num_nodes, num_groups, group_size, group_size),
+            where group_size = num_state_vars / num_groups.
+        ndarray
+            d(rates)/d(times) of shape (num_nodes, num_state_vars).
+        ndarray
+            d(rates)/d(static parameters) blocks of shape
+            (num_nodes, num_groups, group_size, num_static_vars / num_groups).
+        ndarray
+            d(rates)/d(dynamic parameters) blocks of shape
+            (num_nodes, num_groups, group_size, num_dynamic_vars / num_groups).
+        """
+        num_nodes = self.num_nodes
+        state_groups = self.state_groups
+        static_groups = self.static_groups
+        dynamic_groups = self.dynamic_groups
+
+        block_shape = (num_nodes,) + state_groups.shape
+        jac_y = np.zeros(block_shape + (state_groups.shape[1],))
+        jac_t = np.zeros((num_nodes, self.num_state_vars))
+        jac_s = np.zeros(block_shape + (static_groups.shape[1],))
+        jac_d = np.zeros(block_shape + (dynamic_groups.shape[1],))
+
+        if len(self._wrt) == 0:
+            return jac_y, jac_t, jac_s, jac_d
+
+        model = self.prob.model
+        model.run_linearize()
+
+        d_outputs = model._vectors['output']['linear']
+        d_residuals = model._vectors['residual']['linear']
+
+        def solve(states, times, static_parameters, dynamic_parameters):
+            d_outputs.set_const(0.)
+            d_residuals.set_const(0.)
+
+            # The derivative of an output is minus that of its residual in OpenMDAO
+            for name, value in self._get_input_values(
+                    states, times, static_parameters, dynamic_parameters):
+                d_residuals[name] = -value
+
+            model.run_solve_linear(['linear'], 'fwd')
+            return self._get_rates(d_outputs, offsets=False)
+
+        zero_states = np.zeros((num_nodes, self.num_state_vars))
+        zero_times = np.zeros(num_nodes)
+        zero_static = np.zeros(self.num_static_vars)
+        zero_dynamic = np.zeros((num_nodes, self.num_dynamic_vars))
+
+        for ind in range(state_groups.shape[1]):
+            seed = zero_states.copy()
+            seed[:, state_groups[:, ind]] = 1.
+            jac_y[:, :, :, ind] = solve(
+                seed, zero_times, zero_static, zero_dynamic)[:, state_groups]
+
+        if self.ode_function._time_options['targets']:
+            jac_t[:] = solve(zero_states, np.ones(num_nodes), zero_static, zero_dynamic)
+
+        for ind in range(static_groups.shape[1]):
+            seed = zero_static.copy()
+            seed[static_groups[:, ind]] = 1.
+            jac_s[:, :, :, ind] = solve(
+                zero_states, zero_times, seed, zero_dynamic)[:, state_groups]
+
+        for ind in range(dynamic_groups.shape[1]):
+            seed = zero_dynamic.copy()
+            seed[:, dynamic_groups[:, ind]] = 1.
+            jac_d[:, :, :, ind] = solve(
+                zero_states, zero_times, zero_static, seed)[:, state_groups]
+
+        return jac_y, jac_t, jac_s, jac_d
+
+    def compute_event_jacobians(self):
+        """
+        Compute the derivatives of the event functions at the point of the last compute_rates.
+
+        Rows and the state, time, and dynamic parameter columns are ordered node-major, i.e.,
+        index = i_node * num_vars + i_var.
+
+        Returns
+        -------
+        ndarray
+            d(events)/d(states) of shape (num_nodes * num_events, num_nodes * num_state_vars).
+        ndarray
+            d(events)/d(times) of shape (num_nodes * num_events, num_nodes).
+        ndarray
+            d(events)/d(static parameters) of shape (num_nodes * num_events, num_static_vars).
+        ndarray
+            d(events)/d(dynamic parameters) of shape
+            (num_nodes * num_events, num_nodes * num_dynamic_vars).
+        """
+        num_events = len(self._event_of)
+
+        sources = []
+        for ind, of in enumerate(self._event_of):
+            rows = self._get_packed_indices((ind, ind + 1), num_events)
+            sources.append((of, rows, 1.))
+
+        return self._compute_totals(sources, num_events)
+
+    def _compute_totals(self, sources, num_vars):
+        ode_function = self.ode_function
+        num_nodes = self.num_nodes
+        num_state_vars = self.num_state_vars
+        num_dynamic_vars = self.num_dynamic_vars
+
+        num_rows = num_nodes * num_vars
+
+        jac_y = np.zeros((num_rows, num_nodes * num_state_vars))
+        jac_t = np.zeros((num_rows, num_nodes))
+        jac_s = np.zeros((num_rows, self.num_static_vars))
+        jac_d = np.zeros((num_rows, num_nodes * num_dynamic_vars))
+
+        if len(self._wrt) == 0:
+            return jac_y, jac_t, jac_s, jac_d
+
+        totals = self.prob.compute_totals(
+            of=[of for of, rows, factor in sources], wrt=self._wrt, return_format='dict')
+
+        for of, rows, factor in sources:
+            for state_name2, state2 in iteritems(ode_function._states):
+                if state2['targets']:
+                    wrt = 'inputs_comp.' + get_name('state', state_name2)
+                    cols = self._get_packed_indices(
+                        self.state_offsets[state_name2], num_state_vars)
+                    jac_y[np.ix_(rows, cols)] += factor * totals[of][wrt]
+
+            if ode_function._time_options['targets']:
+                jac_t[rows, :] += factor * totals[of]['inputs_comp.time']
+
+            for parameter_name, parameter in iteritems(ode_function._static_parameters):
+                if parameter['targets']:
+                    wrt = 'inputs_comp.' + get_name('static_parameter', parameter_name)
+                    ind1, ind2 = self.static_offsets[parameter_name]
+                    jac_s[rows, ind1:ind2] += factor * totals[of][wrt].reshape(
+                        (len(rows), num_nodes, ind2 - ind1)).sum(axis=1)
+
+            for parameter_name, parameter in iteritems(ode_function._dynamic_parameters):
+                if parameter['targets']:
+                    wrt = 'inputs_comp.' + get_name('dynamic_parameter', parameter_name)
+                    cols = self._get_packed_indices(
+                        self.dynamic_offsets[parameter_name], num_dynamic_vars)
+                    jac_d[np.ix_(rows, cols)] += factor * totals[of][wrt]
+
+        return jac_y, jac_t, jac_s, jac_d
+
+    def _get_packed_indices(self, offsets, num_vars):
+        ind1, ind2 = offsets
+        return (
+            np.einsum('i,j->ij', np.arange(self.num_nodes), num_vars * np.ones(ind2 - ind1, int))
+            + np.einsum('i,j->ij', np.ones(self.num_nodes, int), np.arange(ind1, ind2))
+        ).flatten()
+
+    def _get_group_indices(self, variables, offsets):
+        # Each variable of an ensemble has a leading ensemble axis, so the entries of each
+        # member are a contiguous range within the range of the variable
+        indices = [np.zeros((self.num_groups, 0), int)]
+        for name in variables:
+            ind1, ind2 = offsets[name]
+            indices.append(np.arange(ind1, ind2).reshape((self.num_groups, -1)))
+
+        return np.concatenate(indices, axis=1)
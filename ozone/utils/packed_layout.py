@@ -0,0 +1,119 @@
+import numpy as np
+from six import iteritems
+
+from ozone.utils.var_names import get_name
+
+
+class PackedLayout(object):
+    """
+    Layout in which a set of variables (e.g., all states) share one contiguous buffer.
+
+    Each variable occupies the column range offsets[name] of the last axis of the buffer,
+    in declaration order, so that operators that act identically on every variable can be
+    applied to all of them in a single call.
+    """
+
+    def __init__(self, variables):
+        """
+        Compute the offsets of the variables in the packed buffer.
+
+        Parameters
+        ----------
+        variables : dict
+            Dictionary of variable metadata, each with a 'shape' entry, keyed by name.
+        """
+        self.variables = variables
+        self.offsets, self.size = get_offsets(variables)
+
+    def pack(self, vec, name_type, lead_shape, ncol=None):
+        """
+        Gather the variables from a vector or dictionary into a packed array.
+
+        Variables absent from vec are left as zeros.
+
+        Parameters
+        ----------
+        vec : Vector or dict
+            Container of the variable arrays, keyed by get_name(name_type, name).
+        name_type : str
+            Variable type passed to get_name.
+        lead_shape : tuple
+            Shape of the leading axes that precede the variable shape in each array.
+        ncol : int or None
+            Number of trailing columns for multi-vectors, if any.
+
+        Returns
+        -------
+        ndarray
+            Packed array of shape lead_shape + (size,), or lead_shape + (size, ncol).
+        """
+        col_shape = () if ncol is None else (ncol,)
+
+        array = np.zeros(lead_shape + (self.size,) + col_shape)
+        for name, (ind1, ind2) in iteritems(self.offsets):
+            var_name = get_name(name_type, name)
+            if var_name in vec:
+                if ncol is None:
+                    array[..., ind1:ind2] = vec[var_name].reshape(lead_shape + (ind2 - ind1,))
+                else:
+                    array[..., ind1:ind2, :] = vec[var_name].reshape(
+                        lead_shape + (ind2 - ind1, ncol))
+        return array
+
+    def unpack(self, array, vec, name_type, ncol=None, add=False):
+        """
+        Scatter a packed array into the variables of a vector or dictionary.
+
+        Variables absent from vec are skipped.
+
+        Parameters
+        ----------
+        array : ndarray
+            Packed array of shape lead_shape + (size,), or lead_shape + (size, ncol).
+        vec : Vector or dict
+            Container of the variable arrays, keyed by get_name(name_type, name).
+        name_type : str
+            Variable type passed to get_name.
+        ncol : int or None
+            Number of trailing columns for multi-vectors, if any.
+        add : bool
+            If True, the values are added to vec instead of overwriting it.
+        """
+        for name, (ind1, ind2) in iteritems(self.offsets):
+            var_name = get_name(name_type, name)
+            if var_name in vec:
+                if ncol is not None:
+                    value = array[..., ind1:ind2, :]
+                else:
+                    value = array[..., ind1:ind2]
+                value = value.reshape(vec[var_name].shape)
+
+                if add:
+                    vec[var_name] += value
+                else:
+                    vec[var_name] = value
+
+
+def get_offsets(variables):
+    """
+    Compute the column range of each variable in a packed layout.
+
+    Parameters
+    ----------
+    variables : dict
+        Dictionary of variable metadata, each with a 'shape' entry, keyed by name.
+
+    Returns
+    -------
+    dict
+        Tuples (start, end) keyed by variable name.
+    int
+        Total size of the packed variables.
+    """
+    offsets = {}
+    ind = 0
+    for name, variable in iteritems(variables):
+        size = int(np.prod(variable['shape']))
+        offsets[name] = (ind, ind + size)
+        ind += size
+    return offsets, ind
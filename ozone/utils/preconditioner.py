@@ -0,0 +1,22 @@
+from openmdao.api import LinearBlockGS
+
+
+class LinearBlockGSPreconditioner(LinearBlockGS):
+    """
+    Block Gauss--Seidel sweeps from a zero initial guess, for use as a Krylov preconditioner.
+
+    LinearBlockGS starts from the current contents of the solution vector, so the result of a
+    fixed number of sweeps depends on the previous solve. A preconditioner must be a fixed
+    linear operator, so the solution vector is cleared before the sweeps instead.
+    """
+
+    def _iter_initialize(self):
+        if self._mode == 'fwd':
+            x_vecs = self._system._vectors['output']
+        else:  # rev
+            x_vecs = self._system._vectors['residual']
+
+        for vec_name in self._vec_names:
+            x_vecs[vec_name].set_const(0.)
+
+        return super(LinearBlockGSPreconditioner, self)._iter_initialize()
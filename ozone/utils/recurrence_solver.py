@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class RecurrenceSolver(object):
+    """
+    Solver for the block lower-bidiagonal system of the GLM step recurrence.
+
+    The matrix has the identity on the diagonal and -glm_V on the subdiagonal blocks, i.e.,
+    y[0] = r[0] and y[i + 1] - glm_V y[i] = r[i + 1], acting on vectors of shape
+    (num_times, num_step_vars, size) flattened. The solve method mirrors that of the
+    SuperLU object returned by scipy.sparse.linalg.splu, so both can be used interchangeably.
+    """
+
+    def __init__(self, glm_V, num_times, size):
+        """
+        Store the recurrence coefficients; no factorization is required.
+
+        Parameters
+        ----------
+        glm_V : ndarray
+            The GLM V matrix of shape (num_step_vars, num_step_vars).
+        num_times : int
+            Number of time points, including the first.
+        size : int
+            Number of scalar variables per step vector entry, i.e., the state size.
+        """
+        self.glm_V = glm_V
+        self.num_times = num_times
+        self.num_step_vars = glm_V.shape[0]
+        self.size = size
+        self.shape = (num_times * self.num_step_vars * size,) * 2
+
+        # With a single step variable and V = 1 (e.g., all Runge--Kutta methods),
+        # the recurrence is a cumulative sum over the time steps.
+        self.is_cumsum = glm_V.shape == (1, 1) and glm_V[0, 0] == 1.
+
+    def solve(self, rhs, trans='N'):
+        """
+        Solve the system, or its transpose, for one or more right-hand sides.
+
+        Parameters
+        ----------
+        rhs : ndarray
+            Right-hand side of shape (n,) or (n, ncol).
+        trans : str
+            'N' to solve with the matrix, 'T' to solve with its transpose.
+
+        Returns
+        -------
+        ndarray
+            The solution, with the same shape as rhs.
+        """
+        num_times = self.num_times
+        num_step_vars = self.num_step_vars
+        glm_V = self.glm_V
+
+        sol = np.array(rhs, dtype=float).reshape((num_times, num_step_vars, -1))
+
+        if self.is_cumsum:
+            if trans == 'N':
+                np.cumsum(sol, axis=0, out=sol)
+            elif trans == 'T':
+                sol[::-1] = np.cumsum(sol[::-1], axis=0)
+        else:
+            if trans == 'N':
+                for i_time in range(num_times - 1):
+                    sol[i_time + 1] += glm_V.dot(sol[i_time])
+            elif trans == 'T':
+                for i_time in range(num_times - 2, -1, -1):
+                    sol[i_time] += glm_V.T.dot(sol[i_time + 1])
+
+        return sol.reshape(np.shape(rhs))
@@ -39,6 +39,99 @@ def run_integration(num_times, t0, t1, initial_conditions, ode_function, formula
     return runtime, errors
 
 
+def compute_phase_runtimes(num_times, t0, t1, initial_conditions, ode_function, formulation,
+        method_name, **kwargs):
+    """
+    Time each phase of the construction, setup, and run of an integrator separately.
+
+    The phases are the ODEIntegrator construction, prob.setup, prob.final_setup,
+    prob.run_model, and prob.compute_totals of the states with respect to the initial
+    conditions. Additional keyword arguments are passed on to ODEIntegrator.
+
+    Returns
+    -------
+    dict
+        Runtime of each phase in seconds, keyed by phase name.
+    """
+    return compute_phase_profile(num_times, t0, t1, initial_conditions, ode_function,
+        formulation, method_name, **kwargs)[1]
+
+
+def compute_phase_profile(num_times, t0, t1, initial_conditions, ode_function, formulation,
+        method_name, of=None, wrt=None, mode='auto', trace_memory=False, **kwargs):
+    """
+    Run an integrator and profile each phase of its construction, setup, and run separately.
+
+    The phases are as in compute_phase_runtimes. If trace_memory is True, the peak memory
+    allocated in each phase is traced with tracemalloc, which is restarted at the start of each
+    phase, so the memory still held from the earlier phases is not counted.
+
+    Parameters
+    ----------
+    of : list of str or None
+        Outputs of compute_totals; by default, the states.
+    wrt : list of str or None
+        Inputs of compute_totals; by default, the initial conditions.
+    mode : str
+        Derivative direction passed on to prob.setup.
+    trace_memory : bool
+        Whether to trace the peak memory of each phase.
+
+    Returns
+    -------
+    Problem
+        The problem, after compute_totals.
+    dict
+        Runtime of each phase in seconds, keyed by phase name.
+    dict
+        Peak memory allocated in each phase in MiB, keyed by phase name, if trace_memory is
+        True; otherwise, empty.
+    """
+    if trace_memory:
+        import tracemalloc
+
+    times = np.linspace(t0, t1, num_times)
+
+    if of is None:
+        of = ['state:%s' % state_name for state_name in ode_function._states]
+    if wrt is None:
+        wrt = ['initial_condition:%s' % state_name for state_name in ode_function._states]
+
+    def construct():
+        return Problem(ODEIntegrator(ode_function, formulation, method_name,
+            times=times, initial_conditions=initial_conditions, **kwargs))
+
+    phases = [
+        ('construction', construct),
+        ('setup', lambda: prob.setup(check=False, mode=mode)),
+        ('final_setup', lambda: prob.final_setup()),
+        ('run_model', lambda: prob.run_model()),
+        ('compute_totals', lambda: prob.compute_totals(of, wrt)),
+    ]
+
+    runtimes = {}
+    peaks = {}
+    prob = None
+    with nostdout():
+        for phase_name, phase in phases:
+            if trace_memory:
+                tracemalloc.start()
+
+            runtime0 = time.time()
+            value = phase()
+            runtime1 = time.time()
+
+            if trace_memory:
+                peaks[phase_name] = tracemalloc.get_traced_memory()[1] / 2. ** 20
+                tracemalloc.stop()
+
+            runtimes[phase_name] = runtime1 - runtime0
+            if phase_name == 'construction':
+                prob = value
+
+    return prob, runtimes, peaks
+
+
 def compute_runtimes(num_times_vector, t0, t1,
         ode_function, formulation, method_name, initial_conditions):
     num = len(num_times_vector)
@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse
+
+
+class SetupCache(object):
+    """
+    Process-level LRU cache of the setup-time data of the vectorized components.
+
+    The sparsity patterns and linear operators of the vectorized step components only depend
+    on the method, the number of time points, and the state shapes, so they can be reused
+    across components and Problem setups. Entries are evicted in least-recently-used order
+    once the total size of the cached arrays exceeds max_bytes. The cached arrays are made
+    read-only since they are shared; they must not be modified in place.
+    """
+
+    def __init__(self, max_bytes=2 ** 28):
+        """
+        Initialize an empty cache.
+
+        Parameters
+        ----------
+        max_bytes : int
+            Bound on the total size of the cached arrays; 0 disables the cache.
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.num_hits = 0
+        self.num_misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """
+        Return the cached value for key, calling build() to compute it on a miss.
+
+        Parameters
+        ----------
+        key : hashable
+            Key that fully determines the value, e.g., from get_array_key for arrays.
+        build : callable
+            Function with no arguments that returns the value.
+
+        Returns
+        -------
+        object
+            The cached or newly built value.
+        """
+        with self._lock:
+            if key in self._entries:
+                entry = self._entries.pop(key)
+                self._entries[key] = entry
+                self.num_hits += 1
+                return entry[0]
+
+            self.num_misses += 1
+
+        value = build()
+        set_read_only(value)
+        nbytes = get_nbytes(value)
+
+        with self._lock:
+            if key not in self._entries and nbytes <= self.max_bytes:
+                self._entries[key] = (value, nbytes)
+                self.nbytes += nbytes
+
+                while self.nbytes > self.max_bytes:
+                    old_value, old_nbytes = self._entries.popitem(last=False)[1]
+                    self.nbytes -= old_nbytes
+
+        return value
+
+    def clear(self):
+        """
+        Remove all entries and reset the hit and miss counts.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.num_hits = 0
+            self.num_misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_array_key(array):
+    """
+    Return a hashable key of the shape, dtype, and values of an array.
+    """
+    array = np.ascontiguousarray(array)
+    return (array.shape, array.dtype.str, array.tobytes())
+
+
+def _iter_arrays(value):
+    if isinstance(value, np.ndarray):
+        yield value
+    elif scipy.sparse.issparse(value):
+        for name in ('data', 'indices', 'indptr', 'row', 'col'):
+            if hasattr(value, name):
+                yield getattr(value, name)
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            for array in _iter_arrays(item):
+                yield array
+    elif isinstance(value, dict):
+        for item in value.values():
+            for array in _iter_arrays(item):
+                yield array
+    elif hasattr(value, '__dict__'):
+        for item in vars(value).values():
+            for array in _iter_arrays(item):
+                yield array
+
+
+def get_nbytes(value):
+    """
+    Return the total size of the arrays in a value, searched through containers and objects.
+    """
+    return sum(array.nbytes for array in _iter_arrays(value))
+
+
+def set_read_only(value):
+    """
+    Make all arrays in a value read-only, searched through containers and objects.
+    """
+    for array in _iter_arrays(value):
+        array.flags.writeable = False
+
+
+setup_cache = SetupCache()
@@ -0,0 +1,39 @@
+import scipy.sparse.linalg
+
+from openmdao.api import DirectSolver
+from openmdao.matrices.csc_matrix import CSCMatrix
+from openmdao.solvers.linear.direct import format_singular_csc_error
+
+
+class SparseDirectSolver(DirectSolver):
+    """
+    DirectSolver whose sparse LU factorization uses a given fill-reducing column ordering.
+
+    With a CSC assembled Jacobian, the matrix is factored by scipy.sparse.linalg.splu with the
+    permc_spec ordering, so the memory and the cost of the factorization follow the sparsity
+    of the Jacobian. Other Jacobian types are handled as by DirectSolver.
+    """
+
+    def _declare_options(self):
+        super(SparseDirectSolver, self)._declare_options()
+
+        self.options.declare('permc_spec', default='COLAMD',
+            values=['NATURAL', 'MMD_ATA', 'MMD_AT_PLUS_A', 'COLAMD'],
+            desc='Column ordering of the sparse LU factorization')
+
+    def _linearize(self):
+        system = self._system
+        assembled_jac = self._assembled_jac
+
+        if assembled_jac is None or not isinstance(assembled_jac._int_mtx, CSCMatrix):
+            return super(SparseDirectSolver, self)._linearize()
+
+        ranges = assembled_jac._view_ranges[system.pathname]
+        matrix = assembled_jac._int_mtx._matrix[ranges[0]:ranges[1], ranges[0]:ranges[1]]
+
+        try:
+            self._lu = scipy.sparse.linalg.splu(matrix, permc_spec=self.options['permc_spec'])
+        except RuntimeError as err:
+            if 'exactly singular' in str(err):
+                raise RuntimeError(format_singular_csc_error(system, matrix))
+            raise
@@ -0,0 +1,236 @@
+import numpy as np
+import scipy.sparse
+import scipy.special
+
+from ozone.utils.sparse_linear_spline import get_sparse_linear_spline
+from ozone.utils.misc import _get_class
+
+
+def get_sparse_interpolation(interpolation, in_vec, out_vec, order=4):
+    """
+    Return the sparse (data, rows, cols) operator that interpolates from in_vec to out_vec.
+
+    Parameters
+    ----------
+    interpolation : str
+        'linear', 'cubic' (cubic Hermite), 'bspline', or 'lagrange'.
+    in_vec : ndarray
+        Increasing points at which the values are given.
+    out_vec : ndarray
+        Points at which the values are interpolated, within the range of in_vec.
+    order : int
+        Order (degree + 1) of the B-spline or number of points of the Lagrange stencils.
+
+    Returns
+    -------
+    ndarray
+        Nonzero values of the operator of shape (len(out_vec), len(in_vec)).
+    ndarray
+        Row indices of the nonzeros.
+    ndarray
+        Column indices of the nonzeros.
+    """
+    if interpolation == 'linear':
+        return get_sparse_linear_spline(in_vec, out_vec)
+
+    func = _get_class(interpolation, interpolation_functions, 'Interpolation')
+    return func(in_vec, out_vec, order)
+
+
+def get_sparse_cubic_hermite(in_vec, out_vec, order=4):
+    """
+    Cubic Hermite interpolation with slopes from three-point finite differences.
+
+    The slopes are second-order accurate on nonuniform points, so the interpolant is C1 and
+    third-order accurate. Each output depends on the four nearest input points.
+    """
+    _check_range(in_vec, out_vec)
+
+    num_in = len(in_vec)
+    num_out = len(out_vec)
+
+    if num_in < 3:
+        return get_sparse_linear_spline(in_vec, out_vec)
+
+    ileft, theta, h = _get_intervals(in_vec, out_vec)
+
+    # Slopes as a sparse operator on the values: three-point differences, one-sided at the ends
+    hl = np.diff(in_vec)[:-1]
+    hr = np.diff(in_vec)[1:]
+
+    data = np.zeros((num_in, 3))
+    cols = np.zeros((num_in, 3), int)
+
+    data[1:-1, 0] = -hr / (hl * (hl + hr))
+    data[1:-1, 1] = (hr - hl) / (hl * hr)
+    data[1:-1, 2] = hl / (hr * (hl + hr))
+    cols[1:-1, :] = np.arange(num_in - 2)[:, np.newaxis] + np.arange(3)
+
+    h1, h2 = in_vec[1] - in_vec[0], in_vec[2] - in_vec[1]
+    data[0, :] = [-(2 * h1 + h2) / (h1 * (h1 + h2)), (h1 + h2) / (h1 * h2), -h1 / (h2 * (h1 + h2))]
+    cols[0, :] = [0, 1, 2]
+
+    h1, h2 = in_vec[-1] - in_vec[-2], in_vec[-2] - in_vec[-3]
+    data[-1, :] = [(2 * h1 + h2) / (h1 * (h1 + h2)), -(h1 + h2) / (h1 * h2), h1 / (h2 * (h1 + h2))]
+    cols[-1, :] = [num_in - 1, num_in - 2, num_in - 3]
+
+    rows = np.einsum('i,j->ij', np.arange(num_in), np.ones(3, int))
+    mtx_slope = scipy.sparse.csr_matrix((data.flatten(), (rows.flatten(), cols.flatten())),
+        shape=(num_in, num_in))
+
+    # Hermite basis functions
+    h00 = 2 * theta ** 3 - 3 * theta ** 2 + 1
+    h10 = theta ** 3 - 2 * theta ** 2 + theta
+    h01 = -2 * theta ** 3 + 3 * theta ** 2
+    h11 = theta ** 3 - theta ** 2
+
+    arange = np.arange(num_out)
+    mtx_y = scipy.sparse.csr_matrix((np.concatenate([h00, h01]),
+        (np.concatenate([arange, arange]), np.concatenate([ileft, ileft + 1]))),
+        shape=(num_out, num_in))
+    mtx_m = scipy.sparse.csr_matrix((np.concatenate([h10 * h, h11 * h]),
+        (np.concatenate([arange, arange]), np.concatenate([ileft, ileft + 1]))),
+        shape=(num_out, num_in))
+
+    return _to_triplets(mtx_y + mtx_m.dot(mtx_slope))
+
+
+def get_sparse_bspline(in_vec, out_vec, order=4):
+    """
+    Clamped B-spline with knots at the input points and local quasi-interpolation.
+
+    The spline of degree order - 1 is C(order - 2) smooth. The coefficient of each basis function
+    is the blossom, at its knots, of the polynomial that interpolates the order input points
+    nearest to it, so polynomials of degree order - 1 are reproduced and the spline has the
+    accuracy order on smooth data, while each output only depends on nearby inputs. The spline
+    matches the first and last values, but only approximates the values in between.
+    """
+    _check_range(in_vec, out_vec)
+
+    num_in = len(in_vec)
+    num_out = len(out_vec)
+
+    degree = min(order, num_in) - 1
+
+    knots = np.concatenate([
+        in_vec[0] * np.ones(degree + 1), in_vec[1:-1], in_vec[-1] * np.ones(degree + 1)])
+    num_coeffs = len(knots) - degree - 1
+
+    # Coefficients: (num_coeffs, degree + 1) weights on the values of each stencil
+    coeff_knots = np.array([knots[ind + 1:ind + degree + 1] for ind in range(num_coeffs)])
+    greville = np.mean(coeff_knots, axis=1) if degree > 0 else knots[:num_coeffs]
+
+    start = np.searchsorted(in_vec, greville) - (degree + 1) // 2
+    start = np.minimum(np.maximum(start, 0), num_in - degree - 1)
+    coeff_cols = start[:, np.newaxis] + np.arange(degree + 1)
+
+    # Local coordinates for conditioning
+    center = greville
+    scale = in_vec[coeff_cols[:, -1]] - in_vec[coeff_cols[:, 0]] if degree > 0 \
+        else np.ones(num_coeffs)
+    nodes = (in_vec[coeff_cols] - center[:, np.newaxis]) / scale[:, np.newaxis]
+    args = (coeff_knots - center[:, np.newaxis]) / scale[:, np.newaxis]
+
+    # Blossom of x^k at the knots: the elementary symmetric polynomial of order k over binom
+    sym = np.zeros((num_coeffs, degree + 1))
+    sym[:, 0] = 1.
+    for ind in range(degree):
+        sym[:, 1:] = sym[:, 1:] + args[:, ind:ind + 1] * sym[:, :-1]
+    binom = np.array([scipy.special.comb(degree, k) for k in range(degree + 1)])
+    blossom = sym / binom
+
+    # Weights z on the stencil values, with V^T z = blossom for the Vandermonde matrix V
+    vandermonde = nodes[:, :, np.newaxis] ** np.arange(degree + 1)
+    coeff_data = np.linalg.solve(np.transpose(vandermonde, (0, 2, 1)),
+        blossom[:, :, np.newaxis])[:, :, 0]
+
+    coeff_rows = np.einsum('i,j->ij', np.arange(num_coeffs), np.ones(degree + 1, int))
+    mtx_coeffs = scipy.sparse.csr_matrix(
+        (coeff_data.flatten(), (coeff_rows.flatten(), coeff_cols.flatten())),
+        shape=(num_coeffs, num_in))
+
+    # Knot span of each output point, with the last point in the last nonempty span
+    spans = np.searchsorted(knots, out_vec, side='right') - 1
+    spans = np.minimum(np.maximum(spans, degree), num_coeffs - 1)
+
+    # Cox--de Boor recursion on the degree + 1 nonzero basis functions of each span
+    left = np.zeros((num_out, degree + 1))
+    right = np.zeros((num_out, degree + 1))
+    basis = np.zeros((num_out, degree + 1))
+    basis[:, 0] = 1.
+    for j in range(1, degree + 1):
+        left[:, j] = out_vec - knots[spans + 1 - j]
+        right[:, j] = knots[spans + j] - out_vec
+        saved = np.zeros(num_out)
+        for r in range(j):
+            temp = basis[:, r] / (right[:, r + 1] + left[:, j - r])
+            basis[:, r] = saved + right[:, r + 1] * temp
+            saved = left[:, j - r] * temp
+        basis[:, j] = saved
+
+    rows = np.einsum('i,j->ij', np.arange(num_out), np.ones(degree + 1, int))
+    cols = spans[:, np.newaxis] - degree + np.arange(degree + 1)
+    mtx_basis = scipy.sparse.csr_matrix((basis.flatten(), (rows.flatten(), cols.flatten())),
+        shape=(num_out, num_coeffs))
+
+    return _to_triplets(mtx_basis.dot(mtx_coeffs))
+
+
+def get_sparse_lagrange(in_vec, out_vec, order=4):
+    """
+    Piecewise Lagrange interpolation on stencils of order consecutive input points.
+
+    The stencil of each interval is centered on it where possible, so the interpolant is
+    continuous and of accuracy order on smooth data. With order >= len(in_vec), this is global
+    polynomial interpolation, which is well conditioned if the inputs are, e.g., Chebyshev points.
+    """
+    _check_range(in_vec, out_vec)
+
+    num_in = len(in_vec)
+    num_out = len(out_vec)
+
+    order = min(order, num_in)
+
+    ileft, theta, h = _get_intervals(in_vec, out_vec)
+
+    start = np.minimum(np.maximum(ileft - (order // 2 - 1), 0), num_in - order)
+    cols = start[:, np.newaxis] + np.arange(order)
+    nodes = in_vec[cols]
+
+    data = np.ones((num_out, order))
+    for j in range(order):
+        for k in range(order):
+            if k != j:
+                data[:, j] *= (out_vec - nodes[:, k]) / (nodes[:, j] - nodes[:, k])
+
+    rows = np.einsum('i,j->ij', np.arange(num_out), np.ones(order, int))
+
+    return data.flatten(), rows.flatten(), cols.flatten()
+
+
+def _check_range(in_vec, out_vec):
+    if np.max(out_vec) > in_vec[-1] + 1e-16 or np.min(out_vec) < in_vec[0] - 1e-16:
+        raise Exception('Internal error: cannot extrapolate using sparse interpolation')
+
+
+def _get_intervals(in_vec, out_vec):
+    iright = np.minimum(np.maximum(1, np.searchsorted(in_vec, out_vec, side='left')),
+        len(in_vec) - 1)
+    ileft = iright - 1
+
+    h = in_vec[iright] - in_vec[ileft]
+    theta = (out_vec - in_vec[ileft]) / h
+
+    return ileft, theta, h
+
+
+def _to_triplets(mtx):
+    mtx = mtx.tocoo()
+    return mtx.data, mtx.row, mtx.col
+
+
+interpolation_functions = {
+    'cubic': get_sparse_cubic_hermite,
+    'bspline': get_sparse_bspline,
+    'lagrange': get_sparse_lagrange,
+}
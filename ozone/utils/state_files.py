@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+
+
+def get_state_filename(state_dir, state_name):
+    """
+    Return the path of the npy file of the streamed values of a state.
+    """
+    return os.path.join(state_dir, 'state_%s.npy' % state_name)
+
+
+def open_state_file(state_dir, state_name, shape):
+    """
+    Create the npy file of a state and return it as a writable memory-mapped array.
+
+    Parameters
+    ----------
+    state_dir : str
+        Directory of the state files, created if it does not exist.
+    state_name : str
+        Name of the state.
+    shape : tuple
+        Shape of the array, (num_times,) + the shape of the state.
+
+    Returns
+    -------
+    memmap
+        The array, whose rows are written to the file as they are assigned.
+    """
+    if not os.path.isdir(state_dir):
+        os.makedirs(state_dir)
+
+    return np.lib.format.open_memmap(get_state_filename(state_dir, state_name),
+        mode='w+', dtype=float, shape=shape)
+
+
+def load_states(state_dir, state_names):
+    """
+    Return the streamed values of the states as read-only memory-mapped arrays.
+
+    Only the parts of the arrays that are accessed are read from the files, so trajectories
+    that do not fit in memory can be processed in slices.
+
+    Parameters
+    ----------
+    state_dir : str
+        The state_dir option of the integrator.
+    state_names : iterable of str
+        Names of the states to load.
+
+    Returns
+    -------
+    dict
+        Arrays of shape (num_times,) + the shape of each state, keyed by state name.
+    """
+    return dict(
+        (state_name, np.load(get_state_filename(state_dir, state_name), mmap_mode='r'))
+        for state_name in state_names)
@@ -13,6 +13,7 @@ setup(name='ozone',
         'ozone/integrators',
         'ozone/methods',
         'ozone/utils',
+        'ozone/benchmarks',
     ],
     install_requires=[
     ],